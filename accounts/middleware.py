@@ -3,17 +3,23 @@ from django.shortcuts import redirect
 from django.utils import timezone
 from django.conf import settings
 
+# Seconds between writes of the session's last activity (the idle timeout is accurate to this)
+ACTIVITY_WRITE_SECONDS = getattr(settings, 'SESSION_ACTIVITY_WRITE_SECONDS', 60)
+
+
 class SessionSecurityMiddleware:
     """Force session timeout and block cached pages after logout."""
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Block page cache on every request
+        # Block page cache on every request (unless the view set its own policy,
+        # e.g. the immutable QR images)
         response = self.get_response(request)
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
+        if not response.has_header('Cache-Control'):
+            response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            response['Pragma'] = 'no-cache'
+            response['Expires'] = '0'
 
         # Skip checks for login or static requests
         if request.path.startswith('/static/') or request.path in ['/login/', '/logout/']:
@@ -29,8 +35,12 @@ class SessionSecurityMiddleware:
                 from django.contrib.auth import logout
                 logout(request)
                 request.session.flush()
-                return redirect('login')
+                return redirect(settings.LOGIN_URL)
 
-            request.session['last_activity'] = now
+            # Only a changed session is saved: record the activity (and renew the
+            # stored session's expiry with it) once per ACTIVITY_WRITE_SECONDS,
+            # not on every poll
+            if not last_activity or now - last_activity >= ACTIVITY_WRITE_SECONDS:
+                request.session['last_activity'] = now
 
         return response
@@ -5,13 +5,9 @@ from django.contrib import messages
 from django.contrib.auth import logout, authenticate, login
 from .models import CustomUser
 from .forms import CustomUserCreationForm, CustomUserEditForm
-from vehicles.models import Driver, Vehicle, Deposit, QueueHistory
-from terminal.models import EntryLog
-from reports.models import Profit
-from django.db.models import Sum, Count
+from reports import counters, snapshots
 from django.utils import timezone
 from django.http import JsonResponse
-from datetime import timedelta
 from accounts.utils import is_admin
 
 
@@ -185,50 +181,15 @@ def delete_user(request, user_id):
 @user_passes_test(is_admin)
 @never_cache
 def admin_dashboard_view(request):
-    from reports.models import Profit
-    from django.db.models import Sum
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-    # Import QueueHistory from vehicles so the admin view and vehicles app are consistent
-    try:
-        from vehicles.models import QueueHistory
-    except Exception:
-        QueueHistory = None
-
-    total_drivers = Driver.objects.count()
-    total_vehicles = Vehicle.objects.count()
-
-    # Prefer QueueHistory if available; fall back to EntryLog if your terminal app still uses it.
-    total_queue = 0
-    if QueueHistory is not None:
-        total_queue = QueueHistory.objects.filter().count()
-    else:
-        try:
-            total_queue = EntryLog.objects.filter(status=EntryLog.STATUS_SUCCESS).count()
-        except Exception:
-            total_queue = 0
-
-    total_profit = Profit.objects.aggregate(Sum('amount'))['amount__sum'] or 0
-
-    # Chart data for last 7 days (server-side)
-    today = timezone.now().date()
-    last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
-    chart_labels = [d.strftime("%b %d") for d in last_7_days]
-    chart_data = []
-
-    for day in last_7_days:
-        start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
-        end = timezone.make_aware(datetime.combine(day, datetime.max.time()))
-        day_total = Profit.objects.filter(date_recorded__range=[start, end]).aggregate(Sum('amount'))['amount__sum'] or 0
-        chart_data.append(float(day_total))
-
+    # Totals and 7-day chart from the shared snapshot (reports/snapshots.py)
+    snapshot = snapshots.admin_dashboard()
     context = {
-        'total_drivers': total_drivers,
-        'total_vehicles': total_vehicles,
-        'total_queue': total_queue,
-        'total_profit': total_profit,
-        'chart_labels': chart_labels,
-        'chart_data': chart_data,
+        'total_drivers': snapshot['total_drivers'],
+        'total_vehicles': snapshot['total_vehicles'],
+        'total_queue': snapshot['total_queue'],
+        'total_profit': snapshot['total_profit'],
+        'chart_labels': snapshot['chart_labels'],
+        'chart_data': snapshot['chart_data'],
         'now': timezone.now(),
     }
     return render(request, 'accounts/admin_dashboard.html', context)
@@ -242,14 +203,12 @@ def admin_dashboard_view(request):
 @user_passes_test(is_staff_admin)
 @never_cache
 def staff_dashboard_view(request):
-    total_drivers = Driver.objects.count()
-    total_vehicles = Vehicle.objects.count()
-    total_queue = EntryLog.objects.filter(status=EntryLog.STATUS_SUCCESS).count()
-
+    counts = counters.values()
     context = {
-        'total_drivers': total_drivers,
-        'total_vehicles': total_vehicles,
-        'total_queue': total_queue,
+        'total_drivers': counts[counters.DRIVERS],
+        'total_vehicles': counts[counters.VEHICLES],
+        # Successful entries, live and archived
+        'total_queue': counts[counters.ENTRY_COUNT],
     }
     return render(request, 'accounts/staff_dashboard.html', context)
 
@@ -259,45 +218,5 @@ def staff_dashboard_view(request):
 @user_passes_test(is_admin)
 def admin_dashboard_data(request):
     """AJAX endpoint for admin dashboard live data."""
-    total_drivers = Driver.objects.count()
-    total_vehicles = Vehicle.objects.count()
-    total_queue = EntryLog.objects.filter(is_active=True, status="success").count()
-
-    # Totals
-    total_deposits = Deposit.objects.aggregate(total=Sum("amount"))["total"] or 0
-    total_revenue = EntryLog.objects.filter(status="success").aggregate(total=Sum("fee_charged"))["total"] or 0
-    total_profit = Profit.objects.aggregate(total=Sum("amount"))["total"] or 0
-
-    # Last 7 days profit trend
-    now = timezone.localtime()
-    start_date = now - timedelta(days=6)
-    chart_labels, chart_data = [], []
-
-    for i in range(7):
-        day = (start_date + timedelta(days=i)).date()
-        total = (
-            Profit.objects.filter(date_recorded__date=day)
-            .aggregate(Sum("amount"))["amount__sum"]
-            or 0
-        )
-        chart_labels.append(day.strftime("%b %d"))
-        chart_data.append(float(total))
-
-    # Recent queue list for optional display
-    recent_queues = list(
-        EntryLog.objects.filter(is_active=True, status="success")
-        .select_related("vehicle__assigned_driver")
-        .order_by("-created_at")[:10]
-        .values("vehicle__license_plate", "vehicle__assigned_driver__first_name", "vehicle__assigned_driver__last_name")
-    )
-
-    return JsonResponse({
-        "total_drivers": total_drivers,
-        "total_vehicles": total_vehicles,
-        "total_deposits": float(total_deposits),
-        "total_revenue": float(total_revenue),
-        "total_profit": float(total_profit),
-        "chart_labels": chart_labels,
-        "chart_data": chart_data,
-        "recent_queues": recent_queues,
-    })
\ No newline at end of file
+    # Every polling admin shares one snapshot, recomputed every DASHBOARD_SNAPSHOT_SECONDS
+    return JsonResponse(snapshots.admin_dashboard())
\ No newline at end of file
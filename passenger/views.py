@@ -3,42 +3,16 @@ from django.shortcuts import render
 from django.utils import timezone
 from datetime import timedelta
 from terminal.models import EntryLog, SystemSettings
+from terminal.history import local_date_range
 from vehicles.models import Vehicle, Route
 from django.http import JsonResponse
 from django.db.models import Q
 
-# Passenger-specific delete window (minutes) for quick hide on public view
+# Passenger-specific window (minutes) a departed entry stays visible in the live feed
 PASSENGER_DELETE_AFTER_MINUTES = 10
 DEPARTED_VISIBLE_MINUTES = 5
 
 
-def _maintenance_task(now=None):
-    """
-    Run light, idempotent maintenance:
-    - Auto-close active entries whose created_at + admin_duration <= now.
-    - Delete departed/non-active entries older than PASSENGER_DELETE_AFTER_MINUTES.
-    """
-    now = now or timezone.now()
-
-    # load admin-config
-    settings = SystemSettings.get_solo()
-    departure_duration = int(getattr(settings, "departure_duration_minutes", 30))
-
-    # 1) Auto-close active entries where created_at + departure_duration <= now
-    cutoff = now - timedelta(minutes=departure_duration)
-    active_qs = EntryLog.objects.filter(is_active=True, created_at__lte=cutoff)
-    if active_qs.exists():
-        active_qs.update(is_active=False, departed_at=now)
-
-    # 2) Delete departed/non-active entries older than PASSENGER_DELETE_AFTER_MINUTES
-    delete_cutoff = now - timedelta(minutes=PASSENGER_DELETE_AFTER_MINUTES)
-    old_qs = EntryLog.objects.filter(created_at__lt=delete_cutoff).filter(
-        Q(is_active=False) | Q(departed_at__isnull=False)
-    )
-    if old_qs.exists():
-        old_qs.delete()
-
-
 def home(request):
     return render(request, 'passenger/home.html')
 
@@ -55,13 +29,12 @@ def public_queue_view(request):
     Public Passenger View:
     - Shows active vehicles created today.
     - Shows recently departed entries.
-    - Applies live maintenance and strict route filtering.
+    - Applies strict route filtering (maintenance runs in terminal.maintenance).
     """
     now = timezone.now()
-    _maintenance_task(now=now)
 
     route_filter = request.GET.get('route')
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     departure_duration = int(getattr(settings, "departure_duration_minutes", 30))
 
     keep_departed_for = timedelta(minutes=DEPARTED_VISIBLE_MINUTES)
@@ -71,7 +44,7 @@ def public_queue_view(request):
     queue_entries = (
         EntryLog.objects.select_related('vehicle', 'vehicle__assigned_driver', 'vehicle__route')
         .filter(
-            Q(is_active=True, created_at__date=timezone.localtime(now).date()) |
+            Q(is_active=True, **local_date_range('created_at', timezone.localdate(now), timezone.localdate(now))) |
             Q(departed_at__gte=departed_cutoff)
         )
         .order_by('created_at')
@@ -129,9 +102,8 @@ def public_queue_view(request):
 def public_queue_data(request):
     """AJAX endpoint for live smooth refresh."""
     now = timezone.now()
-    _maintenance_task(now=now)
 
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     departure_duration = int(getattr(settings, "departure_duration_minutes", 30))
 
     ten_mins_ago = now - timedelta(minutes=10)
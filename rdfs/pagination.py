@@ -0,0 +1,185 @@
+# rdfs/pagination.py
+"""
+Keyset ("cursor") pagination shared by the long listing pages.
+
+A page is fetched with WHERE (sort key) < (last row's key) ORDER BY ... LIMIT
+instead of COUNT(*) + OFFSET, so page 500 costs the same as page 1 and rows
+inserted meanwhile don't shift the pages.  The position travels in an opaque,
+signed `cursor` query parameter; a bad or tampered cursor shows the first page.
+
+    page = paginate(request, queryset, ("-created_at", "-id"), per_page=50)
+    {% include "includes/cursor_pagination.html" with page=page %}
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+CURSOR_PARAM = "cursor"
+
+_SALT = "rdfs.pagination"
+
+
+def _pack(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    return value
+
+
+def _unpack(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return parse_datetime(value["dt"])
+        if "d" in value:
+            return parse_date(value["d"])
+        if "n" in value:
+            return Decimal(value["n"])
+    return value
+
+
+def encode_cursor(key, backwards=False, start=0):
+    """Token for the rows after `key` (a tuple of sort values), or before it when `backwards`."""
+    return signing.dumps(
+        {"k": [_pack(value) for value in key], "b": int(backwards), "s": start}, salt=_SALT, compress=True
+    )
+
+
+def decode_cursor(token):
+    """(key, backwards, start) from a token, or None for a missing or invalid one."""
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=_SALT)
+        return tuple(_unpack(value) for value in data["k"]), bool(data["b"]), max(int(data["s"]), 0)
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+def keyset_filter(ordering, key, backwards=False):
+    """
+    Q selecting the rows after `key` in `ordering` (e.g. ("-created_at", "-id")),
+    or before it when `backwards`: the lexicographic comparison spelled out as
+    (a < x) OR (a = x AND b < y) ..., plus a bound on the leading column so the
+    planner can range-scan its index.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != backwards
+        term = Q(**{f"{name}__{'lt' if descending else 'gt'}": key[i]})
+        for previous, value in zip(ordering[:i], key[:i]):
+            term &= Q(**{previous.lstrip("-"): value})
+        condition |= term
+    leading = ordering[0].lstrip("-")
+    descending = ordering[0].startswith("-") != backwards
+    return Q(**{f"{leading}__{'lte' if descending else 'gte'}": key[0]}) & condition
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+
+
+class CursorPage:
+    """One page of rows plus the URLs of its neighbours (None at either end)."""
+
+    def __init__(self, items, start, next_url=None, prev_url=None):
+        self.items = items
+        self.start = start
+        self.next_url = next_url
+        self.prev_url = prev_url
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_url is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def start_index(self):
+        """1-based position of the first row, for row numbering (no COUNT needed)."""
+        return self.start + 1
+
+    @property
+    def end_index(self):
+        return self.start + len(self.items)
+
+
+def _url(request, token):
+    params = request.GET.copy()
+    params.pop(CURSOR_PARAM, None)
+    if token:
+        params[CURSOR_PARAM] = token
+    query = params.urlencode()
+    return f"?{query}" if query else request.path
+
+
+def paginate_rows(request, fetch, key, per_page):
+    """
+    Paginate any ordered source.  `fetch(after, backwards)` returns an iterator
+    over the rows strictly after the sort key `after` (None: from the start),
+    in reverse order when `backwards`; `key(row)` returns a row's sort key.
+    """
+    cursor = decode_cursor(request.GET.get(CURSOR_PARAM))
+    after, backwards, start = cursor or (None, False, 0)
+
+    if backwards:
+        rows = list(islice(fetch(after, True), per_page + 1))
+        if not rows:
+            # Everything before the cursor is gone: show the first page
+            after, backwards, start = None, False, 0
+    if backwards:
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+        if not has_prev:
+            start = 0
+    else:
+        rows = list(islice(fetch(after, False), per_page + 1))
+        has_prev, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    next_url = _url(request, encode_cursor(key(rows[-1]), start=start + len(rows))) if has_next and rows else None
+    prev_url = None
+    if has_prev and rows:
+        prev_start = max(start - per_page, 0)
+        # The first page gets a clean URL without a cursor
+        prev_url = _url(request, encode_cursor(key(rows[0]), backwards=True, start=prev_start) if prev_start else None)
+    return CursorPage(rows, start, next_url, prev_url)
+
+
+def paginate(request, queryset, ordering, per_page=20):
+    """Keyset-paginate a queryset on `ordering`, which must end in a unique field (e.g. "-id")."""
+    ordering = tuple(ordering)
+    names = [field.lstrip("-") for field in ordering]
+
+    def fetch(after, backwards):
+        qs = queryset
+        if after is not None:
+            qs = qs.filter(keyset_filter(ordering, after, backwards))
+        return iter(qs.order_by(*(reverse_ordering(ordering) if backwards else ordering))[:per_page + 1])
+
+    def key(obj):
+        return tuple(getattr(obj, name) for name in names)
+
+    return paginate_rows(request, fetch, key, per_page)
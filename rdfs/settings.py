@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # =====================================================
 # BASE
@@ -121,6 +122,17 @@ DATABASES = {
 # It prevents silent fallback to SQLite in production.
 
 
+# =====================================================
+# CACHE
+# =====================================================
+# Per-process memory cache by default. Point CACHE_URL at a shared cache
+# (e.g. redis://host:6379/1, needs the `redis` package) so the gunicorn
+# workers share dashboard snapshots, OCR results and reconciliation jobs.
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://")
+}
+
+
 # =====================================================
 # AUTH / USERS
 # =====================================================
@@ -163,8 +175,126 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # SESSIONS
 # =====================================================
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
+# Idle timeout (accounts/middleware.py): a session is logged out after this
+# many seconds without a request
 SESSION_COOKIE_AGE = 900
-SESSION_SAVE_EVERY_REQUEST = True
+# Sessions are saved only when they change; the middleware records activity
+# at most once per SESSION_ACTIVITY_WRITE_SECONDS, so polling pages don't
+# write the session on every request (the idle timeout is accurate to it)
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_ACTIVITY_WRITE_SECONDS = env.int("SESSION_ACTIVITY_WRITE_SECONDS", default=60)
+
+# Session store: "db" (default), "cached_db" (database, read through the
+# cache), "cache" (needs a shared CACHE_URL; sessions end when the cache is
+# cleared) or "signed_cookies" (no server-side storage; a logged-out cookie
+# stays valid until it times out)
+SESSION_STORES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+SESSION_STORE = env("SESSION_STORE", default="db")
+if SESSION_STORE not in SESSION_STORES:
+    raise ImproperlyConfigured(f"SESSION_STORE must be one of: {', '.join(SESSION_STORES)}")
+SESSION_ENGINE = SESSION_STORES[SESSION_STORE]
+
+
+# =====================================================
+# TERMINAL LIVE QUEUE
+# =====================================================
+# SystemSettings.current(): seconds a worker trusts its cached settings
+# before checking whether another worker saved new ones
+SYSTEM_SETTINGS_CACHE_SECONDS = env.int("SYSTEM_SETTINGS_CACHE_SECONDS", default=5)
+
+# In-memory queue read model (terminal/live_queue.py)
+LIVE_QUEUE_SYNC_SECONDS = env.int("LIVE_QUEUE_SYNC_SECONDS", default=2)
+LIVE_QUEUE_REBUILD_SECONDS = env.int("LIVE_QUEUE_REBUILD_SECONDS", default=60)
+LIVE_QUEUE_EVENT_BUFFER = env.int("LIVE_QUEUE_EVENT_BUFFER", default=500)
+
+# Server-Sent Events queue stream (terminal:queue_stream). Each open stream
+# holds a gunicorn thread: at most QUEUE_STREAM_MAX_CONNECTIONS per worker
+# process (keep it well below --threads in the Procfile); more get a 503 and poll
+QUEUE_STREAM_MAX_CONNECTIONS = env.int("QUEUE_STREAM_MAX_CONNECTIONS", default=4)
+QUEUE_STREAM_MAX_SECONDS = env.int("QUEUE_STREAM_MAX_SECONDS", default=300)
+QUEUE_STREAM_HEARTBEAT_SECONDS = env.int("QUEUE_STREAM_HEARTBEAT_SECONDS", default=15)
+
+# Queue maintenance (terminal/maintenance.py). Set TERMINAL_MAINTENANCE_SCHEDULER=False
+# on the web process when a separate `manage.py run_maintenance` worker is used.
+TERMINAL_MAINTENANCE_SCHEDULER = env.bool("TERMINAL_MAINTENANCE_SCHEDULER", default=True)
+TERMINAL_MAINTENANCE_INTERVAL_SECONDS = env.int("TERMINAL_MAINTENANCE_INTERVAL_SECONDS", default=15)
+TERMINAL_DELETE_AFTER_MINUTES = env.int("TERMINAL_DELETE_AFTER_MINUTES", default=10)
+
+# Gate scan QR -> vehicle cache (vehicles/qr_cache.py)
+VEHICLE_QR_CACHE_SIZE = env.int("VEHICLE_QR_CACHE_SIZE", default=5000)
+VEHICLE_QR_CACHE_TTL_SECONDS = env.int("VEHICLE_QR_CACHE_TTL_SECONDS", default=300)
+
+# QR image rendering/upload jobs (vehicles/qr_images.py). Set VEHICLE_QR_JOB_WORKER=False
+# on the web process when a separate `manage.py run_qr_jobs` worker is used.
+VEHICLE_QR_JOB_WORKER = env.bool("VEHICLE_QR_JOB_WORKER", default=True)
+VEHICLE_QR_JOB_POLL_SECONDS = env.int("VEHICLE_QR_JOB_POLL_SECONDS", default=30)
+VEHICLE_QR_JOB_MAX_ATTEMPTS = env.int("VEHICLE_QR_JOB_MAX_ATTEMPTS", default=5)
+VEHICLE_QR_JOB_CONCURRENCY = env.int("VEHICLE_QR_JOB_CONCURRENCY", default=4)
+VEHICLE_QR_IMAGE_CACHE_SIZE = env.int("VEHICLE_QR_IMAGE_CACHE_SIZE", default=512)
+
+# Driver / vehicle search (vehicles/search.py): lifetime of the in-memory
+# index used when the database has no trigram indexes (not PostgreSQL)
+SEARCH_INDEX_TTL_SECONDS = env.int("SEARCH_INDEX_TTL_SECONDS", default=300)
+
+# tesseract binary for license OCR; empty: `tesseract` on PATH (or the
+# default Windows install location)
+TESSERACT_CMD = env("TESSERACT_CMD", default="")
+
+# License OCR process pool (vehicles/ocr.py): worker processes, scans queued or
+# running per web process before new ones get a 503, and per-scan deadline
+OCR_WORKERS = env.int("OCR_WORKERS", default=2)
+OCR_MAX_PENDING = env.int("OCR_MAX_PENDING", default=8)
+OCR_TIMEOUT_SECONDS = env.int("OCR_TIMEOUT_SECONDS", default=20)
+OCR_RESULT_TTL_SECONDS = env.int("OCR_RESULT_TTL_SECONDS", default=300)
+
+# OCR results cached by perceptual image hash (vehicles/ocr_cache.py); set
+# OCR_CACHE_PATH to a writable JSON file to keep them across restarts
+OCR_CACHE_SIZE = env.int("OCR_CACHE_SIZE", default=256)
+OCR_CACHE_TOLERANCE_PERCENT = env.int("OCR_CACHE_TOLERANCE_PERCENT", default=5)
+OCR_CACHE_PATH = env("OCR_CACHE_PATH", default="")
+
+# Wallet ledger checkpoints (vehicles/ledger.py), taken by queue maintenance
+# every WALLET_CHECKPOINT_INTERVAL_MINUTES for wallets with at least
+# WALLET_CHECKPOINT_EVERY new ledger entries
+WALLET_CHECKPOINT_EVERY = env.int("WALLET_CHECKPOINT_EVERY", default=100)
+WALLET_CHECKPOINT_INTERVAL_MINUTES = env.int("WALLET_CHECKPOINT_INTERVAL_MINUTES", default=60)
+
+# Wallets per chunk of a wallet reconciliation (vehicles/reconcile.py)
+WALLET_RECONCILE_CHUNK_SIZE = env.int("WALLET_RECONCILE_CHUNK_SIZE", default=2000)
+
+# Most deposits in one cash-collection session (terminal:ajax_batch_deposit)
+DEPOSIT_BATCH_MAX = env.int("DEPOSIT_BATCH_MAX", default=200)
+
+# Dashboard snapshots (reports/snapshots.py): seconds a computed dashboard
+# payload is served before it is recomputed, and how long a request waits
+# for another worker's recompute when there is no previous payload to reuse
+DASHBOARD_SNAPSHOT_SECONDS = env.int("DASHBOARD_SNAPSHOT_SECONDS", default=5)
+DASHBOARD_SNAPSHOT_WAIT_SECONDS = env.int("DASHBOARD_SNAPSHOT_WAIT_SECONDS", default=5)
+
+# Offline scan uploads from gate devices (terminal:qr_scan_batch)
+GATE_SCAN_BATCH_MAX = env.int("GATE_SCAN_BATCH_MAX", default=200)
+GATE_OFFLINE_SCAN_MAX_AGE_HOURS = env.int("GATE_OFFLINE_SCAN_MAX_AGE_HOURS", default=24)
+TERMINAL_SCAN_RECEIPT_DAYS = env.int("TERMINAL_SCAN_RECEIPT_DAYS", default=7)
+
+
+# =====================================================
+# LOGGING
+# =====================================================
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "terminal": {"handlers": ["console"], "level": env("TERMINAL_LOG_LEVEL", default="INFO")},
+    },
+}
 
 
 # =====================================================
@@ -3,3 +3,13 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rdfs.settings')
 application = get_wsgi_application()
+
+# Queue maintenance (auto-close + cleanup) runs beside the web workers, not in requests
+from terminal.maintenance import start_scheduler  # noqa: E402
+
+start_scheduler()
+
+# Vehicle QR images are rendered and uploaded by a background worker
+from vehicles.qr_images import start_worker  # noqa: E402
+
+start_worker()
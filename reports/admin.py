@@ -1,4 +1,35 @@
 from django.contrib import admin
-from .models import Profit
+from .models import Profit, DailyFinanceRollup, DashboardCounter
 
 admin.site.register(Profit)
+
+
+@admin.register(DailyFinanceRollup)
+class DailyFinanceRollupAdmin(admin.ModelAdmin):
+    list_display = ("day", "route", "payment_method", "deposit_total", "deposit_count",
+                    "fee_total", "entry_count", "profit_total")
+    list_filter = ("payment_method",)
+    date_hierarchy = "day"
+    ordering = ("-day",)
+
+    # Maintained by reports/rollups.py
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DashboardCounter)
+class DashboardCounterAdmin(admin.ModelAdmin):
+    list_display = ("name", "value", "updated_at")
+
+    # Maintained by reports/counters.py
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
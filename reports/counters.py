@@ -0,0 +1,148 @@
+# reports/counters.py
+"""
+Maintenance and reads of DashboardCounter: the all-time totals shown on the
+dashboards, read with one query instead of a count / sum over whole tables.
+
+Writers call add(name=delta, ...).  The deltas are applied after the
+caller's transaction commits (a rolled-back write never reaches them), one
+short UPDATE ... SET value = value + x per counter, so busy scans and
+deposits don't hold a lock on a shared counter row for their whole
+transaction.  The sources are:
+
+- post_save / post_delete signals (reports/models.py) for drivers,
+  vehicles, queue history, deposits and profit records;
+- the ledger (vehicles/ledger.py) for wallet balances, since every balance
+  change is booked there;
+- terminal/gate.py for entry fees, like the daily rollups: archiving moves
+  entries to EntryLogArchive, so deleting entries doesn't change the fee
+  total;
+- callers that use bulk_create (fleet import, batch deposits), which sends
+  no signals.
+
+A crash between a commit and its counter update, or a raw write elsewhere,
+leaves a counter off; `manage.py repair_dashboard_counters` recomputes
+them all from the tables.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from vehicles.models import Deposit, Driver, QueueHistory, Vehicle, Wallet
+
+from .models import DashboardCounter, Profit
+
+logger = logging.getLogger(__name__)
+
+DRIVERS = "drivers"
+VEHICLES = "vehicles"
+QUEUE_HISTORY = "queue_history"
+DEPOSIT_TOTAL = "deposit_total"
+DEPOSIT_COUNT = "deposit_count"
+WALLET_BALANCE_TOTAL = "wallet_balance_total"
+FEE_TOTAL = "fee_total"
+ENTRY_COUNT = "entry_count"
+PROFIT_TOTAL = "profit_total"
+
+NAMES = (
+    DRIVERS, VEHICLES, QUEUE_HISTORY, DEPOSIT_TOTAL, DEPOSIT_COUNT,
+    WALLET_BALANCE_TOTAL, FEE_TOTAL, ENTRY_COUNT, PROFIT_TOTAL,
+)
+
+# Counters read as ints
+COUNTS = (DRIVERS, VEHICLES, QUEUE_HISTORY, DEPOSIT_COUNT, ENTRY_COUNT)
+
+# Row-count counter of each model counted by the post_save / post_delete signals
+MODEL_COUNTERS = {Driver: DRIVERS, Vehicle: VEHICLES, QueueHistory: QUEUE_HISTORY}
+
+
+# -------------------------
+# WRITES
+# -------------------------
+def add(**deltas):
+    """Add signed deltas to counters (name=delta) once the current transaction commits."""
+    deltas = {name: Decimal(delta) for name, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas), robust=True)
+
+
+def _apply(deltas):
+    now = timezone.now()
+    # Always in name order, so two callers never wait on each other's rows crosswise
+    for name in sorted(deltas):
+        row = DashboardCounter.objects.filter(name=name)
+        change = {"value": F("value") + deltas[name], "updated_at": now}
+        if row.update(**change):
+            continue
+        try:
+            with transaction.atomic():
+                DashboardCounter.objects.create(name=name, value=deltas[name])
+        except IntegrityError:
+            # Created concurrently
+            row.update(**change)
+
+
+# -------------------------
+# READS
+# -------------------------
+def values():
+    """{name: value} for every counter (0 when not counted yet); counts are ints."""
+    stored = dict(DashboardCounter.objects.values_list("name", "value"))
+    result = {}
+    for name in NAMES:
+        value = stored.get(name) or Decimal("0.00")
+        result[name] = int(value) if name in COUNTS else value
+    return result
+
+
+# -------------------------
+# REPAIR
+# -------------------------
+def compute():
+    """{name: value} recomputed from the tables (full counts and sums)."""
+    from terminal.models import EntryLog, EntryLogArchive
+
+    zero = Decimal("0.00")
+    deposits = Deposit.objects.aggregate(total=Sum("amount"), count=Count("id"))
+    entries = EntryLog.objects.filter(status=EntryLog.STATUS_SUCCESS).aggregate(
+        total=Sum("fee_charged"), count=Count("id"))
+    archived = EntryLogArchive.objects.filter(status=EntryLog.STATUS_SUCCESS).aggregate(
+        total=Sum("fee_charged"), count=Count("id"))
+    return {
+        DRIVERS: Driver.objects.count(),
+        VEHICLES: Vehicle.objects.count(),
+        QUEUE_HISTORY: QueueHistory.objects.count(),
+        DEPOSIT_TOTAL: deposits["total"] or zero,
+        DEPOSIT_COUNT: deposits["count"],
+        WALLET_BALANCE_TOTAL: Wallet.objects.aggregate(total=Sum("balance"))["total"] or zero,
+        FEE_TOTAL: (entries["total"] or zero) + (archived["total"] or zero),
+        ENTRY_COUNT: entries["count"] + archived["count"],
+        PROFIT_TOTAL: Profit.objects.aggregate(total=Sum("amount"))["total"] or zero,
+    }
+
+
+def repair(dry_run=False):
+    """
+    Recompute every counter and store the results (unless `dry_run`).
+    Returns {name: (stored value, recomputed value)} for the counters that
+    were off.  Writes that commit while it runs can be counted twice; run it
+    again if the result looks off.
+    """
+    with transaction.atomic():
+        # Hold the counter rows so adds wait for the new values
+        stored = dict(DashboardCounter.objects.select_for_update().values_list("name", "value"))
+        fresh = compute()
+        drift = {
+            name: (stored.get(name, Decimal("0.00")), value)
+            for name, value in fresh.items()
+            if stored.get(name, Decimal("0.00")) != value
+        }
+        if not dry_run:
+            now = timezone.now()
+            for name, (_, value) in drift.items():
+                DashboardCounter.objects.update_or_create(name=name, defaults={"value": value, "updated_at": now})
+    if drift:
+        logger.info("Dashboard counters %s: %s", "off" if dry_run else "repaired", sorted(drift))
+    return drift
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.counters import repair
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the dashboard counters (driver / vehicle counts, deposit, wallet, fee and profit totals) "
+        "from the tables and fix the ones that are off. Run it when few deposits / scans are coming in: "
+        "writes landing while the totals are recomputed may be counted twice."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Only report the counters that are off; exit with an error if any are.")
+
+    def handle(self, *args, **options):
+        drift = repair(dry_run=options["check"])
+        for name, (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f"{name}: {stored} -> {actual}")
+        if options["check"] and drift:
+            raise CommandError(f"{len(drift)} dashboard counter(s) are off.")
+        if options["check"]:
+            self.stdout.write(self.style.SUCCESS("All dashboard counters match."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} dashboard counter(s)."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        ('vehicles', '0011_normalize_qr_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFinanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('deposit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('deposit_count', models.PositiveIntegerField(default=0)),
+                ('fee_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('profit_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('route', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='vehicles.route')),
+            ],
+            options={
+                'verbose_name': 'Daily Finance Rollup',
+                'verbose_name_plural': 'Daily Finance Rollups',
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['day'], name='finance_rollup_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyfinancerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('route__isnull', False)), fields=('day', 'route', 'payment_method'), name='finance_rollup_day_route_method'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyfinancerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('route__isnull', True)), fields=('day', 'payment_method'), name='finance_rollup_day_method_noroute'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_counters(apps, schema_editor):
+    """Start every dashboard counter from the current tables."""
+    Counter = apps.get_model('reports', 'DashboardCounter')
+    Driver = apps.get_model('vehicles', 'Driver')
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    QueueHistory = apps.get_model('vehicles', 'QueueHistory')
+    Deposit = apps.get_model('vehicles', 'Deposit')
+    Wallet = apps.get_model('vehicles', 'Wallet')
+    EntryLog = apps.get_model('terminal', 'EntryLog')
+    EntryLogArchive = apps.get_model('terminal', 'EntryLogArchive')
+    Profit = apps.get_model('reports', 'Profit')
+
+    zero = Decimal('0.00')
+    deposits = Deposit.objects.aggregate(total=Sum('amount'), count=Count('id'))
+    entries = EntryLog.objects.filter(status='success').aggregate(total=Sum('fee_charged'), count=Count('id'))
+    archived = EntryLogArchive.objects.filter(status='success').aggregate(total=Sum('fee_charged'), count=Count('id'))
+    values = {
+        'drivers': Driver.objects.count(),
+        'vehicles': Vehicle.objects.count(),
+        'queue_history': QueueHistory.objects.count(),
+        'deposit_total': deposits['total'] or zero,
+        'deposit_count': deposits['count'],
+        'wallet_balance_total': Wallet.objects.aggregate(total=Sum('balance'))['total'] or zero,
+        'fee_total': (entries['total'] or zero) + (archived['total'] or zero),
+        'entry_count': entries['count'] + archived['count'],
+        'profit_total': Profit.objects.aggregate(total=Sum('amount'))['total'] or zero,
+    }
+    Counter.objects.bulk_create([Counter(name=name, value=value) for name, value in values.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_dailyfinancerollup'),
+        ('terminal', '0014_entrylogarchive_created_idx'),
+        ('vehicles', '0015_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('name', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Dashboard Counter',
+                'verbose_name_plural': 'Dashboard Counters',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
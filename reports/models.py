@@ -1,6 +1,10 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 from accounts.models import CustomUser
+from vehicles.models import Deposit, Driver, QueueHistory, Vehicle, Wallet
 
 
 class Profit(models.Model):
@@ -22,3 +26,168 @@ class Profit(models.Model):
 
     def __str__(self):
         return f"₱{self.amount} - {self.date_recorded.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+class DailyFinanceRollup(models.Model):
+    """
+    Running finance totals per local day, route and payment method, kept up to
+    date by reports/rollups.py in the same transaction as the deposit / entry.
+    Terminal fees use the "wallet" method; profit records have no route and an
+    empty method.  Rebuild with `manage.py backfill_finance_rollups`.
+    """
+    day = models.DateField()
+    # No FK constraint: the totals keep the id of a route that was deleted later
+    route = models.ForeignKey(
+        'vehicles.Route',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    payment_method = models.CharField(max_length=20, blank=True)
+
+    deposit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    deposit_count = models.PositiveIntegerField(default=0)
+    fee_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    profit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['day']
+        verbose_name = "Daily Finance Rollup"
+        verbose_name_plural = "Daily Finance Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'route', 'payment_method'], condition=Q(route__isnull=False),
+                                    name='finance_rollup_day_route_method'),
+            models.UniqueConstraint(fields=['day', 'payment_method'], condition=Q(route__isnull=True),
+                                    name='finance_rollup_day_method_noroute'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='finance_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} route={self.route_id or '-'} {self.payment_method or 'profit'}"
+
+
+class DashboardCounter(models.Model):
+    """
+    One running total for the dashboards (driver count, deposit total, ...),
+    kept up to date by reports/counters.py as the underlying rows change.
+    Rebuild with `manage.py repair_dashboard_counters`.
+    """
+    name = models.CharField(max_length=40, primary_key=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Dashboard Counter"
+        verbose_name_plural = "Dashboard Counters"
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+# ======================================================
+# SIGNALS (entry fees are recorded by terminal/gate.py)
+# ======================================================
+@receiver(pre_save, sender=Deposit)
+def remember_previous_deposit(sender, instance, **kwargs):
+    if instance.pk:
+        previous = Deposit.objects.filter(pk=instance.pk).values_list('amount', 'payment_method').first()
+        if previous:
+            instance._previous_amount, instance._previous_payment_method = previous
+
+
+@receiver(post_save, sender=Deposit)
+def rollup_deposit(sender, instance, created, **kwargs):
+    from .rollups import record_deposit
+    if created:
+        record_deposit(instance)
+        return
+    previous_amount = getattr(instance, '_previous_amount', None)
+    if previous_amount is None:
+        return
+    previous_method = instance._previous_payment_method
+    if (previous_method or '') != (instance.payment_method or ''):
+        # Moved to another payment method's row
+        record_deposit(instance, amount=-previous_amount, count=-1, payment_method=previous_method)
+        record_deposit(instance)
+    elif instance.amount != previous_amount:
+        record_deposit(instance, amount=instance.amount - previous_amount, count=0)
+
+
+@receiver(post_delete, sender=Deposit)
+def unroll_deposit(sender, instance, **kwargs):
+    from .rollups import record_deposit
+    record_deposit(instance, amount=-instance.amount, count=-1)
+
+
+@receiver(pre_save, sender=Profit)
+def remember_profit_day(sender, instance, **kwargs):
+    if instance.pk:
+        previous = Profit.objects.filter(pk=instance.pk).values_list('date_recorded', 'amount').first()
+        if previous:
+            instance._previous_date, instance._previous_amount = previous
+
+
+@receiver(post_save, sender=Profit)
+@receiver(post_delete, sender=Profit)
+def rollup_profit(sender, instance, **kwargs):
+    from .rollups import refresh_profit_days
+    refresh_profit_days([instance.date_recorded, getattr(instance, '_previous_date', None)])
+
+
+# Dashboard counters (bulk writes and wallet balances are counted by their callers, see reports/counters.py)
+@receiver(post_save, sender=Driver)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_save, sender=QueueHistory)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        from . import counters
+        counters.add(**{counters.MODEL_COUNTERS[sender]: 1})
+
+
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_delete, sender=QueueHistory)
+def count_deleted(sender, instance, **kwargs):
+    from . import counters
+    counters.add(**{counters.MODEL_COUNTERS[sender]: -1})
+
+
+@receiver(post_save, sender=Deposit)
+def count_deposit(sender, instance, created, **kwargs):
+    from . import counters
+    if created:
+        counters.add(deposit_total=instance.amount, deposit_count=1)
+    elif getattr(instance, '_previous_amount', None) is not None:
+        counters.add(deposit_total=instance.amount - instance._previous_amount)
+
+
+@receiver(post_delete, sender=Deposit)
+def uncount_deposit(sender, instance, **kwargs):
+    from . import counters
+    counters.add(deposit_total=-instance.amount, deposit_count=-1)
+
+
+@receiver(post_delete, sender=Wallet)
+def uncount_wallet(sender, instance, **kwargs):
+    from . import counters
+    counters.add(wallet_balance_total=-instance.balance)
+
+
+@receiver(post_save, sender=Profit)
+def count_profit(sender, instance, created, **kwargs):
+    from . import counters
+    counters.add(profit_total=instance.amount - getattr(instance, '_previous_amount', 0))
+
+
+@receiver(post_delete, sender=Profit)
+def uncount_profit(sender, instance, **kwargs):
+    from . import counters
+    counters.add(profit_total=-instance.amount)
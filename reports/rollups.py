@@ -0,0 +1,174 @@
+# reports/rollups.py
+"""
+Maintenance and reads of DailyFinanceRollup.
+
+Writers add to one (day, route, payment method) row with a single
+UPDATE ... SET total = total + x; the row is created on first use.  They run
+inside the caller's transaction, so a rolled-back deposit or entry never
+reaches the totals.  Readers get any date range with one query on the day
+index, however long the range is.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyFinanceRollup, Profit
+
+# payment_method of terminal fee rows (fees are always paid from the wallet)
+FEE_METHOD = "wallet"
+
+_TOTAL_FIELDS = ("deposit_total", "deposit_count", "fee_total", "entry_count", "profit_total")
+
+
+def _add(day, route_id, payment_method, **amounts):
+    """Add `amounts` (field=increment) to one rollup row, creating it if needed."""
+    row = DailyFinanceRollup.objects.filter(day=day, route_id=route_id, payment_method=payment_method)
+    changes = {field: F(field) + value for field, value in amounts.items()}
+    changes["updated_at"] = timezone.now()
+    if row.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyFinanceRollup.objects.create(day=day, route_id=route_id, payment_method=payment_method, **amounts)
+    except IntegrityError:
+        # Created concurrently by another transaction
+        row.update(**changes)
+
+
+def record_deposit(deposit, amount=None, count=1, payment_method=None):
+    """
+    Add a saved deposit to its day's rollup.  Deletes and edits pass signed
+    corrections: `amount` / `count` (default: the deposit's amount, 1) and the
+    `payment_method` bucket they apply to (default: the deposit's).
+    """
+    from vehicles.models import Vehicle
+
+    route_id = Vehicle.objects.filter(wallet__id=deposit.wallet_id).values_list("route_id", flat=True).first()
+    if payment_method is None:
+        payment_method = deposit.payment_method
+    _add(
+        timezone.localdate(deposit.created_at), route_id, payment_method or "",
+        deposit_total=deposit.amount if amount is None else amount, deposit_count=count,
+    )
+
+
+def record_deposits(deposits):
+    """record_deposit() for many saved deposits (e.g. from bulk_create), one update per rollup row."""
+    from vehicles.models import Vehicle
+
+    routes = dict(
+        Vehicle.objects.filter(wallet__id__in={deposit.wallet_id for deposit in deposits})
+        .values_list("wallet__id", "route_id")
+    )
+    buckets = defaultdict(lambda: [Decimal("0.00"), 0])
+    for deposit in deposits:
+        bucket = buckets[(timezone.localdate(deposit.created_at), routes.get(deposit.wallet_id),
+                          deposit.payment_method or "")]
+        bucket[0] += deposit.amount
+        bucket[1] += 1
+    for (day, route_id, payment_method), (total, count) in buckets.items():
+        _add(day, route_id, payment_method, deposit_total=total, deposit_count=count)
+
+
+def record_entry(fee, route_id, created_at):
+    """Record the fee of one successful terminal entry."""
+    _add(timezone.localdate(created_at), route_id, FEE_METHOD, fee_total=fee, entry_count=1)
+
+
+def refresh_profit_days(moments):
+    """Recompute the profit bucket of the local days of `moments` (datetimes; None ignored)."""
+    from terminal.history import local_date_range
+
+    for day in {timezone.localdate(moment) for moment in moments if moment}:
+        total = Profit.objects.filter(
+            **local_date_range("date_recorded", day, day)
+        ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
+        updated = DailyFinanceRollup.objects.filter(day=day, route__isnull=True, payment_method="").update(
+            profit_total=total, updated_at=timezone.now()
+        )
+        if not updated and total:
+            _add(day, None, "", profit_total=total)
+
+
+def daily_totals(start_date, end_date, route_id=None):
+    """
+    {day: {"deposit_total", "deposit_count", "fee_total", "entry_count", "profit_total"}}
+    for start_date..end_date (inclusive), summed over routes and payment methods.
+    Days without activity are absent.
+    """
+    rows = DailyFinanceRollup.objects.filter(day__gte=start_date, day__lte=end_date)
+    if route_id:
+        rows = rows.filter(route_id=route_id)
+    return {
+        row.pop("day"): row
+        for row in rows.values("day").annotate(**{field: Sum(field) for field in _TOTAL_FIELDS}).order_by()
+    }
+
+
+def rebuild(start_date=None, end_date=None):
+    """
+    Recompute the rollups of a local date range (everything when both are None)
+    from Deposit, EntryLog, EntryLogArchive and Profit.  Returns the number of rows written.
+    """
+    from terminal.history import local_date_range
+    from terminal.models import EntryLog, EntryLogArchive
+    from vehicles.models import Deposit
+
+    totals = defaultdict(lambda: dict.fromkeys(_TOTAL_FIELDS, 0))
+
+    deposits = Deposit.objects.all()
+    entries = EntryLog.objects.filter(status=EntryLog.STATUS_SUCCESS)
+    archived = EntryLogArchive.objects.filter(status=EntryLog.STATUS_SUCCESS)
+    profits = Profit.objects.all()
+    rollups = DailyFinanceRollup.objects.all()
+    if start_date or end_date:
+        deposits = deposits.filter(**local_date_range("created_at", start_date, end_date))
+        entries = entries.filter(**local_date_range("created_at", start_date, end_date))
+        profits = profits.filter(**local_date_range("date_recorded", start_date, end_date))
+        if start_date:
+            archived = archived.filter(local_day__gte=start_date)
+            rollups = rollups.filter(day__gte=start_date)
+        if end_date:
+            archived = archived.filter(local_day__lte=end_date)
+            rollups = rollups.filter(day__lte=end_date)
+
+    for row in (
+        deposits.annotate(day=TruncDate("created_at"))
+        .values("day", "wallet__vehicle__route_id", "payment_method")
+        .annotate(total=Sum("amount"), count=Count("id"))
+    ):
+        bucket = totals[(row["day"], row["wallet__vehicle__route_id"], row["payment_method"] or "")]
+        bucket["deposit_total"] += row["total"] or 0
+        bucket["deposit_count"] += row["count"]
+
+    for row in (
+        entries.annotate(day=TruncDate("created_at"))
+        .values("day", "vehicle__route_id")
+        .annotate(total=Sum("fee_charged"), count=Count("id"))
+    ):
+        bucket = totals[(row["day"], row["vehicle__route_id"], FEE_METHOD)]
+        bucket["fee_total"] += row["total"] or 0
+        bucket["entry_count"] += row["count"]
+
+    for row in archived.values("local_day", "route_id").annotate(total=Sum("fee_charged"), count=Count("id")):
+        bucket = totals[(row["local_day"], row["route_id"], FEE_METHOD)]
+        bucket["fee_total"] += row["total"] or 0
+        bucket["entry_count"] += row["count"]
+
+    for row in profits.annotate(day=TruncDate("date_recorded")).values("day").annotate(total=Sum("amount")):
+        totals[(row["day"], None, "")]["profit_total"] += row["total"] or 0
+
+    with transaction.atomic():
+        rollups.delete()
+        DailyFinanceRollup.objects.bulk_create(
+            [
+                DailyFinanceRollup(day=day, route_id=route_id, payment_method=method, **amounts)
+                for (day, route_id, method), amounts in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
@@ -0,0 +1,180 @@
+# reports/snapshots.py
+"""
+Short-lived snapshots of the admin dashboard payloads.
+
+Every open admin dashboard polls its data endpoint, and they all asked for
+the same totals, 7-day chart and recent queue at the same moment.  get()
+keeps each computed payload in the Django cache for
+DASHBOARD_SNAPSHOT_SECONDS, and a payload is recomputed by one caller at a
+time ("single flight"):
+
+- within a worker, a per-snapshot lock: threads that find an older payload
+  reuse it instead of waiting, the others wait for the recompute;
+- across workers (when CACHE_URL points at a shared cache), a cache.add()
+  lock: other workers reuse the previous payload, or wait up to
+  DASHBOARD_SNAPSHOT_WAIT_SECONDS for the new one when there is none.
+
+A payload older than the TTL stays in the cache for STALE_SECONDS more,
+only to be reused while its replacement is computed.
+"""
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from terminal.models import EntryLog
+from vehicles.models import Deposit, QueueHistory
+
+from . import counters, rollups
+
+# Seconds a snapshot is served before it is recomputed
+SNAPSHOT_SECONDS = getattr(settings, "DASHBOARD_SNAPSHOT_SECONDS", 5)
+
+# Longest wait for another worker's recompute when there is no previous snapshot
+WAIT_SECONDS = getattr(settings, "DASHBOARD_SNAPSHOT_WAIT_SECONDS", 5)
+
+# How long an expired snapshot can still be reused while it's recomputed
+STALE_SECONDS = 60
+
+# A recompute lock left behind by a worker that died expires after this
+LOCK_SECONDS = 30
+
+POLL_SECONDS = 0.05
+
+KEY_PREFIX = "dashboard-snapshot:"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+# -------------------------
+# SINGLE FLIGHT
+# -------------------------
+def _process_lock(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _fresh(entry):
+    # Wall clock: built_at may come from another worker
+    return entry is not None and time.time() - entry["built_at"] < SNAPSHOT_SECONDS
+
+
+def _store(key, build):
+    payload = build()
+    cache.set(key, {"payload": payload, "built_at": time.time()}, SNAPSHOT_SECONDS + STALE_SECONDS)
+    return payload
+
+
+def _recompute(key, build, previous):
+    entry = cache.get(key)
+    if _fresh(entry):
+        return entry["payload"]
+    previous = entry or previous
+
+    lock_key, token = f"{key}:lock", uuid.uuid4().hex
+    if cache.add(lock_key, token, LOCK_SECONDS):
+        try:
+            return _store(key, build)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    # Another worker is recomputing it
+    if previous is not None:
+        return previous["payload"]
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["payload"]
+    # That worker is slow or gone
+    return _store(key, build)
+
+
+def get(name, build):
+    """The snapshot `name`, recomputed with build() (no arguments) when it is older than the TTL."""
+    key = KEY_PREFIX + name
+    entry = cache.get(key)
+    if _fresh(entry):
+        return entry["payload"]
+
+    lock = _process_lock(name)
+    if entry is not None:
+        if not lock.acquire(blocking=False):
+            # Another thread of this worker is recomputing it
+            return entry["payload"]
+    else:
+        lock.acquire()
+    try:
+        return _recompute(key, build, entry)
+    finally:
+        lock.release()
+
+
+# -------------------------
+# DASHBOARDS
+# -------------------------
+def _last_7_days():
+    today = timezone.localdate()
+    return [today - timedelta(days=i) for i in range(6, -1, -1)]
+
+
+def _build_admin_dashboard():
+    counts = counters.values()
+    days = _last_7_days()
+    totals = rollups.daily_totals(days[0], days[-1])
+    recent_queues = list(
+        EntryLog.objects.filter(is_active=True, status=EntryLog.STATUS_SUCCESS)
+        .order_by("-created_at")[:10]
+        .values("vehicle__license_plate", "vehicle__assigned_driver__first_name",
+                "vehicle__assigned_driver__last_name")
+    )
+    return {
+        "total_drivers": counts[counters.DRIVERS],
+        "total_vehicles": counts[counters.VEHICLES],
+        "total_queue": counts[counters.QUEUE_HISTORY],
+        "total_deposits": float(counts[counters.DEPOSIT_TOTAL]),
+        "total_revenue": float(counts[counters.FEE_TOTAL]),
+        "total_profit": float(counts[counters.PROFIT_TOTAL]),
+        "chart_labels": [day.strftime("%b %d") for day in days],
+        "chart_data": [float(totals.get(day, {}).get("profit_total") or 0) for day in days],
+        "recent_queues": recent_queues,
+    }
+
+
+def admin_dashboard():
+    """Totals, 7-day profit chart and recent queue entries (accounts admin dashboard)."""
+    return get("admin", _build_admin_dashboard)
+
+
+def _build_fleet_dashboard():
+    counts = counters.values()
+    days = _last_7_days()
+    totals = rollups.daily_totals(days[0], days[-1])
+    return {
+        "total_drivers": counts[counters.DRIVERS],
+        "total_vehicles": counts[counters.VEHICLES],
+        "total_profit": float(counts[counters.DEPOSIT_TOTAL]),
+        "wallet_total": float(counts[counters.WALLET_BALANCE_TOTAL]),
+        "recent_deposits": list(
+            Deposit.objects.order_by("-created_at")[:5]
+            .values("reference_number", "amount", "created_at", "wallet__vehicle__license_plate")
+        ),
+        "recent_queues": list(
+            QueueHistory.objects.order_by("-timestamp")[:5]
+            .values("vehicle__license_plate", "action", "timestamp")
+        ),
+        "chart_labels": [day.strftime("%b %d") for day in days],
+        "chart_data": [float(totals.get(day, {}).get("deposit_total") or 0) for day in days],
+    }
+
+
+def fleet_dashboard():
+    """Totals, 7-day deposit chart, recent deposits and queue events (vehicles admin_dashboard_data)."""
+    return get("fleet", _build_fleet_dashboard)
@@ -4,11 +4,11 @@ from django.db.models import Sum
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.utils import timezone
 from datetime import timedelta, datetime
-from decimal import Decimal
 from accounts.utils import is_admin
 from vehicles.models import Deposit
-from terminal.models import EntryLog, SystemSettings
+from terminal.models import SystemSettings
 from .models import Profit
+from . import rollups
 
 
 # ============================================================
@@ -32,18 +32,14 @@ def deposit_analytics(request):
     now = timezone.localtime()
     start_date = now - timedelta(days=6)  # Last 7 days (including today)
 
-    # 🟦 Compute daily totals for the past 7 days
+    # 🟦 Daily totals for the past 7 days (one rollup query)
+    totals = rollups.daily_totals(start_date.date(), now.date())
     labels = []
     daily_totals = []
     for i in range(7):
         day = (start_date + timedelta(days=i)).date()
-        total = (
-            Deposit.objects.filter(created_at__date=day)
-            .aggregate(total=Sum("amount"))["total"]
-            or Decimal("0.00")
-        )
         labels.append(day.strftime("%b %d"))
-        daily_totals.append(float(total))
+        daily_totals.append(float(totals.get(day, {}).get("deposit_total") or 0))
 
     total_deposits = sum(daily_totals)
 
@@ -85,23 +81,16 @@ def deposit_vs_revenue(request):
 
     chart_labels, deposits_data, revenue_data = [], [], []
 
+    # Deposits and terminal fees per day (one rollup query)
+    totals = rollups.daily_totals(start_date, end_date)
+
     for i in range((end_date - start_date).days + 1):
         day = start_date + timedelta(days=i)
         chart_labels.append(day.strftime("%b %d"))
 
-        daily_deposit = (
-            Deposit.objects.filter(created_at__date=day)
-            .aggregate(total=Sum("amount"))["total"]
-            or Decimal("0.00")
-        )
-        deposits_data.append(float(daily_deposit))
-
-        daily_revenue = (
-            EntryLog.objects.filter(created_at__date=day, status="success")
-            .aggregate(total=Sum("fee_charged"))["total"]
-            or Decimal("0.00")
-        )
-        revenue_data.append(float(daily_revenue))
+        day_totals = totals.get(day, {})
+        deposits_data.append(float(day_totals.get("deposit_total") or 0))
+        revenue_data.append(float(day_totals.get("fee_total") or 0))
 
     context = {
         "chart_labels": chart_labels,
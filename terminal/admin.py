@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TerminalFeeBalance, EntryLog, SystemSettings
+from .models import TerminalFeeBalance, EntryLog, EntryLogArchive, ScanReceipt, SystemSettings
 
 admin.site.register(SystemSettings)
 
@@ -17,3 +17,32 @@ class EntryLogAdmin(admin.ModelAdmin):
     list_filter = ("status", "staff")
     search_fields = ("vehicle__plate_number", "staff__username")
     ordering = ("-created_at",)
+
+
+@admin.register(EntryLogArchive)
+class EntryLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ("license_plate", "driver_name", "status", "fee_charged", "created_at", "local_day")
+    list_filter = ("status", "local_day")
+    search_fields = ("license_plate", "driver_name", "staff__username")
+    ordering = ("-created_at",)
+
+    # Append-only history
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ScanReceipt)
+class ScanReceiptAdmin(admin.ModelAdmin):
+    list_display = ("qr_value", "result", "device_id", "staff", "scanned_at", "received_at")
+    list_filter = ("result", "device_id")
+    search_fields = ("qr_value", "idempotency_key", "device_id")
+    ordering = ("-received_at",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
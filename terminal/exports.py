@@ -0,0 +1,109 @@
+# terminal/exports.py
+"""
+Streaming CSV exports for queue history and deposits.
+
+Rows are read as values() projections with iterator(chunk_size=...), which
+uses a server-side cursor on PostgreSQL, and written to a
+StreamingHttpResponse as they arrive, so neither the worker's memory nor
+the time to first byte grows with the exported range.
+"""
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from vehicles.models import Deposit, Route
+from vehicles.search import search_vehicles
+from . import history
+
+# Rows fetched per round trip while streaming
+CHUNK_SIZE = 2000
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_response(filename, header, rows):
+    """StreamingHttpResponse writing `header` and then each row of the `rows` iterable."""
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _local(moment):
+    return timezone.localtime(moment).strftime("%Y-%m-%d %H:%M") if moment else ""
+
+
+def queue_history_csv(start_date=None, end_date=None, status=None, route_id=None):
+    """Live + archived entry logs, newest first."""
+    route_names = dict(Route.objects.values_list("id", "name"))
+    rows = (
+        [
+            log["plate"] or "N/A",
+            log["driver"] or "N/A",
+            route_names.get(log["route_id"], "N/A"),
+            log["status"].title(),
+            f"₱{log['fee_charged']}",
+            log["staff"] or "N/A",
+            _local(log["created_at"]),
+            _local(log["departed_at"]),
+        ]
+        for log in history.history_rows(start_date, end_date, status, route_id, chunk_size=CHUNK_SIZE)
+    )
+    return csv_response(
+        "queue_history.csv",
+        ["Plate", "Driver", "Route", "Status", "Fee", "Staff", "Entry Time", "Departure Time"],
+        rows,
+    )
+
+
+def filter_deposits(queryset, start_date=None, end_date=None, status=None, route_id=None, plate=None):
+    """Apply the deposit list / export filters to a Deposit queryset."""
+    if start_date or end_date:
+        queryset = queryset.filter(**history.local_date_range("created_at", start_date, end_date))
+    if status:
+        queryset = queryset.filter(status=status)
+    if route_id:
+        queryset = queryset.filter(wallet__vehicle__route_id=route_id)
+    if plate:
+        queryset = queryset.filter(wallet__vehicle__in=search_vehicles(plate).values("pk"))
+    return queryset
+
+
+def deposits_csv(start_date=None, end_date=None, status=None, route_id=None, plate=None):
+    """Deposits, newest first."""
+    deposits = filter_deposits(Deposit.objects.all(), start_date, end_date, status, route_id, plate)
+    rows = (
+        [
+            d["reference_number"],
+            f"{d['wallet__vehicle__assigned_driver__last_name']}, {d['wallet__vehicle__assigned_driver__first_name']}"
+            if d["wallet__vehicle__assigned_driver__last_name"] else "N/A",
+            d["wallet__vehicle__license_plate"] or "N/A",
+            d["wallet__vehicle__route__name"] or "N/A",
+            f"₱{d['amount']}",
+            d["payment_method"],
+            d["status"],
+            _local(d["created_at"]),
+        ]
+        for d in deposits.order_by("-created_at", "-id").values(
+            "reference_number", "amount", "payment_method", "status", "created_at",
+            "wallet__vehicle__license_plate", "wallet__vehicle__route__name",
+            "wallet__vehicle__assigned_driver__first_name", "wallet__vehicle__assigned_driver__last_name",
+        ).iterator(chunk_size=CHUNK_SIZE)
+    )
+    return csv_response(
+        "deposits.csv",
+        ["Reference", "Driver", "Vehicle", "Route", "Amount", "Payment Method", "Status", "Date"],
+        rows,
+    )
@@ -0,0 +1,251 @@
+# terminal/gate.py
+"""
+Gate scan processing: one QR scan either enters a vehicle (charging the
+terminal fee) or departs it if it is already inside.
+
+A scan runs as a single transaction:
+
+1. one query for anything blocking an entry (an active entry, or a
+   successful entry inside the cooldown window);
+2. if the vehicle is inside, a conditional UPDATE closes that entry;
+3. otherwise one conditional
+   UPDATE wallet SET balance = balance - fee
+   WHERE balance >= fee AND balance >= min_deposit RETURNING balance
+   debits the wallet.  The row lock it takes serializes concurrent scans
+   of the same vehicle, so the blocking check is repeated under the lock
+   before the EntryLog row is inserted, and the fee is booked in the
+   wallet ledger (vehicles/ledger.py) against that EntryLog.
+
+Deposits update the balance with an F() expression, so nothing is lost
+when a deposit and a scan hit the same wallet at the same time.
+
+Gate devices that lost their connection upload queued scans through
+process_batch(), which applies them in order with the same rules, at the
+time they were scanned, exactly once per idempotency key (ScanReceipt).
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from reports import counters
+from reports.rollups import record_entry
+from vehicles import ledger
+from vehicles.models import Wallet, WalletLedgerEntry
+from vehicles.qr_cache import qr_cache
+from .live_queue import live_queue
+from .models import EntryLog, ScanReceipt
+
+logger = logging.getLogger(__name__)
+
+# Oldest offline scan (hours) still applied; older ones are rejected as stale
+OFFLINE_SCAN_MAX_AGE_HOURS = getattr(settings, "GATE_OFFLINE_SCAN_MAX_AGE_HOURS", 24)
+
+# Values of the "result" key returned by process_scan()
+RESULT_ENTRY = "entry"
+RESULT_DEPARTURE = "departure"
+RESULT_COOLDOWN = "cooldown"
+RESULT_MIN_DEPOSIT = "min_deposit"
+RESULT_INSUFFICIENT = "insufficient"
+RESULT_INVALID = "invalid"
+RESULT_STALE = "stale"
+RESULT_FAILED = "failed"
+
+_DEBIT_SQL = (
+    "UPDATE {table} SET balance = balance - %s, updated_at = %s "
+    "WHERE vehicle_id = %s AND balance >= %s AND balance >= %s "
+    "RETURNING id, balance"
+).format(table=Wallet._meta.db_table)
+
+
+class _Blocked(Exception):
+    """Raised under the wallet lock to roll back a debit that lost a race."""
+
+    def __init__(self, blocker):
+        self.blocker = blocker
+
+
+def _blocking_entry(vehicle_id, cooldown_since):
+    """The active entry of a vehicle, else its latest successful entry after `cooldown_since`."""
+    return (
+        EntryLog.objects.filter(vehicle_id=vehicle_id)
+        .filter(Q(is_active=True) | Q(status=EntryLog.STATUS_SUCCESS, created_at__gt=cooldown_since))
+        .order_by("-is_active", "-created_at")
+        .values("id", "is_active")
+        .first()
+    )
+
+
+def _balance(vehicle_id):
+    return Wallet.objects.filter(vehicle_id=vehicle_id).values_list("balance", flat=True).first() or Decimal("0.00")
+
+
+def _result(result, status, message, balance):
+    return {
+        "status": status,
+        "result": result,
+        "message": message,
+        "balance": float(balance) if balance is not None else None,
+    }
+
+
+def _cooldown(vehicle_id):
+    return _result(RESULT_COOLDOWN, "error", "⏳ Please wait before re-entry.", _balance(vehicle_id))
+
+
+def _depart(vehicle, entry_id, now):
+    # Conditional so two gates closing the same entry only close it once
+    closed = EntryLog.objects.filter(pk=entry_id, is_active=True).update(
+        is_active=False, departed_at=now, message=f"Vehicle '{vehicle.plate}' departed."
+    )
+    if not closed:
+        return _result(RESULT_COOLDOWN, "error", f"⏳ {vehicle.plate} just departed.", _balance(vehicle.id))
+    transaction.on_commit(lambda: live_queue.discard([entry_id]))
+    return _result(RESULT_DEPARTURE, "success", f"✅ {vehicle.plate} departed successfully.", _balance(vehicle.id))
+
+
+def _debit(vehicle_id, fee, min_deposit, now):
+    """
+    Charge `fee` if the balance covers both the fee and the minimum deposit;
+    returns (wallet id, new balance), or None.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_DEBIT_SQL, [fee, now, vehicle_id, fee, min_deposit])
+        row = cursor.fetchone()
+    return (row[0], Decimal(str(row[1])).quantize(Decimal("0.01"))) if row else None
+
+
+def process_scan(vehicle, staff, fee, min_deposit, cooldown_minutes, now=None, backdate=False):
+    """
+    Apply one gate scan for `vehicle` (anything with .id, .plate and .route_id,
+    e.g. a vehicles.qr_cache.CachedVehicle).  Returns a JSON-ready dict with
+    status, result (one of the RESULT_* values), message and balance.
+    With `backdate`, a new entry is recorded as created at `now`.
+    """
+    now = now or timezone.now()
+    fee, min_deposit = Decimal(str(fee)), Decimal(str(min_deposit))
+    cooldown_since = now - timedelta(minutes=int(cooldown_minutes))
+
+    try:
+        with transaction.atomic():
+            blocker = _blocking_entry(vehicle.id, cooldown_since)
+            if blocker and blocker["is_active"]:
+                return _depart(vehicle, blocker["id"], now)
+            if blocker:
+                return _cooldown(vehicle.id)
+
+            debited = _debit(vehicle.id, fee, min_deposit, now)
+            if debited is None:
+                balance = _balance(vehicle.id)
+                if balance < min_deposit:
+                    return _result(RESULT_MIN_DEPOSIT, "error",
+                                   f"⚠️ Minimum ₱{min_deposit} required before entry.", balance)
+                EntryLog.objects.create(
+                    vehicle_id=vehicle.id,
+                    staff=staff,
+                    fee_charged=fee,
+                    status=EntryLog.STATUS_INSUFFICIENT,
+                    message=f"Insufficient balance for '{vehicle.plate}'.",
+                    is_active=False,
+                )
+                return _result(RESULT_INSUFFICIENT, "error", f"❌ Insufficient balance for {vehicle.plate}.", balance)
+            wallet_id, balance = debited
+
+            # We hold the wallet row lock now: re-check against scans that committed meanwhile
+            blocker = _blocking_entry(vehicle.id, cooldown_since)
+            if blocker:
+                raise _Blocked(blocker)
+
+            log = EntryLog.objects.create(
+                vehicle_id=vehicle.id,
+                staff=staff,
+                fee_charged=fee,
+                status=EntryLog.STATUS_SUCCESS,
+                message=f"Vehicle '{vehicle.plate}' entered terminal.",
+            )
+            if backdate:
+                # created_at is auto_now_add; offline entries keep their scan time
+                EntryLog.objects.filter(pk=log.pk).update(created_at=now)
+                log.created_at = now
+            ledger.record(wallet_id, -fee, balance, WalletLedgerEntry.SOURCE_ENTRY_FEE, log.pk)
+            record_entry(fee, vehicle.route_id, log.created_at)
+            counters.add(fee_total=fee, entry_count=1)
+            transaction.on_commit(lambda: live_queue.add(log))
+            return _result(RESULT_ENTRY, "success", f"🚗 {vehicle.plate} entered terminal.", balance)
+    except _Blocked as blocked:
+        # The debit was rolled back: a concurrent scan of the same vehicle entered it first
+        if blocked.blocker["is_active"]:
+            return _result(RESULT_COOLDOWN, "error", f"⏳ {vehicle.plate} just entered the terminal.",
+                           _balance(vehicle.id))
+        return _cooldown(vehicle.id)
+
+
+def process_batch(scans, staff, fee, min_deposit, cooldown_minutes, device_id=""):
+    """
+    Apply an ordered list of offline scans, each {"key", "qr_code", "scanned_at"}
+    (scanned_at an aware datetime), in one transaction.  Returns one result
+    per scan, in order: the process_scan() dict plus "key" and "duplicate"
+    (True when the key was already applied, with the stored response).
+    A scan hitting any other integrity error is not applied and gets no
+    receipt, so the device can upload it again.
+    """
+    server_now = timezone.now()
+    max_age = timedelta(hours=OFFLINE_SCAN_MAX_AGE_HOURS)
+    results = []
+    with transaction.atomic():
+        stored = dict(
+            ScanReceipt.objects.filter(idempotency_key__in=[scan["key"] for scan in scans])
+            .values_list("idempotency_key", "response")
+        )
+        for scan in scans:
+            key = scan["key"]
+            if key in stored:
+                results.append({**stored[key], "key": key, "duplicate": True})
+                continue
+
+            # Device clocks drift: never apply a scan in the future
+            scanned_at = min(scan["scanned_at"], server_now)
+            duplicate = False
+            try:
+                with transaction.atomic():
+                    vehicle = qr_cache.lookup(scan["qr_code"])
+                    if vehicle is None:
+                        response = _result(RESULT_INVALID, "error", "❌ Invalid QR code.", None)
+                    elif server_now - scanned_at > max_age:
+                        response = _result(RESULT_STALE, "error",
+                                           f"⌛ Scan of {vehicle.plate} is too old to apply.", None)
+                    else:
+                        response = process_scan(vehicle, staff, fee, min_deposit, cooldown_minutes,
+                                                now=scanned_at, backdate=True)
+                    try:
+                        ScanReceipt.objects.create(
+                            idempotency_key=key,
+                            device_id=device_id,
+                            qr_value=scan["qr_code"][:255],
+                            scanned_at=scanned_at,
+                            staff=staff,
+                            result=response["result"],
+                            response=response,
+                        )
+                    except IntegrityError:
+                        duplicate = True
+                        raise
+            except IntegrityError:
+                # Our savepoint is rolled back, so the scan was not applied
+                if duplicate:
+                    # The same key was applied by a concurrent upload
+                    response = ScanReceipt.objects.filter(idempotency_key=key).values_list("response", flat=True).first()
+                    results.append({**(response or {}), "key": key, "duplicate": True})
+                else:
+                    logger.exception("Offline scan %s could not be applied", key)
+                    response = _result(RESULT_FAILED, "error",
+                                       "❌ The scan could not be applied yet; it will be uploaded again.", None)
+                    results.append({**response, "key": key, "duplicate": False})
+                continue
+            stored[key] = response
+            results.append({**response, "key": key, "duplicate": False})
+    return results
@@ -0,0 +1,172 @@
+# terminal/history.py
+"""
+One query API over the complete entry history: live EntryLog rows plus the
+append-only EntryLogArchive.  Reporting views read through these helpers so
+their numbers don't change when maintenance archives departed entries.
+
+Date filters are local (Asia/Manila) dates, applied as half-open
+created_at ranges on the live table (so the created_at indexes are usable,
+unlike `created_at__date`) and as `local_day` on the archive.
+"""
+import heapq
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from rdfs.pagination import keyset_filter, reverse_ordering
+from .models import EntryLog, EntryLogArchive
+
+
+def local_day_start(day):
+    """Aware datetime at local midnight of `day` (a date or 'YYYY-MM-DD' string)."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_date_range(field, start_date=None, end_date=None):
+    """
+    Filter kwargs selecting local dates start_date..end_date (inclusive) on a
+    DateTimeField as an index-friendly range, e.g.
+    Deposit.objects.filter(**local_date_range("created_at", "2025-01-01", "2025-01-31")).
+    """
+    lookups = {}
+    if start_date:
+        lookups[f"{field}__gte"] = local_day_start(start_date)
+    if end_date:
+        if isinstance(end_date, str):
+            end_date = date.fromisoformat(end_date)
+        lookups[f"{field}__lt"] = local_day_start(end_date + timedelta(days=1))
+    return lookups
+
+
+def _filtered(start_date=None, end_date=None, status=None, route_id=None):
+    """Return (live queryset, archive queryset) with the same filters applied."""
+    live = EntryLog.objects.all()
+    archive = EntryLogArchive.objects.all()
+    if start_date or end_date:
+        live = live.filter(**local_date_range("created_at", start_date, end_date))
+    if start_date:
+        archive = archive.filter(local_day__gte=start_date)
+    if end_date:
+        archive = archive.filter(local_day__lte=end_date)
+    if status:
+        live = live.filter(status=status)
+        archive = archive.filter(status=status)
+    if route_id:
+        live = live.filter(vehicle__route_id=route_id)
+        archive = archive.filter(route_id=route_id)
+    return live, archive
+
+
+def _live_row(row):
+    first, last = row.pop("vehicle__assigned_driver__first_name"), row.pop("vehicle__assigned_driver__last_name")
+    row["driver"] = f"{first} {last}" if first or last else None
+    row["plate"] = row.pop("vehicle__license_plate")
+    row["route_id"] = row.pop("vehicle__route_id")
+    row["staff"] = row.pop("staff__username")
+    row["archived"] = False
+    return row
+
+
+def _archive_row(row):
+    row["id"] = row.pop("entry_log_id")
+    row["plate"] = row.pop("license_plate") or None
+    row["driver"] = row.pop("driver_name") or None
+    row["staff"] = row.pop("staff__username")
+    row["archived"] = True
+    return row
+
+
+def history_rows(start_date=None, end_date=None, status=None, route_id=None, chunk_size=2000,
+                 after=None, oldest_first=False):
+    """
+    Iterate over every matching entry, newest first, as flat dicts:
+    id, plate, driver, route_id, status, fee_charged, staff, created_at, departed_at, archived.
+    Both tables are streamed (values() + iterator()) and merged on (created_at, id).
+    With `after` (a (created_at, id) pair) only rows past it are returned; with
+    `oldest_first` the order is reversed (used by rdfs.pagination going back a page).
+    """
+    live, archive = _filtered(start_date, end_date, status, route_id)
+    live_order, archive_order = ("-created_at", "-id"), ("-created_at", "-entry_log_id")
+    if after is not None:
+        live = live.filter(keyset_filter(live_order, after, oldest_first))
+        archive = archive.filter(keyset_filter(archive_order, after, oldest_first))
+    if oldest_first:
+        live_order, archive_order = reverse_ordering(live_order), reverse_ordering(archive_order)
+
+    live_rows = (
+        _live_row(row) for row in live.order_by(*live_order).values(
+            "id", "status", "fee_charged", "created_at", "departed_at",
+            "vehicle__license_plate", "vehicle__route_id", "staff__username",
+            "vehicle__assigned_driver__first_name", "vehicle__assigned_driver__last_name",
+        ).iterator(chunk_size=chunk_size)
+    )
+    archive_rows = (
+        _archive_row(row) for row in archive.order_by(*archive_order).values(
+            "entry_log_id", "status", "fee_charged", "created_at", "departed_at",
+            "license_plate", "driver_name", "route_id", "staff__username",
+        ).iterator(chunk_size=chunk_size)
+    )
+    return heapq.merge(live_rows, archive_rows, key=history_key, reverse=not oldest_first)
+
+
+def history_key(row):
+    """Sort key of a history_rows() row."""
+    return row["created_at"], row["id"]
+
+
+def daily_fee_totals(start_date=None, end_date=None, status=EntryLog.STATUS_SUCCESS):
+    """{local date: total fee_charged} over live + archived entries."""
+    live, archive = _filtered(start_date, end_date, status)
+    totals = defaultdict(Decimal)
+    for row in live.annotate(day=TruncDate("created_at")).values("day").annotate(total=Sum("fee_charged")):
+        totals[row["day"]] += row["total"] or 0
+    for row in archive.values("local_day").annotate(total=Sum("fee_charged")):
+        totals[row["local_day"]] += row["total"] or 0
+    return dict(totals)
+
+
+def fee_total(start_date=None, end_date=None, status=EntryLog.STATUS_SUCCESS):
+    """Total fee_charged over live + archived entries."""
+    live, archive = _filtered(start_date, end_date, status)
+    live_total = live.aggregate(total=Sum("fee_charged"))["total"] or Decimal("0.00")
+    archive_total = archive.aggregate(total=Sum("fee_charged"))["total"] or Decimal("0.00")
+    return live_total + archive_total
+
+
+def route_totals(status=None):
+    """
+    Trips and fees per route over live + archived entries, busiest first:
+    [{"route_id", "origin", "destination", "total_trips", "total_fees"}, ...]
+    """
+    live, archive = _filtered(status=status)
+    stats = {}
+
+    def merge(route_id, origin, destination, trips, fees):
+        item = stats.setdefault(route_id, {
+            "route_id": route_id, "origin": origin, "destination": destination,
+            "total_trips": 0, "total_fees": Decimal("0.00"),
+        })
+        item["total_trips"] += trips
+        item["total_fees"] += fees or 0
+
+    for row in (
+        live.filter(vehicle__route__isnull=False)
+        .values("vehicle__route_id", "vehicle__route__origin", "vehicle__route__destination")
+        .annotate(trips=Count("id"), fees=Sum("fee_charged"))
+    ):
+        merge(row["vehicle__route_id"], row["vehicle__route__origin"], row["vehicle__route__destination"],
+              row["trips"], row["fees"])
+    for row in (
+        archive.filter(route__isnull=False)
+        .values("route_id", "route__origin", "route__destination")
+        .annotate(trips=Count("id"), fees=Sum("fee_charged"))
+    ):
+        merge(row["route_id"], row["route__origin"], row["route__destination"], row["trips"], row["fees"])
+
+    return sorted(stats.values(), key=lambda item: item["total_trips"], reverse=True)
@@ -0,0 +1,276 @@
+# terminal/live_queue.py
+"""
+In-memory read model of the live terminal queue.
+
+Active, successful EntryLog rows are kept per route so the queue pages and
+the polling endpoint can be served from a dictionary lookup instead of a
+three-table join.  The model is:
+
+- loaded from EntryLog on first use after the process starts,
+- updated in place by the views that write to the queue (scan entry,
+  exit validation, mark departed, auto-close),
+- re-synced when a cheap signature of the active rows in the database
+  differs from ours (writes made by other gunicorn workers), and
+- fully rebuilt every LIVE_QUEUE_REBUILD_SECONDS as a safety net, which
+  also picks up driver / vehicle / route edits.
+
+Every change is also appended to a bounded event journal ("entry",
+"departure", "auto_close") that the queue stream endpoint pushes to
+browsers.  Event ids are "<process token>-<sequence>"; a client that
+reconnects to the same process resumes after its Last-Event-ID, anyone
+else receives a fresh "snapshot" event.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .models import EntryLog, SystemSettings
+
+# How often (seconds) a read compares our signature with the database
+SYNC_INTERVAL_SECONDS = getattr(settings, "LIVE_QUEUE_SYNC_SECONDS", 2)
+
+# How often (seconds) the whole model is reloaded regardless of signature
+REBUILD_INTERVAL_SECONDS = getattr(settings, "LIVE_QUEUE_REBUILD_SECONDS", 60)
+
+# How many events are kept for Last-Event-ID resume
+EVENT_BUFFER_SIZE = getattr(settings, "LIVE_QUEUE_EVENT_BUFFER", 500)
+
+EVENT_ENTRY = "entry"
+EVENT_DEPARTURE = "departure"
+EVENT_AUTO_CLOSE = "auto_close"
+
+UNASSIGNED_ROUTE = "Unassigned Route"
+
+
+def _active_logs():
+    return (
+        EntryLog.objects.filter(is_active=True, status=EntryLog.STATUS_SUCCESS)
+        .select_related("vehicle__assigned_driver", "vehicle__route", "staff")
+    )
+
+
+def _entry_from_log(log):
+    """Flatten an EntryLog (with vehicle, driver, route, staff) into a plain dict."""
+    v = log.vehicle
+    d = v.assigned_driver if v else None
+    r = v.route if v else None
+    return {
+        "id": log.id,
+        "vehicle_id": v.id if v else None,
+        "plate": v.license_plate if v else None,
+        "vehicle_name": v.vehicle_name if v else None,
+        "driver_name": f"{d.first_name} {d.last_name}" if d else None,
+        "route_id": r.id if r else None,
+        "route_name": r.name if r else UNASSIGNED_ROUTE,
+        "route_origin": r.origin if r else "",
+        "route_destination": r.destination if r else "",
+        "fee": log.fee_charged,
+        "staff": log.staff.username if log.staff else None,
+        "created_at": log.created_at,
+    }
+
+
+def serialize_entry(entry):
+    """JSON-safe copy of a queue entry."""
+    data = dict(entry)
+    data["fee"] = float(entry["fee"])
+    data["created_at"] = entry["created_at"].isoformat()
+    return data
+
+
+class LiveQueue:
+    """Active queue entries grouped by route id (None = unassigned)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._by_route = {}     # route_id -> {entry_id: entry}
+        self._route_of = {}     # entry_id -> route_id
+        self._signature = None  # (count, sum of ids) of the rows we hold
+        self._loaded_at = None
+        self._checked_at = 0.0
+        self._token = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._events = deque(maxlen=EVENT_BUFFER_SIZE)
+
+    # ---------------------------
+    # Loading / syncing
+    # ---------------------------
+    @staticmethod
+    def _db_signature():
+        agg = EntryLog.objects.filter(
+            is_active=True, status=EntryLog.STATUS_SUCCESS
+        ).aggregate(count=Count("id"), total=Sum("id"))
+        return (agg["count"] or 0, agg["total"] or 0)
+
+    def rebuild(self):
+        """Reload every active entry from EntryLog, emitting events for the differences."""
+        entries = [_entry_from_log(log) for log in _active_logs()]
+        with self._lock:
+            first_load = self._loaded_at is None
+            previous = {
+                entry_id: self._by_route[route_id][entry_id]
+                for entry_id, route_id in self._route_of.items()
+            }
+            self._by_route = {}
+            self._route_of = {}
+            for entry in entries:
+                self._put(entry)
+            self._signature = (len(entries), sum(e["id"] for e in entries))
+            self._loaded_at = self._checked_at = time.monotonic()
+            if first_load:
+                return
+            added = [e for e in entries if e["id"] not in previous]
+            removed = [e for entry_id, e in previous.items() if entry_id not in self._route_of]
+        if not added and not removed:
+            return
+
+        # Entries that disappeared were closed by another process; tell apart
+        # staff departures from auto-closes by comparing against the stay window.
+        auto_closed = set()
+        if removed:
+            duration = timedelta(minutes=int(SystemSettings.current().departure_duration_minutes))
+            for entry_id, created_at, departed_at in EntryLog.objects.filter(
+                id__in=[e["id"] for e in removed]
+            ).values_list("id", "created_at", "departed_at"):
+                if departed_at and departed_at >= created_at + duration:
+                    auto_closed.add(entry_id)
+
+        with self._lock:
+            for entry in added:
+                self._emit(EVENT_ENTRY, entry)
+            for entry in removed:
+                self._emit(EVENT_AUTO_CLOSE if entry["id"] in auto_closed else EVENT_DEPARTURE, entry)
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded_at is None or now - self._loaded_at >= REBUILD_INTERVAL_SECONDS:
+            self.rebuild()
+            return
+        if now - self._checked_at < SYNC_INTERVAL_SECONDS:
+            return
+        signature = self._db_signature()
+        with self._lock:
+            self._checked_at = now
+            stale = signature != self._signature
+        if stale:
+            self.rebuild()
+
+    # ---------------------------
+    # Mutations (called by the writing views)
+    # ---------------------------
+    def _put(self, entry):
+        self._by_route.setdefault(entry["route_id"], {})[entry["id"]] = entry
+        self._route_of[entry["id"]] = entry["route_id"]
+
+    def add(self, log):
+        """Record a successful entry. `log` is an EntryLog instance or id."""
+        log_id = getattr(log, "pk", log)
+        log = _active_logs().filter(pk=log_id).first()
+        if log is None:
+            return
+        entry = _entry_from_log(log)
+        with self._lock:
+            if self._loaded_at is None or entry["id"] in self._route_of:
+                return
+            self._put(entry)
+            count, total = self._signature
+            self._signature = (count + 1, total + entry["id"])
+            self._emit(EVENT_ENTRY, entry)
+
+    def discard(self, entry_ids, reason=EVENT_DEPARTURE):
+        """Drop departed / closed entries by id. `reason` is the event type to emit."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            count, total = self._signature
+            for entry_id in entry_ids:
+                if entry_id not in self._route_of:
+                    continue
+                route_id = self._route_of.pop(entry_id)
+                bucket = self._by_route.get(route_id, {})
+                entry = bucket.pop(entry_id, None)
+                if not bucket:
+                    self._by_route.pop(route_id, None)
+                count, total = count - 1, total - entry_id
+                self._emit(reason, entry)
+            self._signature = (count, total)
+
+    # ---------------------------
+    # Event journal
+    # ---------------------------
+    def _emit(self, event_type, entry):
+        """Append an event (caller holds the lock) and wake up waiting streams."""
+        self._seq += 1
+        self._events.append((self._seq, event_type, serialize_entry(entry)))
+        self._changed.notify_all()
+
+    def event_id(self, seq):
+        return f"{self._token}-{seq}"
+
+    def cursor(self):
+        """Sequence number of the newest event."""
+        with self._lock:
+            return self._seq
+
+    def resume_cursor(self, last_event_id):
+        """
+        Map a client's Last-Event-ID to a sequence number we can replay from,
+        or None if the events are gone (other process, restart, buffer overrun).
+        """
+        token, _, seq = (last_event_id or "").partition("-")
+        if token != self._token or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return None
+        return seq
+
+    def wait_for_events(self, after, timeout):
+        """
+        Block up to `timeout` seconds for events newer than sequence `after`.
+        Keeps re-syncing with the database meanwhile so writes made by other
+        workers are noticed. Returns a list of (seq, type, entry).
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self._ensure_fresh()
+            with self._lock:
+                if self._seq > after:
+                    return [event for event in self._events if event[0] > after]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._changed.wait(min(remaining, SYNC_INTERVAL_SECONDS))
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def entries(self, route_id=None):
+        """
+        Active entries ordered by entry time (oldest first).
+        Pass `route_id` to read a single route's bucket.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            if route_id is None:
+                rows = [e for bucket in self._by_route.values() for e in bucket.values()]
+            else:
+                rows = list(self._by_route.get(route_id, {}).values())
+        rows.sort(key=lambda e: (e["created_at"], e["id"]))
+        return rows
+
+    def count(self):
+        self._ensure_fresh()
+        with self._lock:
+            return len(self._route_of)
+
+
+live_queue = LiveQueue()
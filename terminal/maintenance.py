@@ -0,0 +1,248 @@
+# terminal/maintenance.py
+"""
+Periodic EntryLog maintenance, run outside the request cycle:
+
+- Auto-close (is_active=False + departed_at set) any entry where
+  created_at + SystemSettings.departure_duration_minutes <= now.
+- Archive departed/non-active entries older than TERMINAL_DELETE_AFTER_MINUTES:
+  they are copied into EntryLogArchive in bulk and removed from EntryLog in
+  the same transaction, so the live table stays small and reports keep
+  their history (see terminal/history.py).
+- Delete gate ScanReceipts older than TERMINAL_SCAN_RECEIPT_DAYS; devices
+  never re-send scans that old.
+- Delete expired background job states (vehicles/jobs.py).
+- Every WALLET_CHECKPOINT_INTERVAL_MINUTES, checkpoint the wallets with
+  enough new ledger entries (vehicles/ledger.py).
+
+It runs either in-process (start_scheduler(), called from rdfs/wsgi.py) or
+as a dedicated loop (`python manage.py run_maintenance`).  When several
+processes run it, a PostgreSQL advisory lock elects one leader per run and
+the others skip.  The steps commit separately, and so does every archive
+batch: no transaction holds EntryLog rows against gate scans for a whole
+pass, and a failing step doesn't roll back the others.  Every run is logged with the number of rows it closed
+and archived ("purged" from the live table), and per-process totals are
+kept in `stats`.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from vehicles import jobs
+from vehicles.ledger import checkpoint_wallets
+from .live_queue import live_queue, EVENT_AUTO_CLOSE
+from .models import EntryLog, EntryLogArchive, ScanReceipt, SystemSettings
+
+logger = logging.getLogger(__name__)
+
+# Minutes a departed entry stays in EntryLog before it is archived (tweakable)
+DEFAULT_DELETE_AFTER_MINUTES = getattr(settings, "TERMINAL_DELETE_AFTER_MINUTES", 10)
+
+# Seconds between two maintenance runs
+INTERVAL_SECONDS = getattr(settings, "TERMINAL_MAINTENANCE_INTERVAL_SECONDS", 15)
+
+# Days a gate scan receipt (idempotency key) is kept
+SCAN_RECEIPT_DAYS = getattr(settings, "TERMINAL_SCAN_RECEIPT_DAYS", 7)
+
+# Rows archived per INSERT / DELETE batch
+ARCHIVE_BATCH_SIZE = getattr(settings, "TERMINAL_ARCHIVE_BATCH_SIZE", 1000)
+
+# Minutes between two wallet checkpoint passes
+CHECKPOINT_INTERVAL_MINUTES = getattr(settings, "WALLET_CHECKPOINT_INTERVAL_MINUTES", 60)
+
+# pg_try_advisory_lock key shared by every process ("RDFS")
+ADVISORY_LOCK_KEY = 0x52444653
+
+stats = {
+    "runs": 0,
+    "skipped": 0,
+    "closed_total": 0,
+    "purged_total": 0,
+    "last_run": None,
+    "last_closed": 0,
+    "last_purged": 0,
+    "last_duration_ms": None,
+    "checkpointed_total": 0,
+    "last_checkpoint_run": None,
+}
+
+
+def archive_entries(queryset, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move the rows of an EntryLog queryset into EntryLogArchive in batches
+    (one bulk INSERT + one DELETE per batch, each batch in its own
+    transaction). Returns the number of rows moved.
+    """
+    moved = 0
+    rows = queryset.order_by("id").values(
+        "id", "vehicle_id", "vehicle__route_id", "staff_id", "fee_charged", "status",
+        "message", "created_at", "departed_at", "vehicle__license_plate",
+        "vehicle__assigned_driver__first_name", "vehicle__assigned_driver__last_name",
+    )
+    while True:
+        batch = list(rows[:batch_size])
+        if not batch:
+            return moved
+        archived = []
+        for row in batch:
+            first = row["vehicle__assigned_driver__first_name"]
+            last = row["vehicle__assigned_driver__last_name"]
+            archived.append(EntryLogArchive(
+                entry_log_id=row["id"],
+                local_day=timezone.localdate(row["created_at"]),
+                vehicle_id=row["vehicle_id"],
+                route_id=row["vehicle__route_id"],
+                staff_id=row["staff_id"],
+                license_plate=row["vehicle__license_plate"] or "",
+                driver_name=f"{first} {last}" if first or last else "",
+                fee_charged=row["fee_charged"],
+                status=row["status"],
+                message=row["message"],
+                created_at=row["created_at"],
+                departed_at=row["departed_at"],
+            ))
+        with transaction.atomic():
+            # ignore_conflicts keeps a re-run after a partial failure idempotent
+            EntryLogArchive.objects.bulk_create(archived, ignore_conflicts=True)
+            EntryLog.objects.filter(id__in=[row["id"] for row in batch]).delete()
+        moved += len(batch)
+
+
+def auto_close_and_cleanup(now=None, delete_after_minutes=None):
+    """
+    Close overdue active entries and archive old departed ones.
+    Returns (closed, purged) row counts.
+    """
+    now = now or timezone.now()
+    system_settings = SystemSettings.current()
+    departure_duration = getattr(system_settings, "departure_duration_minutes", 30)
+
+    # 1) Auto-close active entries where created_at + departure_duration <= now
+    cutoff = now - timedelta(minutes=int(departure_duration))
+    to_close = list(EntryLog.objects.filter(is_active=True, created_at__lte=cutoff).values_list("id", flat=True))
+    closed = 0
+    if to_close:
+        with transaction.atomic():
+            closed = EntryLog.objects.filter(id__in=to_close, is_active=True).update(is_active=False, departed_at=now)
+            transaction.on_commit(lambda: live_queue.discard(to_close, reason=EVENT_AUTO_CLOSE))
+
+    # 2) Archive departed/non-active entries older than delete_after_minutes
+    delete_after_minutes = delete_after_minutes if delete_after_minutes is not None else DEFAULT_DELETE_AFTER_MINUTES
+    delete_cutoff = now - timedelta(minutes=int(delete_after_minutes))
+    purged = archive_entries(
+        EntryLog.objects.filter(created_at__lt=delete_cutoff).filter(Q(is_active=False) | Q(departed_at__isnull=False))
+    )
+
+    return closed, purged
+
+
+def purge_scan_receipts(now=None):
+    """Delete expired offline scan receipts. Returns the number deleted."""
+    now = now or timezone.now()
+    deleted, _ = ScanReceipt.objects.filter(received_at__lt=now - timedelta(days=SCAN_RECEIPT_DAYS)).delete()
+    return deleted
+
+
+def _acquire_leader_lock():
+    """Session-level advisory lock, see _release_leader_lock(); only meaningful on PostgreSQL."""
+    if connection.vendor != "postgresql":
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [ADVISORY_LOCK_KEY])
+        return cursor.fetchone()[0]
+
+
+def _release_leader_lock():
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", [ADVISORY_LOCK_KEY])
+
+
+def _run_step(name, func, **kwargs):
+    """Run one independent step in its own transaction; a failure is logged and counts as 0."""
+    try:
+        with transaction.atomic():
+            return func(**kwargs)
+    except Exception:
+        logger.exception("Queue maintenance: %s failed", name)
+        return 0
+
+
+def run_once(now=None):
+    """
+    One maintenance pass.
+    Returns {"closed": n, "purged": n}, or None if another process holds the lock.
+    """
+    started = time.monotonic()
+    if not _acquire_leader_lock():
+        stats["skipped"] += 1
+        return None
+    try:
+        closed, purged = auto_close_and_cleanup(now=now)
+        _run_step("scan receipt purge", purge_scan_receipts, now=now)
+        _run_step("job state purge", jobs.purge_expired, now=now)
+        last_checkpoint_run = stats["last_checkpoint_run"]
+        if last_checkpoint_run is None or time.monotonic() - last_checkpoint_run >= CHECKPOINT_INTERVAL_MINUTES * 60:
+            stats["checkpointed_total"] += _run_step("wallet checkpoints", checkpoint_wallets)
+            stats["last_checkpoint_run"] = time.monotonic()
+    finally:
+        _release_leader_lock()
+
+    duration_ms = round((time.monotonic() - started) * 1000, 1)
+    stats.update(
+        runs=stats["runs"] + 1,
+        closed_total=stats["closed_total"] + closed,
+        purged_total=stats["purged_total"] + purged,
+        last_run=timezone.now(),
+        last_closed=closed,
+        last_purged=purged,
+        last_duration_ms=duration_ms,
+    )
+    logger.info("Queue maintenance: closed=%s archived=%s in %sms", closed, purged, duration_ms)
+    return {"closed": closed, "purged": purged}
+
+
+class MaintenanceScheduler(threading.Thread):
+    """Daemon thread calling run_once() every `interval` seconds."""
+
+    def __init__(self, interval=INTERVAL_SECONDS):
+        super().__init__(name="rdfs-queue-maintenance", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            close_old_connections()
+            try:
+                run_once()
+            except Exception:
+                logger.exception("Queue maintenance run failed")
+            finally:
+                close_old_connections()
+            self._stop_event.wait(self.interval)
+        connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler():
+    """Start the in-process scheduler once per process (if enabled in settings)."""
+    global _scheduler
+    if not getattr(settings, "TERMINAL_MAINTENANCE_SCHEDULER", True):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = MaintenanceScheduler()
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,186 @@
+import random
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from terminal.history import local_date_range
+from terminal.models import EntryLog
+from vehicles.models import Deposit, Driver, QueueHistory, Route, Vehicle, Wallet
+from vehicles.search import search_vehicles
+
+# Tables that must never be read with a full scan by the queries below
+HOT_TABLES = ("terminal_entrylog", "vehicles_deposit", "vehicles_queuehistory")
+
+BATCH_SIZE = 10000
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def _explicit_timestamps(*fields):
+    """Let bulk_create keep the timestamps we set on auto_now_add fields."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _hot_queries(vehicle_id, day, now):
+    """(label, queryset) pairs for the access patterns the indexes exist for."""
+    return [
+        ("live queue (is_active, status, created_at)",
+         EntryLog.objects.filter(is_active=True, status=EntryLog.STATUS_SUCCESS).order_by("created_at")),
+        ("auto-close cutoff (is_active, created_at)",
+         EntryLog.objects.filter(is_active=True, created_at__lte=now - timedelta(minutes=30))),
+        ("vehicle in queue (vehicle, is_active)",
+         EntryLog.objects.filter(vehicle_id=vehicle_id, is_active=True)),
+        ("re-entry cooldown (vehicle, status, -created_at)",
+         EntryLog.objects.filter(vehicle_id=vehicle_id, status=EntryLog.STATUS_SUCCESS).order_by("-created_at")[:1]),
+        ("entries of one day (created_at range)",
+         EntryLog.objects.filter(**local_date_range("created_at", day, day))),
+        ("recently departed (departed_at)",
+         EntryLog.objects.filter(departed_at__gte=now - timedelta(minutes=10))),
+        ("deposits of one day (created_at range)",
+         Deposit.objects.filter(**local_date_range("created_at", day, day)).order_by("-created_at")),
+        ("latest deposits (-created_at)",
+         Deposit.objects.order_by("-created_at")[:5]),
+        ("deposits by plate (vehicles.search)",
+         Deposit.objects.filter(wallet__vehicle__in=search_vehicles("CHK-00012").values("pk"))),
+        ("latest queue history (-timestamp)",
+         QueueHistory.objects.order_by("-timestamp")[:5]),
+        ("queue history of a vehicle (vehicle, -timestamp)",
+         QueueHistory.objects.filter(vehicle_id=vehicle_id).order_by("-timestamp")[:20]),
+    ]
+
+
+def _full_scans(plan):
+    """Hot tables read with a full scan in an EXPLAIN output."""
+    scans = set()
+    for line in plan.splitlines():
+        if connection.vendor == "postgresql":
+            match = re.search(r"Seq Scan on (\w+)", line)
+        else:
+            match = re.search(r"\bSCAN (\w+)", line)
+            if match and "USING" in line:
+                match = None
+        if match and match.group(1) in HOT_TABLES:
+            scans.add(match.group(1))
+    return scans
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large EntryLog / Deposit / QueueHistory dataset inside a transaction, "
+        "EXPLAIN the hot queries and fail if any of them scans a whole table. "
+        "The seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000,
+                            help="Rows seeded into each of EntryLog, Deposit and QueueHistory (default: 1,000,000).")
+        parser.add_argument("--vehicles", type=int, default=2000, help="Vehicles (with driver and wallet) to seed.")
+        parser.add_argument("--days", type=int, default=365, help="Days of history the rows are spread over.")
+
+    def handle(self, *args, **options):
+        rows, days = options["rows"], options["days"]
+        vehicle_count = max(options["vehicles"], 1)
+        failures = []
+        try:
+            with transaction.atomic():
+                vehicle_ids, wallet_ids = self._seed_fleet(vehicle_count)
+                now = timezone.now()
+                self._seed_history(rows, days, now, vehicle_ids, wallet_ids)
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+
+                day = timezone.localdate(now) - timedelta(days=days // 2)
+                for label, queryset in _hot_queries(random.choice(vehicle_ids), day, now):
+                    plan = queryset.explain()
+                    scans = _full_scans(plan)
+                    if scans:
+                        failures.append(label)
+                        self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(sorted(scans))}"))
+                        self.stdout.write(plan)
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"ok         {label}"))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries fall back to a full table scan.")
+        self.stdout.write(self.style.SUCCESS(f"All hot queries use an index ({connection.vendor}, {rows} rows per table)."))
+
+    def _seed_fleet(self, count):
+        route = Route.objects.create(
+            name=f"Plan check {uuid.uuid4().hex[:8]}", origin="Plan", destination="Check", base_fare=Decimal("20.00")
+        )
+        tag = uuid.uuid4().hex[:6].upper()
+        drivers = Driver.objects.bulk_create(
+            [Driver(driver_id=f"CHK-{tag}-{i}", first_name="Check", last_name=str(i)) for i in range(count)],
+            batch_size=BATCH_SIZE,
+        )
+        vehicles = Vehicle.objects.bulk_create(
+            [
+                Vehicle(
+                    vehicle_type="jeepney", assigned_driver=driver, route=route, year_model=2020,
+                    cr_number=f"CR-{tag}-{i}", or_number=f"OR-{tag}-{i}", vin_number=f"{tag}{i:011d}",
+                    registration_number=f"REG-{tag}-{i}", license_plate=f"CHK-{i:05d}-{tag}",
+                    qr_value=f"VEH-CHK-{tag}-{i}",
+                )
+                for i, driver in enumerate(drivers)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        wallets = Wallet.objects.bulk_create([Wallet(vehicle=v) for v in vehicles], batch_size=BATCH_SIZE)
+        return [v.pk for v in vehicles], [w.pk for w in wallets]
+
+    def _seed_history(self, rows, days, now, vehicle_ids, wallet_ids):
+        """Insert `rows` entries / deposits / queue events in created_at order, oldest first."""
+        start = now - timedelta(days=days)
+        step = (now - start) / max(rows, 1)
+        # The newest entries (one per vehicle at most) are still in the queue
+        active_from = rows - min(len(vehicle_ids), rows) // 10
+        tag = uuid.uuid4().hex[:6].upper()
+        statuses = [EntryLog.STATUS_SUCCESS] * 18 + [EntryLog.STATUS_INSUFFICIENT, EntryLog.STATUS_FAILED]
+
+        with _explicit_timestamps(
+            EntryLog._meta.get_field("created_at"),
+            Deposit._meta.get_field("created_at"),
+            QueueHistory._meta.get_field("timestamp"),
+        ):
+            for offset in range(0, rows, BATCH_SIZE):
+                entries, deposits, events = [], [], []
+                for i in range(offset, min(offset + BATCH_SIZE, rows)):
+                    at = start + step * i
+                    vehicle_id = vehicle_ids[i % len(vehicle_ids)]
+                    active = i >= active_from
+                    status = EntryLog.STATUS_SUCCESS if active else random.choice(statuses)
+                    entries.append(EntryLog(
+                        vehicle_id=vehicle_id, fee_charged=Decimal("20.00"), status=status, created_at=at,
+                        is_active=active,
+                        departed_at=None if active or status != EntryLog.STATUS_SUCCESS else at + timedelta(minutes=30),
+                    ))
+                    deposits.append(Deposit(
+                        wallet_id=wallet_ids[i % len(wallet_ids)], amount=Decimal("100.00"),
+                        reference_number=f"CHK-{tag}-{i}", created_at=at,
+                    ))
+                    events.append(QueueHistory(
+                        vehicle_id=vehicle_id, action="enter" if i % 2 == 0 else "exit", timestamp=at,
+                    ))
+                EntryLog.objects.bulk_create(entries)
+                Deposit.objects.bulk_create(deposits)
+                QueueHistory.objects.bulk_create(events)
+                self.stdout.write(f"Seeded {min(offset + BATCH_SIZE, rows)}/{rows} rows per table", ending="\r")
+        self.stdout.write("")
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from terminal.maintenance import INTERVAL_SECONDS, run_once
+
+
+class Command(BaseCommand):
+    help = "Run EntryLog maintenance (auto-close + archive) in a loop, or once with --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=INTERVAL_SECONDS,
+                            help="Seconds between runs (default: TERMINAL_MAINTENANCE_INTERVAL_SECONDS).")
+        parser.add_argument("--once", action="store_true", help="Run a single pass and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            result = run_once()
+            if result is None:
+                self.stdout.write("Skipped: another process holds the maintenance lock.")
+            else:
+                self.stdout.write(f"Closed {result['closed']} entries, archived {result['purged']} entries.")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,141 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+
+from reports import counters
+from terminal import gate
+from terminal.models import EntryLog
+from vehicles import ledger
+from vehicles.models import Deposit, Driver, Vehicle, Wallet
+from vehicles.qr_cache import CachedVehicle
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency stress test for gate scans: many threads scan one vehicle while deposits "
+        "land on its wallet, then the wallet balance, its ledger and the entry log are checked for lost updates. "
+        "Meant for PostgreSQL; SQLite serializes writers and reports lock errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent scanning threads.")
+        parser.add_argument("--scans", type=int, default=50, help="Scans per thread.")
+        parser.add_argument("--deposits", type=int, default=50, help="Deposits made concurrently with the scans.")
+        parser.add_argument("--balance", type=Decimal, default=Decimal("1000.00"), help="Starting wallet balance.")
+        parser.add_argument("--fee", type=Decimal, default=Decimal("20.00"), help="Entry fee charged per entry.")
+        parser.add_argument("--min-deposit", type=Decimal, default=Decimal("0.00"), help="Minimum balance for entry.")
+        parser.add_argument("--keep", action="store_true", help="Keep the test vehicle and its rows afterwards.")
+
+    def handle(self, *args, **options):
+        vehicle = self._create_vehicle(options["balance"])
+        cached = CachedVehicle(vehicle.id, vehicle.license_plate, None)
+        wallet = Wallet.objects.get(vehicle=vehicle)
+
+        results, errors = Counter(), []
+        lock = threading.Lock()
+        start = threading.Barrier(options["threads"] + 2)
+
+        def scanner():
+            start.wait()
+            try:
+                for _ in range(options["scans"]):
+                    try:
+                        outcome = gate.process_scan(cached, None, options["fee"], options["min_deposit"], 0)
+                        with lock:
+                            results[outcome["result"]] += 1
+                    except Exception as exc:
+                        with lock:
+                            errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        def depositor():
+            start.wait()
+            try:
+                for _ in range(options["deposits"]):
+                    try:
+                        Deposit.objects.create(wallet_id=wallet.id, amount=Decimal("10.00"))
+                    except Exception as exc:
+                        with lock:
+                            errors.append(repr(exc))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=scanner) for _ in range(options["threads"])]
+        workers.append(threading.Thread(target=depositor))
+        for worker in workers:
+            worker.start()
+        start.wait()
+        started = time.monotonic()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+
+        try:
+            self._report(vehicle, wallet, options, results, errors, elapsed)
+        finally:
+            if not options["keep"]:
+                entries = EntryLog.objects.filter(vehicle=vehicle)
+                # The fee counter only grows (see reports/counters.py); take the test entries back out
+                fees = entries.filter(status=EntryLog.STATUS_SUCCESS).aggregate(total=Sum("fee_charged"),
+                                                                              count=Count("id"))
+                counters.add(fee_total=-(fees["total"] or 0), entry_count=-fees["count"])
+                entries.delete()
+                driver = vehicle.assigned_driver
+                vehicle.delete()
+                driver.delete()
+
+    def _create_vehicle(self, balance):
+        tag = uuid.uuid4().hex[:6].upper()
+        driver = Driver.objects.create(first_name="Stress", last_name=tag)
+        vehicle = Vehicle.objects.create(
+            vehicle_name=f"Stress {tag}", vehicle_type="jeepney", assigned_driver=driver, year_model=2020,
+            cr_number=f"CR-STRESS-{tag}", or_number=f"OR-STRESS-{tag}", vin_number=f"STRESS{tag}00000",
+            registration_number=f"REG-STRESS-{tag}", license_plate=f"STR-{tag}",
+        )
+        ledger.adjust_to(Wallet.objects.get(vehicle=vehicle).pk, balance, reference="stress test")
+        return vehicle
+
+    def _report(self, vehicle, wallet, options, results, errors, elapsed):
+        wallet.refresh_from_db()
+        scans = sum(results.values())
+        entries = EntryLog.objects.filter(vehicle=vehicle, status=EntryLog.STATUS_SUCCESS)
+        charged = entries.aggregate(total=Sum("fee_charged"))["total"] or Decimal("0.00")
+        deposited = Deposit.objects.filter(wallet=wallet).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
+        expected = options["balance"] + deposited - charged
+        active = EntryLog.objects.filter(vehicle=vehicle, is_active=True).count()
+
+        self.stdout.write(
+            f"{scans} scans in {elapsed:.2f}s ({scans / elapsed if elapsed else 0:.0f}/s) on {connection.vendor}: "
+            + ", ".join(f"{name}={count}" for name, count in sorted(results.items()))
+        )
+        self.stdout.write(
+            f"Balance {wallet.balance} = start {options['balance']} + deposits {deposited} - fees {charged}"
+            f" (expected {expected}); active entries {active}"
+        )
+
+        problems = []
+        if errors:
+            problems.append(f"{len(errors)} errors, first: {errors[0]}")
+        if wallet.balance != expected:
+            problems.append(f"balance {wallet.balance} != expected {expected}")
+        if wallet.balance < 0:
+            problems.append("negative balance")
+        booked = ledger.verify_wallet(wallet.pk)
+        if not booked["ok"]:
+            problems.append(f"ledger balance {booked['ledger_balance']} != wallet balance {wallet.balance}")
+        if entries.count() != results[gate.RESULT_ENTRY]:
+            problems.append(f"{entries.count()} entry rows for {results[gate.RESULT_ENTRY]} successful entries")
+        if active > 1:
+            problems.append(f"{active} active entries for one vehicle")
+        if results[gate.RESULT_ENTRY] - results[gate.RESULT_DEPARTURE] != active:
+            problems.append("entries minus departures doesn't match the active entry count")
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("No lost updates."))
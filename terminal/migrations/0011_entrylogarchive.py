@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0010_systemsettings_bus_max_seats_and_more'),
+        ('vehicles', '0009_rename_status_temp_vehicle_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntryLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_log_id', models.BigIntegerField(unique=True)),
+                ('local_day', models.DateField(db_index=True)),
+                ('license_plate', models.CharField(blank=True, max_length=50)),
+                ('driver_name', models.CharField(blank=True, max_length=201)),
+                ('fee_charged', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed'), ('insufficient', 'Insufficient Balance'), ('invalid', 'Invalid QR')], max_length=20)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('departed_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_entry_logs', to='vehicles.route')),
+                ('staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_terminal_actions', to=settings.AUTH_USER_MODEL)),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_entry_logs', to='vehicles.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Archived Entry Log',
+                'verbose_name_plural': 'Archived Entry Logs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['local_day', 'status'], name='terminal_archive_day_status')],
+            },
+        ),
+    ]
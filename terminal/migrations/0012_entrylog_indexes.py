@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+
+# created_at grows with insertion order, so on PostgreSQL a BRIN index serves
+# the date-range and maintenance cutoff scans at a fraction of a btree's size.
+# SQLite has no BRIN; a plain btree on created_at stands in for it.
+def create_created_at_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS entrylog_created_brin ON terminal_entrylog USING brin (created_at)"
+        )
+    else:
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS entrylog_created_brin ON terminal_entrylog (created_at)"
+        )
+
+
+def drop_created_at_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS entrylog_created_brin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0011_entrylogarchive'),
+        ('vehicles', '0010_deposit_queuehistory_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entrylog',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['status', 'created_at'],
+                               name='entrylog_active_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrylog',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['vehicle'],
+                               name='entrylog_vehicle_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrylog',
+            index=models.Index(fields=['vehicle', 'status', '-created_at'], name='entrylog_vehicle_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrylog',
+            index=models.Index(condition=models.Q(('departed_at__isnull', False)), fields=['departed_at'],
+                               name='entrylog_departed_idx'),
+        ),
+        migrations.RunPython(create_created_at_index, drop_created_at_index),
+    ]
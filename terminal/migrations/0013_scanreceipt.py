@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0012_entrylog_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('device_id', models.CharField(blank=True, max_length=64)),
+                ('qr_value', models.CharField(max_length=255)),
+                ('scanned_at', models.DateTimeField()),
+                ('result', models.CharField(max_length=20)),
+                ('response', models.JSONField(default=dict)),
+                ('received_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scan_receipts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Scan Receipt',
+                'verbose_name_plural': 'Scan Receipts',
+                'ordering': ['-received_at'],
+            },
+        ),
+    ]
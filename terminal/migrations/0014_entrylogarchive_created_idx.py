@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('terminal', '0013_scanreceipt'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entrylogarchive',
+            index=models.Index(fields=['-created_at', '-entry_log_id'], name='terminal_archive_created_idx'),
+        ),
+    ]
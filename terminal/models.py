@@ -1,4 +1,10 @@
+import threading
+import time
+
 from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
@@ -58,6 +64,19 @@ class EntryLog(models.Model):
         ordering = ['-created_at']
         verbose_name = "Entry Log"
         verbose_name_plural = "Entry Logs"
+        # created_at also has a BRIN index on PostgreSQL (migration 0012)
+        indexes = [
+            # live queue / auto-close: is_active=True, status, created_at
+            models.Index(fields=['status', 'created_at'], condition=Q(is_active=True),
+                         name='entrylog_active_status_idx'),
+            # "is this vehicle already in the queue?"
+            models.Index(fields=['vehicle'], condition=Q(is_active=True), name='entrylog_vehicle_active_idx'),
+            # re-entry cooldown: last successful entry of a vehicle
+            models.Index(fields=['vehicle', 'status', '-created_at'], name='entrylog_vehicle_status_idx'),
+            # recently departed entries (passenger display)
+            models.Index(fields=['departed_at'], condition=Q(departed_at__isnull=False),
+                         name='entrylog_departed_idx'),
+        ]
 
     def __str__(self):
         plate = getattr(self.vehicle, 'plate_number', None) or getattr(self.vehicle, 'license_plate', None)
@@ -65,6 +84,92 @@ class EntryLog(models.Model):
         return f"[{self.created_at:%Y-%m-%d %H:%M}] {plate or 'Unknown vehicle'} - {self.status} ({state})"
 
 
+class EntryLogArchive(models.Model):
+    """
+    Append-only history of closed EntryLog rows.
+    terminal.maintenance moves departed entries here in bulk instead of deleting them,
+    so reports keep their revenue data while the live EntryLog table stays small.
+    Rows are bucketed by `local_day` (the Asia/Manila date of created_at).
+    """
+    entry_log_id = models.BigIntegerField(unique=True)
+    local_day = models.DateField(db_index=True)
+
+    vehicle = models.ForeignKey(
+        'vehicles.Vehicle',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_entry_logs'
+    )
+    route = models.ForeignKey(
+        'vehicles.Route',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_entry_logs'
+    )
+    staff = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_terminal_actions'
+    )
+    # Snapshots taken at archive time (vehicles and drivers can be deleted later)
+    license_plate = models.CharField(max_length=50, blank=True)
+    driver_name = models.CharField(max_length=201, blank=True)
+
+    fee_charged = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    status = models.CharField(max_length=20, choices=EntryLog.STATUS_CHOICES)
+    message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    departed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Archived Entry Log"
+        verbose_name_plural = "Archived Entry Logs"
+        indexes = [
+            models.Index(fields=['local_day', 'status'], name='terminal_archive_day_status'),
+            # queue history pages (keyset pagination order)
+            models.Index(fields=['-created_at', '-entry_log_id'], name='terminal_archive_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"[{self.created_at:%Y-%m-%d %H:%M}] {self.license_plate or 'Unknown vehicle'} - {self.status} (Archived)"
+
+
+class ScanReceipt(models.Model):
+    """
+    Outcome of one scan uploaded by a gate device, keyed by the idempotency
+    key the device generated.  A re-sent scan gets the stored response back
+    instead of being applied twice.
+    """
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    device_id = models.CharField(max_length=64, blank=True)
+    qr_value = models.CharField(max_length=255)
+    scanned_at = models.DateTimeField()
+    staff = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scan_receipts'
+    )
+    result = models.CharField(max_length=20)
+    response = models.JSONField(default=dict)
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-received_at']
+        verbose_name = "Scan Receipt"
+        verbose_name_plural = "Scan Receipts"
+
+    def __str__(self):
+        return f"[{self.scanned_at:%Y-%m-%d %H:%M}] {self.qr_value} - {self.result}"
+
+
 class SystemSettings(models.Model):
     terminal_fee = models.DecimalField(max_digits=10, decimal_places=2, default=50.00)
     min_deposit_amount = models.DecimalField(max_digits=10, decimal_places=2, default=100.00)
@@ -93,5 +198,46 @@ class SystemSettings(models.Model):
 
     @classmethod
     def get_solo(cls):
-        obj, _ = cls.objects.get_or_create(id=1)
+        obj, created = cls.objects.get_or_create(id=1)
+        if created:
+            # Reload so decimal fields hold Decimals, not the float defaults
+            obj.refresh_from_db()
         return obj
+
+    @classmethod
+    def current(cls):
+        """
+        Cached settings for request paths; treat the returned object as read-only
+        (edit through get_solo()).  Saves in this process clear the cache at once;
+        saves made by other workers are noticed within SYSTEM_SETTINGS_CACHE_SECONDS
+        by comparing updated_at.
+        """
+        now = time.monotonic()
+        cached = _settings_cache["obj"]
+        if cached is not None and now - _settings_cache["checked_at"] < SYSTEM_SETTINGS_CACHE_SECONDS:
+            return cached
+
+        with _settings_cache_lock:
+            cached = _settings_cache["obj"]
+            if cached is not None and now - _settings_cache["checked_at"] < SYSTEM_SETTINGS_CACHE_SECONDS:
+                return cached
+            if cached is not None:
+                version = cls.objects.filter(id=1).values_list("updated_at", flat=True).first()
+                if version == cached.updated_at:
+                    _settings_cache["checked_at"] = now
+                    return cached
+            obj = cls.get_solo()
+            _settings_cache.update(obj=obj, checked_at=now)
+            return obj
+
+
+# Seconds SystemSettings.current() trusts its cached copy before checking updated_at
+SYSTEM_SETTINGS_CACHE_SECONDS = getattr(settings, "SYSTEM_SETTINGS_CACHE_SECONDS", 5)
+
+_settings_cache = {"obj": None, "checked_at": 0.0}
+_settings_cache_lock = threading.Lock()
+
+
+@receiver(post_save, sender=SystemSettings)
+def invalidate_settings_cache(sender, **kwargs):
+    _settings_cache.update(obj=None, checked_at=0.0)
@@ -1,57 +1,42 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.cache import never_cache
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from vehicles import deposits as batch_deposits
 from vehicles.models import Vehicle, Wallet, Driver, Deposit, Route
+from vehicles.qr_cache import qr_cache
 from .models import EntryLog, SystemSettings
+from .live_queue import live_queue, serialize_entry
+from . import exports, gate, history
+from rdfs.pagination import paginate, paginate_rows
 from decimal import Decimal
 from django import forms
 from django.contrib import messages
 from django.utils import timezone
-import csv
 from datetime import timedelta
 from accounts.utils import is_staff_admin_or_admin, is_admin   # ✅ imported shared role checks
 from pytz import timezone as pytz_timezone
-from django.db.models import Q
 from django.utils.text import slugify
+from django.conf import settings as django_settings
+import json
+import threading
+import time
 
-# Default delete window (minutes) for cleanup of old logs (tweakable)
-DEFAULT_DELETE_AFTER_MINUTES = 10
-
-
-def _apply_auto_close_and_cleanup(now=None, delete_after_minutes=None):
-    """
-    Centralized maintenance for entry logs:
-    - Auto-close (is_active=False + departed_at set) any entry where created_at + departure_duration <= now.
-    - Delete old departed/non-active entries older than delete_after_minutes.
-    This uses the admin-configured SystemSettings.departure_duration_minutes as the authoritative rule.
-    """
-    now = now or timezone.now()
-    settings = SystemSettings.get_solo()
-    departure_duration = getattr(settings, "departure_duration_minutes", 30)
-
-    # 1) Auto-close active entries where created_at + departure_duration <= now
-    # Compute cutoff = now - departure_duration
-    cutoff = now - timedelta(minutes=int(departure_duration))
-    # Only affect entries that are still marked active and were created at or before cutoff
-    active_to_close = EntryLog.objects.filter(is_active=True, created_at__lte=cutoff)
-    if active_to_close.exists():
-        active_to_close.update(is_active=False, departed_at=now)
-
-    # 2) Delete departed/non-active entries older than delete_after_minutes
-    delete_after_minutes = delete_after_minutes if delete_after_minutes is not None else DEFAULT_DELETE_AFTER_MINUTES
-    delete_cutoff = now - timedelta(minutes=int(delete_after_minutes))
-    old_qs = EntryLog.objects.filter(created_at__lt=delete_cutoff).filter(Q(is_active=False) | Q(departed_at__isnull=False))
-    if old_qs.exists():
-        old_qs.delete()
+# Rows per page on the deposit list and the queue history page
+DEPOSIT_PAGE_SIZE = 50
+HISTORY_PAGE_SIZE = 50
 
+# Queue streams open at once in this process; each holds a worker thread, so
+# this stays well below gunicorn's --threads (see Procfile)
+QUEUE_STREAM_MAX_CONNECTIONS = getattr(django_settings, "QUEUE_STREAM_MAX_CONNECTIONS", 4)
+_queue_stream_slots = threading.BoundedSemaphore(QUEUE_STREAM_MAX_CONNECTIONS)
 
 # ---- Deposit menu (unchanged) ----
 @login_required(login_url='accounts:login')
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
 def deposit_menu(request):
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     min_deposit = settings.min_deposit_amount
     user = request.user
 
@@ -67,28 +52,31 @@ def deposit_menu(request):
         start_date = request.GET.get("start_date", "")
         end_date = request.GET.get("end_date", "")
         vehicle_plate = request.GET.get("vehicle_plate", "")
+        route_filter = request.GET.get("route", "")
+        route_id = int(route_filter) if route_filter.isdigit() else None
 
         # 🟢 If NO filters → show TODAY by default
-        if not start_date and not end_date and not vehicle_plate:
+        if not start_date and not end_date and not vehicle_plate and not route_id:
             today = timezone.localdate()
-            deposits = deposits.filter(created_at__date=today)
             start_date = today.isoformat()
             end_date = today.isoformat()
-        else:
-            # 🟡 Apply filters only if provided
-            if start_date:
-                deposits = deposits.filter(created_at__date__gte=start_date)
-            if end_date:
-                deposits = deposits.filter(created_at__date__lte=end_date)
-            if vehicle_plate:
-                deposits = deposits.filter(wallet__vehicle__license_plate__icontains=vehicle_plate)
+
+        if request.GET.get("export") == "csv":
+            return exports.deposits_csv(start_date or None, end_date or None, route_id=route_id, plate=vehicle_plate)
+
+        # 🟡 Apply filters only if provided
+        deposits = exports.filter_deposits(
+            deposits, start_date or None, end_date or None, route_id=route_id, plate=vehicle_plate
+        )
 
         context = {
             "role": "admin",
-            "deposits": deposits[:200],
+            "deposits": paginate(request, deposits, ("-created_at", "-id"), per_page=DEPOSIT_PAGE_SIZE),
             "start_date": start_date,
             "end_date": end_date,
             "vehicle_plate": vehicle_plate,
+            "routes": Route.objects.all(),
+            "route_filter": route_filter,
             "min_deposit": min_deposit,
         }
         return render(request, "terminal/deposit_menu.html", context)
@@ -103,7 +91,7 @@ def deposit_menu(request):
     # 🟢 Staff always sees TODAY'S deposits by default
     today = timezone.localdate()
     recent_deposits = deposits.filter(
-        created_at__date=today
+        **history.local_date_range("created_at", today, today)
     )[:10]
 
     # -------------------------------
@@ -169,10 +157,8 @@ def deposit_analytics(request):
     )
 
     # Apply filters
-    if start_date:
-        deposits = deposits.filter(created_at__date__gte=start_date)
-    if end_date:
-        deposits = deposits.filter(created_at__date__lte=end_date)
+    if start_date or end_date:
+        deposits = deposits.filter(**history.local_date_range("created_at", start_date, end_date))
 
     # Summary Metrics
     total_amount = deposits.aggregate(Sum("amount"))["amount__sum"] or 0
@@ -228,15 +214,10 @@ def deposit_vs_revenue(request):
     end_date = request.GET.get("end_date")
 
     deposits = Deposit.objects.all()
-    logs = EntryLog.objects.filter(status=EntryLog.STATUS_SUCCESS)
 
     # Apply filters
-    if start_date:
-        deposits = deposits.filter(created_at__date__gte=start_date)
-        logs = logs.filter(created_at__date__gte=start_date)
-    if end_date:
-        deposits = deposits.filter(created_at__date__lte=end_date)
-        logs = logs.filter(created_at__date__lte=end_date)
+    if start_date or end_date:
+        deposits = deposits.filter(**history.local_date_range("created_at", start_date, end_date))
 
     # Aggregate per day
     from collections import defaultdict
@@ -249,12 +230,9 @@ def deposit_vs_revenue(request):
     ):
         daily_totals[d["day"]]["deposit"] = float(d["total"])
 
-    for l in (
-        logs.annotate(day=TruncDate("created_at"))
-        .values("day")
-        .annotate(total=Sum("fee_charged"))
-    ):
-        daily_totals[l["day"]]["revenue"] = float(l["total"])
+    # Terminal fees: live + archived entry logs
+    for day, total in history.daily_fee_totals(start_date or None, end_date or None).items():
+        daily_totals[day]["revenue"] = float(total)
 
     # Sort and prepare for chart
     sorted_days = sorted(daily_totals.keys())
@@ -282,8 +260,6 @@ def deposit_vs_revenue(request):
 @never_cache
 def terminal_queue(request):
     """Render the main terminal queue page (the page which will poll queue-data)."""
-    # ensure auto-close/cleanup runs for admin pages too
-    _apply_auto_close_and_cleanup()
     return render(request, "terminal/terminal_queue.html")
 
 
@@ -297,13 +273,10 @@ def tv_display_view(request, route_slug=None):
     - Groups active vehicles by route
     """
 
-    # Run cleanup for consistency
-    _apply_auto_close_and_cleanup()
-
     # Local timezone
     ph_tz = pytz_timezone("Asia/Manila")
 
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     duration = getattr(settings, "departure_duration_minutes", 30)
 
     # All available routes (for dropdown)
@@ -311,38 +284,33 @@ def tv_display_view(request, route_slug=None):
 
     # Build slug → name mapping
     route_map = {slugify(r.name): r.name for r in all_routes}
+    route_ids = {slugify(r.name): r.id for r in all_routes}
 
     selected_route_name = None
+    selected_route_id = None
 
     # If slug is provided, convert to real route name
     if route_slug:
         route_slug = route_slug.lower().strip("/")
         selected_route_name = route_map.get(route_slug)
+        selected_route_id = route_ids.get(route_slug)
 
-    # Base queryset of active entries
-    logs = (
-        EntryLog.objects.filter(is_active=True, status=EntryLog.STATUS_SUCCESS)
-        .select_related("vehicle__assigned_driver", "vehicle__route")
-        .order_by("vehicle__route__origin", "vehicle__route__destination", "created_at")
-    )
-
-    # Apply route filter
+    # Active entries from the live queue read model (all routes or the selected one)
     if selected_route_name:
-        logs = logs.filter(vehicle__route__name=selected_route_name)
+        entries = live_queue.entries(route_id=selected_route_id)
+    else:
+        entries = live_queue.entries()
+    entries.sort(key=lambda e: (e["route_origin"], e["route_destination"], e["created_at"]))
 
     # Group output
     grouped_routes = {}
-    for log in logs:
-        v = log.vehicle
-        d = v.assigned_driver if v else None
-        route_name = v.route.name if v and v.route else "Unassigned Route"
-
-        departure_time = log.created_at + timedelta(minutes=duration)
+    for e in entries:
+        departure_time = e["created_at"] + timedelta(minutes=duration)
 
-        grouped_routes.setdefault(route_name, []).append({
-            "plate": getattr(v, "license_plate", "N/A"),
-            "driver": f"{d.first_name} {d.last_name}" if d else "N/A",
-            "entry_time": timezone.localtime(log.created_at, ph_tz).strftime("%I:%M %p"),
+        grouped_routes.setdefault(e["route_name"], []).append({
+            "plate": e["plate"] or "N/A",
+            "driver": e["driver_name"] or "N/A",
+            "entry_time": timezone.localtime(e["created_at"], ph_tz).strftime("%I:%M %p"),
             "departure_time": timezone.localtime(departure_time, ph_tz).strftime("%I:%M %p"),
         })
 
@@ -363,34 +331,107 @@ def tv_display_view(request, route_slug=None):
 @never_cache
 def queue_data(request):
     """AJAX endpoint for live queue refresh."""
-    # maintenance
-    _apply_auto_close_and_cleanup()
-
-    logs = (
-        EntryLog.objects.filter(status=EntryLog.STATUS_SUCCESS, is_active=True)
-        .select_related("vehicle__assigned_driver", "staff")
-        .order_by("-created_at")[:20]
-    )
+    # newest first, capped at 20 like the old queryset slice
+    entries = live_queue.entries()[::-1][:20]
 
     ph_tz = pytz_timezone("Asia/Manila")
     data = []
-    for log in logs:
-        v = log.vehicle
-        d = v.assigned_driver if v else None
+    for e in entries:
         # convert created_at to local time for display
-        entry_local = timezone.localtime(log.created_at, ph_tz)
+        entry_local = timezone.localtime(e["created_at"], ph_tz)
         data.append({
-            "id": log.id,
-            "vehicle_plate": getattr(v, "license_plate", "N/A") if v else "—",
-            "vehicle_name": getattr(v, "vehicle_name", "—") if v else "—",
-            "driver_name": f"{d.first_name} {d.last_name}" if d else "—",
-            "fee": float(log.fee_charged),
-            "staff": log.staff.username if log.staff else "—",
+            "id": e["id"],
+            "vehicle_plate": e["plate"] or "N/A",
+            "vehicle_name": e["vehicle_name"] or "—",
+            "driver_name": e["driver_name"] or "—",
+            "fee": float(e["fee"]),
+            "staff": e["staff"] or "—",
             "time": entry_local.strftime("%Y-%m-%d %I:%M %p"),
         })
     return JsonResponse({"entries": data})
 
 
+# ===============================
+#   QUEUE STREAM (Server-Sent Events)
+# ===============================
+def _sse(event_type, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _queue_event_stream(last_event_id):
+    """
+    Yield queue events as they happen.
+    Resumes after `last_event_id` when possible, otherwise starts with a snapshot.
+    The stream ends after QUEUE_STREAM_MAX_SECONDS; EventSource reconnects on its own.
+    """
+    max_seconds = getattr(django_settings, "QUEUE_STREAM_MAX_SECONDS", 300)
+    heartbeat = getattr(django_settings, "QUEUE_STREAM_HEARTBEAT_SECONDS", 15)
+
+    yield "retry: 3000\n\n"
+
+    cursor = live_queue.resume_cursor(last_event_id)
+    if cursor is None:
+        cursor = live_queue.cursor()
+        snapshot = [serialize_entry(e) for e in live_queue.entries()]
+        yield _sse("snapshot", {"entries": snapshot}, live_queue.event_id(cursor))
+
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        events = live_queue.wait_for_events(cursor, timeout=heartbeat)
+        if not events:
+            yield ": keep-alive\n\n"
+            continue
+        for seq, event_type, entry in events:
+            cursor = seq
+            yield _sse(event_type, entry, live_queue.event_id(seq))
+
+
+class _StreamSlot:
+    """Iterate a stream holding one of the stream slots; the slot is freed when the response is closed."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._held = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._stream)
+
+    def close(self):
+        self._stream.close()
+        if self._held:
+            self._held = False
+            _queue_stream_slots.release()
+
+
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_admin_or_admin)
+@never_cache
+def queue_stream(request):
+    """
+    Server-Sent Events stream of entry / departure / auto-close events.
+    503 when QUEUE_STREAM_MAX_CONNECTIONS streams are already open here:
+    the pages then fall back to polling instead of tying up every worker thread.
+    """
+    if not _queue_stream_slots.acquire(blocking=False):
+        response = JsonResponse({'status': 'error', 'message': 'Too many open queue streams; poll instead.'},
+                                status=503)
+        response["Retry-After"] = "60"
+        return response
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    response = StreamingHttpResponse(_StreamSlot(_queue_event_stream(last_event_id)),
+                                     content_type="text/event-stream")
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 # ===============================
 #   SIMPLE QUEUE (TV)
 # ===============================
@@ -398,22 +439,16 @@ def queue_data(request):
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
 def simple_queue_view(request):
-    # maintenance
-    _apply_auto_close_and_cleanup()
-
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     duration = getattr(settings, "departure_duration_minutes", 30)
-    logs = EntryLog.objects.filter(is_active=True, status=EntryLog.STATUS_SUCCESS).select_related("vehicle__assigned_driver").order_by("-created_at")
     ph_tz = pytz_timezone("Asia/Manila")
     queue = []
-    for log in logs:
-        v = log.vehicle
-        d = v.assigned_driver if v else None
-        departure_time = log.created_at + timedelta(minutes=duration)
+    for e in reversed(live_queue.entries()):
+        departure_time = e["created_at"] + timedelta(minutes=duration)
         queue.append({
-            "plate": getattr(v, "license_plate", "N/A"),
-            "driver": f"{d.first_name} {d.last_name}" if d else "N/A",
-            "entry_time": timezone.localtime(log.created_at, ph_tz).strftime("%I:%M %p"),
+            "plate": e["plate"] or "N/A",
+            "driver": e["driver_name"] or "N/A",
+            "entry_time": timezone.localtime(e["created_at"], ph_tz).strftime("%I:%M %p"),
             "departure_time": timezone.localtime(departure_time, ph_tz).strftime("%I:%M %p"),
         })
     context = {"queue": queue, "stay_duration": duration, "now": timezone.localtime(timezone.now(), ph_tz)}
@@ -427,25 +462,19 @@ def simple_queue_view(request):
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
 def manage_queue(request):
-    # maintenance
-    _apply_auto_close_and_cleanup()
-
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     duration = getattr(settings, "departure_duration_minutes", 30)
-    logs = EntryLog.objects.filter(is_active=True, status=EntryLog.STATUS_SUCCESS).select_related("vehicle__assigned_driver","staff").order_by("-created_at")
     ph_tz = pytz_timezone("Asia/Manila")
     queue = []
-    for log in logs:
-        v = log.vehicle
-        d = v.assigned_driver if v else None
-        departure_time = log.created_at + timedelta(minutes=duration)
+    for e in reversed(live_queue.entries()):
+        departure_time = e["created_at"] + timedelta(minutes=duration)
         queue.append({
-            "id": log.id,
-            "plate": getattr(v, "license_plate", "N/A"),
-            "driver": f"{d.first_name} {d.last_name}" if d else "N/A",
-            "entry_time": timezone.localtime(log.created_at, ph_tz).strftime("%I:%M %p"),
+            "id": e["id"],
+            "plate": e["plate"] or "N/A",
+            "driver": e["driver_name"] or "N/A",
+            "entry_time": timezone.localtime(e["created_at"], ph_tz).strftime("%I:%M %p"),
             "departure_time": timezone.localtime(departure_time, ph_tz).strftime("%I:%M %p"),
-            "staff": log.staff.username if log.staff else "—",
+            "staff": e["staff"] or "—",
         })
     return render(request, "terminal/manage_queue.html", {"queue": queue, "stay_duration": duration})
 
@@ -457,10 +486,7 @@ def manage_queue(request):
 @never_cache
 def qr_scan_entry(request):
     """Handles QR scan for both entry & departure validation with live balance feedback."""
-    # Run maintenance on entry routes too so state is consistent when scanning
-    _apply_auto_close_and_cleanup()
-
-    settings = SystemSettings.get_solo()
+    settings = SystemSettings.current()
     entry_fee = settings.terminal_fee
     cooldown_minutes = settings.entry_cooldown_minutes
     min_deposit = settings.min_deposit_amount
@@ -474,11 +500,9 @@ def qr_scan_entry(request):
                 "balance": None
             })
 
-        staff_user = request.user
-
         try:
-            # 🔍 Validate vehicle
-            vehicle = Vehicle.objects.filter(qr_value__iexact=qr_code).first()
+            # 🔍 Validate vehicle (cached QR → vehicle lookup)
+            vehicle = qr_cache.lookup(qr_code)
             if not vehicle:
                 return JsonResponse({
                     "status": "error",
@@ -486,83 +510,14 @@ def qr_scan_entry(request):
                     "balance": None
                 })
 
-            # 🏦 Get or create wallet
-            wallet, _ = Wallet.objects.get_or_create(vehicle=vehicle)
-
-            from datetime import timedelta, timezone, datetime
-            now = datetime.now(timezone.utc)
-
-            # 🚗 Check if vehicle already inside terminal
-            active_log = EntryLog.objects.filter(vehicle=vehicle, is_active=True).first()
-
-            # ========================
-            # 🔁 DEPARTURE LOGIC
-            # ========================
-            if active_log:
-                active_log.is_active = False
-                active_log.departed_at = timezone.now()
-                active_log.message = f"Vehicle '{vehicle.license_plate}' departed."
-                active_log.save(update_fields=["is_active", "departed_at", "message"])
-
-                return JsonResponse({
-                    "status": "success",
-                    "message": f"✅ {vehicle.license_plate} departed successfully.",
-                    "balance": float(wallet.balance)
-                })
-
-            # ========================
-            # 🚘 ENTRY LOGIC
-            # ========================
-            recent_entry = EntryLog.objects.filter(
-                vehicle=vehicle,
-                status=EntryLog.STATUS_SUCCESS
-            ).order_by("-created_at").first()
-
-            if recent_entry and (now - recent_entry.created_at) < timedelta(minutes=cooldown_minutes):
-                return JsonResponse({
-                    "status": "error",
-                    "message": "⏳ Please wait before re-entry.",
-                    "balance": float(wallet.balance)
-                })
-
-            if wallet.balance < min_deposit:
-                return JsonResponse({
-                    "status": "error",
-                    "message": f"⚠️ Minimum ₱{min_deposit} required before entry.",
-                    "balance": float(wallet.balance)
-                })
-
-            if wallet.balance >= entry_fee:
-                wallet.balance -= entry_fee
-                wallet.save()
-
-                EntryLog.objects.create(
-                    vehicle=vehicle,
-                    staff=staff_user,
-                    fee_charged=entry_fee,
-                    status=EntryLog.STATUS_SUCCESS,
-                    message=f"Vehicle '{vehicle.license_plate}' entered terminal."
-                )
-
-                return JsonResponse({
-                    "status": "success",
-                    "message": f"🚗 {vehicle.license_plate} entered terminal.",
-                    "balance": float(wallet.balance)
-                })
-            else:
-                EntryLog.objects.create(
-                    vehicle=vehicle,
-                    staff=staff_user,
-                    fee_charged=entry_fee,
-                    status=EntryLog.STATUS_INSUFFICIENT,
-                    message=f"Insufficient balance for '{vehicle.license_plate}'."
-                )
-
-                return JsonResponse({
-                    "status": "error",
-                    "message": f"❌ Insufficient balance for {vehicle.license_plate}.",
-                    "balance": float(wallet.balance)
-                })
+            # 🚗 Entry or departure, with the wallet debit, in one transaction
+            return JsonResponse(gate.process_scan(
+                vehicle,
+                request.user,
+                fee=entry_fee,
+                min_deposit=min_deposit,
+                cooldown_minutes=cooldown_minutes,
+            ))
 
         except Exception as e:
             return JsonResponse({
@@ -593,18 +548,19 @@ def qr_exit_validation(request):
         return JsonResponse({"status": "error", "message": "QR missing."})
 
     try:
-        vehicle = Vehicle.objects.filter(qr_value__iexact=qr_code).first()
+        vehicle = qr_cache.lookup(qr_code)
         if not vehicle:
             return JsonResponse({"status": "error", "message": "❌ No vehicle found."})
 
-        active_log = EntryLog.objects.filter(vehicle=vehicle, is_active=True).first()
+        active_log = EntryLog.objects.filter(vehicle_id=vehicle.id, is_active=True).first()
         if not active_log:
-            return JsonResponse({"status": "error", "message": f"⚠️ {vehicle.license_plate} not inside terminal."})
+            return JsonResponse({"status": "error", "message": f"⚠️ {vehicle.plate} not inside terminal."})
 
         active_log.is_active = False
         active_log.departed_at = timezone.now()
         active_log.save(update_fields=["is_active", "departed_at"])
-        return JsonResponse({"status": "success", "message": f"✅ {vehicle.license_plate} departed."})
+        live_queue.discard([active_log.id])
+        return JsonResponse({"status": "success", "message": f"✅ {vehicle.plate} departed."})
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)})
 
@@ -616,6 +572,73 @@ def qr_exit_page(request):
     return render(request, "terminal/qr_exit_validation.html")
 
 
+def _parse_offline_scan(item):
+    """Validate one uploaded scan; returns (scan, None) or (None, error message)."""
+    from django.utils.dateparse import parse_datetime
+    if not isinstance(item, dict):
+        return None, "Malformed scan."
+    key = str(item.get("key") or "").strip()
+    qr_code = str(item.get("qr_code") or "").strip()
+    if not key or len(key) > 64:
+        return None, "Missing or invalid idempotency key."
+    if not qr_code:
+        return None, "QR code is empty."
+    try:
+        scanned_at = parse_datetime(str(item.get("scanned_at") or ""))
+    except ValueError:
+        scanned_at = None
+    if not scanned_at:
+        return None, "Invalid scan timestamp."
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+    return {"key": key, "qr_code": qr_code, "scanned_at": scanned_at}, None
+
+
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_admin_or_admin)
+@never_cache
+def qr_scan_batch(request):
+    """
+    Upload of scans queued by a gate device while offline:
+    {"device_id": "...", "scans": [{"key", "qr_code", "scanned_at"}, ...]} in scan order.
+    Applies them in one transaction and returns one result per scan.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid request method."}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON."}, status=400)
+
+    items = data.get("scans") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"status": "error", "message": "No scans."}, status=400)
+    max_batch = getattr(django_settings, "GATE_SCAN_BATCH_MAX", 200)
+    if len(items) > max_batch:
+        return JsonResponse({"status": "error", "message": f"At most {max_batch} scans per upload."}, status=400)
+
+    scans, rejected = [], {}
+    for position, item in enumerate(items):
+        scan, error = _parse_offline_scan(item)
+        if scan:
+            scans.append(scan)
+        else:
+            rejected[position] = {"status": "error", "result": "rejected", "message": error, "balance": None,
+                                  "key": item.get("key") if isinstance(item, dict) else None, "duplicate": False}
+
+    settings = SystemSettings.current()
+    applied = iter(gate.process_batch(
+        scans,
+        request.user,
+        fee=settings.terminal_fee,
+        min_deposit=settings.min_deposit_amount,
+        cooldown_minutes=settings.entry_cooldown_minutes,
+        device_id=str(data.get("device_id") or "")[:64],
+    )) if scans else iter(())
+    results = [rejected[i] if i in rejected else next(applied) for i in range(len(items))]
+    return JsonResponse({"status": "success", "results": results})
+
+
 # ===============================
 #   SYSTEM SETTINGS (Admin only)
 # ===============================
@@ -678,6 +701,7 @@ def mark_departed(request, entry_id):
         log.is_active = False
         log.departed_at = timezone.now()
         log.save(update_fields=["is_active", "departed_at"])
+        live_queue.discard([log.id])
         return JsonResponse({"success": True, "message": f"✅ {log.vehicle.license_plate} marked departed."})
     except Exception as e:
         return JsonResponse({"success": False, "message": str(e)})
@@ -708,37 +732,32 @@ def update_departure_time(request, entry_id):
 @user_passes_test(is_staff_admin_or_admin)
 @never_cache
 def queue_history(request):
-    logs = EntryLog.objects.select_related('vehicle', 'staff').order_by('-created_at')
     status_filter = request.GET.get('status', '')
     start_date = request.GET.get('start_date', '')
     end_date = request.GET.get('end_date', '')
-    if status_filter:
-        logs = logs.filter(status=status_filter)
-    if start_date:
-        logs = logs.filter(created_at__date__gte=start_date)
-    if end_date:
-        logs = logs.filter(created_at__date__lte=end_date)
+    route_filter = request.GET.get('route', '')
+    route_id = int(route_filter) if route_filter.isdigit() else None
 
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="queue_history.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Plate', 'Driver', 'Status', 'Fee', 'Staff', 'Entry Time'])
-        for log in logs:
-            writer.writerow([
-                getattr(log.vehicle, 'license_plate', 'N/A'),
-                f"{log.vehicle.assigned_driver.first_name} {log.vehicle.assigned_driver.last_name}"
-                if log.vehicle and log.vehicle.assigned_driver else "N/A",
-                log.status.title(),
-                f"₱{log.fee_charged}",
-                log.staff.username if log.staff else "N/A",
-                timezone.localtime(log.created_at).strftime("%Y-%m-%d %H:%M"),
-            ])
-        return response
+        return exports.queue_history_csv(start_date or None, end_date or None, status_filter or None, route_id)
+
+    # Live + archived entries, newest first, one keyset page at a time
+    def fetch(after, backwards):
+        return history.history_rows(
+            start_date=start_date or None,
+            end_date=end_date or None,
+            status=status_filter or None,
+            route_id=route_id,
+            chunk_size=HISTORY_PAGE_SIZE + 1,
+            after=after,
+            oldest_first=backwards,
+        )
 
+    page = paginate_rows(request, fetch, history.history_key, HISTORY_PAGE_SIZE)
     return render(request, "terminal/queue_history.html",
-                  {"logs": logs[:200], "status_filter": status_filter,
-                   "start_date": start_date, "end_date": end_date})
+                  {"logs": page, "page_obj": page, "status_filter": status_filter,
+                   "start_date": start_date, "end_date": end_date,
+                   "routes": Route.objects.all(), "route_filter": route_filter})
 
 
 @login_required(login_url='accounts:login')
@@ -746,9 +765,6 @@ def queue_history(request):
 @never_cache
 def manage_routes(request):
     """Admin-only page for managing routes and viewing analytics."""
-    from django.db.models import Count, Sum
-    from .models import EntryLog
-
     # --- ROUTE CRUD HANDLING ---
     if request.method == "POST":
         action = request.POST.get("action")
@@ -812,16 +828,8 @@ def manage_routes(request):
     # --- ANALYTICS SECTION ---
     routes = Route.objects.all().order_by('origin', 'destination')
 
-    route_stats = (
-        EntryLog.objects
-        .filter(vehicle__route__isnull=False)
-        .values('vehicle__route__id', 'vehicle__route__origin', 'vehicle__route__destination')
-        .annotate(
-            total_trips=Count('id'),
-            total_fees=Sum('fee_charged')
-        )
-        .order_by('-total_trips')
-    )
+    # Trips and fees per route over live + archived entry logs
+    route_stats = history.route_totals()
 
     total_trips = sum(item['total_trips'] for item in route_stats)
     total_fees = sum(item['total_fees'] or 0 for item in route_stats)
@@ -829,7 +837,7 @@ def manage_routes(request):
     top_route = route_stats[0] if route_stats else None
 
     # --- Chart.js Data ---
-    chart_labels = [f"{r['vehicle__route__origin']} → {r['vehicle__route__destination']}" for r in route_stats]
+    chart_labels = [f"{r['origin']} → {r['destination']}" for r in route_stats]
     chart_data = [r['total_trips'] for r in route_stats]
 
     context = {
@@ -892,6 +900,55 @@ def ajax_add_deposit(request):
         return JsonResponse({'success': False, 'message': str(e)})
 
 
+# ===============================
+#   BATCH DEPOSITS (cash-collection session)
+# ===============================
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_admin_or_admin)
+@never_cache
+def deposit_session(request):
+    """Page for entering a line of deposits and submitting them together (terminal:ajax_batch_deposit)."""
+    return render(request, "terminal/deposit_session.html", {
+        "payment_methods": batch_deposits.PAYMENT_METHODS,
+        "default_method": batch_deposits.DEFAULT_PAYMENT_METHOD,
+        "max_rows": batch_deposits.MAX_ROWS,
+        "min_deposit": SystemSettings.current().min_deposit_amount,
+    })
+
+
+@login_required(login_url='accounts:login')
+@user_passes_test(is_staff_admin_or_admin)
+@never_cache
+def ajax_batch_deposit(request):
+    """
+    Many deposits at once: {"deposits": [{"vehicle_id", "amount", "payment_method"}, ...]}.
+    All or nothing; returns each row's reference number and new wallet balance,
+    or the problems per row.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid request method."}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "Invalid JSON."}, status=400)
+
+    try:
+        rows = batch_deposits.deposit_batch(data.get("deposits") if isinstance(data, dict) else None)
+    except batch_deposits.DepositBatchError as e:
+        return JsonResponse({
+            "status": "error",
+            "message": str(e),
+            "errors": [{"row": index, "message": message} for index, message in e.errors],
+        }, status=400)
+
+    total = sum(row["amount"] for row in rows)
+    return JsonResponse({
+        "status": "success",
+        "message": f"✅ {len(rows)} deposit(s) totalling ₱{total:,.2f} recorded.",
+        "deposits": [{**row, "amount": float(row["amount"]), "balance": float(row["balance"])} for row in rows],
+    })
+
+
 @login_required(login_url='accounts:login')
 @user_passes_test(is_staff_admin_or_admin)
 @csrf_exempt
@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Driver, Vehicle, Wallet, Deposit
+from django.contrib import admin, messages
+from django.db import transaction
+from .models import Driver, Vehicle, Wallet, Deposit, QRImageJob, WalletLedgerEntry
+from . import ledger, qr_images
 from django.utils.html import format_html
 
 # Inline for Deposit model
@@ -30,6 +32,65 @@ class WalletAdmin(admin.ModelAdmin):
         return f"{obj.balance:,.2f} {obj.currency}"
     balance_display.short_description = 'Balance'
 
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        # Post back the balance the page showed, to spot edits made on a stale page
+        form.base_fields['balance'].show_hidden_initial = True
+        return form
+
+    def save_model(self, request, obj, form, change):
+        # The balance is never saved from here: a balance typed in is booked in
+        # the wallet ledger as an adjustment (ledger.adjust_to)
+        balance = obj.balance
+        if not change:
+            obj.balance = 0
+            super().save_model(request, obj, form, change)
+        else:
+            fields = [name for name in form.changed_data if name != 'balance']
+            if fields:
+                obj.save(update_fields=fields + ['updated_at'])
+        if change and 'balance' not in form.changed_data:
+            return
+
+        with transaction.atomic():
+            current = Wallet.objects.select_for_update().values_list('balance', flat=True).get(pk=obj.pk)
+            shown = form.initial.get('balance', current)
+            posted = form.data.get(form['balance'].html_initial_name)
+            if posted is not None:
+                # form.initial is re-read on POST; the page's value is the hidden initial
+                shown = form.fields['balance'].to_python(posted)
+            if change and shown != current:
+                obj.balance = current
+                self.message_user(
+                    request,
+                    f"The balance was not changed: it changed to {current:,.2f} while you were "
+                    f"editing. Review it and enter the new balance again.",
+                    messages.ERROR,
+                )
+                return
+            ledger.adjust_to(obj.pk, balance, reference=f"admin:{request.user.username}")
+        obj.balance = balance
+
+
+@admin.register(WalletLedgerEntry)
+class WalletLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'entry_type', 'source', 'amount', 'balance_after', 'reference', 'created_at')
+    list_filter = ('entry_type', 'source', 'created_at')
+    search_fields = ('reference', 'wallet__vehicle__license_plate')
+    raw_id_fields = ('wallet',)
+    ordering = ('-created_at', '-id')
+    list_per_page = 50
+
+    # Append-only: corrections are new adjustment entries
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Keep the other admin classes the same as above...
 @admin.register(Driver)
 class DriverAdmin(admin.ModelAdmin):
@@ -53,14 +114,14 @@ class VehicleAdmin(admin.ModelAdmin):
     list_per_page = 20
 
     def qr_code_display(self, obj):
-        if obj.qr_code:
-            return format_html('<img src="{}" width="100" height="100" />', obj.qr_code.url)
+        if obj.qr_image_url:
+            return format_html('<img src="{}" width="100" height="100" />', obj.qr_image_url)
         return "No QR Code"
     qr_code_display.short_description = "QR Code"
 
     def qr_code_preview(self, obj):
-        if obj.qr_code:
-            return format_html('<img src="{}" width="150" height="150" />', obj.qr_code.url)
+        if obj.qr_image_url:
+            return format_html('<img src="{}" width="150" height="150" />', obj.qr_image_url)
         return "QR code will be generated after saving."
     qr_code_preview.short_description = "QR Code Preview"
 
@@ -85,3 +146,22 @@ class DepositAdmin(admin.ModelAdmin):
     def amount_display(self, obj):
         return f"{obj.amount:,.2f} {obj.wallet.currency}"
     amount_display.short_description = 'Amount'
+
+
+@admin.register(QRImageJob)
+class QRImageJobAdmin(admin.ModelAdmin):
+    list_display = ('vehicle', 'qr_value', 'status', 'attempts', 'run_after', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('qr_value', 'vehicle__license_plate')
+    readonly_fields = ('vehicle', 'qr_value', 'status', 'attempts', 'run_after', 'last_error', 'created_at', 'updated_at')
+    actions = ['retry_jobs']
+    list_per_page = 20
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_jobs(self, request, queryset):
+        for job in queryset.select_related('vehicle'):
+            qr_images.enqueue(job.vehicle)
+        self.message_user(request, f"{queryset.count()} QR image job(s) queued again.")
+    retry_jobs.short_description = "Retry selected jobs"
@@ -0,0 +1,176 @@
+# vehicles/deposits.py
+"""
+Batch deposits for cash-collection sessions: a cashier takes deposits from
+a line of drivers and submits them together as (vehicle, amount, payment
+method) rows.
+
+The batch is validated in one pass (one query for all the vehicles) and is
+all-or-nothing: if any row is invalid nothing is saved and every problem is
+reported.  A valid batch is written in one transaction with a fixed number
+of queries, whatever its size: the wallets are locked in id order (so two
+sessions never deadlock), missing wallets are created, the deposits are
+inserted with bulk_create, every wallet is credited by one grouped
+UPDATE ... CASE, and the ledger entries (vehicles/ledger.py) are inserted
+with bulk_create, each with the balance right after its own deposit.
+bulk_create sends no post_save, so the daily finance rollups (one update
+per day / route / payment method) and the dashboard counters are updated
+here too.
+"""
+import uuid
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from reports import counters, rollups
+
+from . import ledger
+from .models import Deposit, Vehicle, Wallet, WalletLedgerEntry
+
+# Most rows accepted in one batch
+MAX_ROWS = getattr(settings, "DEPOSIT_BATCH_MAX", 200)
+
+# Largest single deposit accepted (a typo guard, not a business limit)
+MAX_AMOUNT = Decimal("100000.00")
+
+PAYMENT_METHODS = [
+    ("cash", "Cash"),
+    ("gcash", "GCash"),
+    ("manual", "Manual"),
+]
+DEFAULT_PAYMENT_METHOD = "cash"
+
+
+class DepositBatchError(Exception):
+    """The batch was rejected; `errors` is [(row index, message)] ([] for the batch as a whole)."""
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+def _reference_number():
+    # Same format as Deposit.save()
+    return f"DEP-{timezone.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+
+
+def validate(rows):
+    """
+    Check [{"vehicle_id", "amount", "payment_method"}] rows.  Returns
+    [(vehicle, amount, method)] in row order; raises DepositBatchError.
+    """
+    if not isinstance(rows, list) or not rows:
+        raise DepositBatchError("No deposits.")
+    if len(rows) > MAX_ROWS:
+        raise DepositBatchError(f"At most {MAX_ROWS} deposits per batch.")
+
+    methods = {key for key, _ in PAYMENT_METHODS}
+    parsed, errors = [], []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append((index, "Invalid row."))
+            parsed.append(None)
+            continue
+        try:
+            vehicle_id = int(row.get("vehicle_id"))
+        except (TypeError, ValueError):
+            vehicle_id = None
+            errors.append((index, "Choose a vehicle."))
+        try:
+            amount = Decimal(str(row.get("amount", "")).strip())
+            if not amount.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            amount = None
+            errors.append((index, "Invalid deposit amount."))
+        else:
+            if amount <= 0:
+                errors.append((index, "Deposit amount must be greater than zero."))
+            elif amount > MAX_AMOUNT:
+                errors.append((index, f"Deposit amount can't exceed ₱{MAX_AMOUNT:,}."))
+            elif amount != amount.quantize(Decimal("0.01")):
+                errors.append((index, "Deposit amount can't have more than two decimals."))
+        method = str(row.get("payment_method") or DEFAULT_PAYMENT_METHOD).strip().lower()
+        if method not in methods:
+            errors.append((index, f"Unknown payment method '{method}'."))
+        parsed.append((vehicle_id, amount, method))
+
+    wanted = {row[0] for row in parsed if row and row[0] is not None}
+    vehicles = Vehicle.objects.only("id", "license_plate").in_bulk(wanted)
+    for index, row in enumerate(parsed):
+        if row and row[0] is not None and row[0] not in vehicles:
+            errors.append((index, "Vehicle not found."))
+
+    if errors:
+        raise DepositBatchError(f"{len({index for index, _ in errors})} deposit(s) need fixing; nothing was saved.",
+                                sorted(errors))
+    return [(vehicles[vehicle_id], amount, method) for vehicle_id, amount, method in parsed]
+
+
+def deposit_batch(rows):
+    """
+    Validate and apply a batch of deposits (see validate()).  Returns one
+    dict per row, in order: reference, vehicle_id, plate, amount,
+    payment_method and balance (the wallet balance right after that
+    deposit).  Raises DepositBatchError.
+    """
+    valid = validate(rows)
+    vehicle_ids = {vehicle.pk for vehicle, _, _ in valid}
+    now = timezone.now()
+
+    with transaction.atomic():
+        # What get_or_create does for single deposits
+        Wallet.objects.bulk_create([Wallet(vehicle_id=pk) for pk in vehicle_ids], ignore_conflicts=True)
+        wallet_ids = dict(
+            Wallet.objects.select_for_update()
+            .filter(vehicle_id__in=vehicle_ids)
+            .order_by("pk")
+            .values_list("vehicle_id", "pk")
+        )
+
+        deposits = Deposit.objects.bulk_create([
+            Deposit(wallet_id=wallet_ids[vehicle.pk], amount=amount, payment_method=method,
+                    reference_number=_reference_number())
+            for vehicle, amount, method in valid
+        ])
+
+        totals = defaultdict(Decimal)
+        for deposit in deposits:
+            totals[deposit.wallet_id] += deposit.amount
+        increment = Case(
+            *[When(pk=wallet_id, then=Value(total)) for wallet_id, total in totals.items()],
+            output_field=Wallet._meta.get_field("balance"),
+        )
+        Wallet.objects.filter(pk__in=totals).update(balance=F("balance") + increment, updated_at=now)
+        # Locked since the SELECT FOR UPDATE, so these are exactly this batch's results
+        balances = dict(Wallet.objects.filter(pk__in=totals).values_list("pk", "balance"))
+
+        # Walk each wallet back from its final balance to get the balance after every row
+        running = dict(balances)
+        balance_after = [None] * len(deposits)
+        for index in range(len(deposits) - 1, -1, -1):
+            deposit = deposits[index]
+            balance_after[index] = running[deposit.wallet_id]
+            running[deposit.wallet_id] -= deposit.amount
+
+        ledger.record_many(
+            (deposit.wallet_id, deposit.amount, balance, WalletLedgerEntry.SOURCE_DEPOSIT, deposit.reference_number)
+            for deposit, balance in zip(deposits, balance_after)
+        )
+        rollups.record_deposits(deposits)
+        counters.add(deposit_total=sum(totals.values()), deposit_count=len(deposits))
+
+    return [
+        {
+            "reference": deposit.reference_number,
+            "vehicle_id": vehicle.pk,
+            "plate": vehicle.license_plate,
+            "amount": deposit.amount,
+            "payment_method": deposit.payment_method,
+            "balance": balance,
+        }
+        for (vehicle, _, _), deposit, balance in zip(valid, deposits, balance_after)
+    ]
@@ -0,0 +1,323 @@
+# vehicles/fleet_import.py
+"""
+Bulk fleet import: one CSV / XLSX row per vehicle, with its driver's
+details on the same row.  Rows sharing a driver license number share one
+driver, and a license number that is already registered reuses that driver.
+
+The whole file is validated before anything is written: every row goes
+through the models' own field validation and Vehicle.clean() (without their
+per-row uniqueness / foreign key queries), and the unique vehicle columns
+(CR, OR, VIN, registration number, plate) are checked against the file
+itself and against the database with one query per column.  Rows with
+errors are reported and skipped; the valid rows are then written in one
+transaction with bulk_create (drivers, vehicles, wallets, QR image jobs),
+so no per-row save() or post_save signal runs.  QR images are rendered and
+uploaded afterwards by the QR job worker (vehicles/qr_images.py).
+"""
+import csv
+import io
+import uuid
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from reports import counters
+
+from . import qr_images, search
+from .models import Driver, Route, Vehicle, Wallet
+from .qr_cache import normalize_qr_value
+
+# Largest file accepted, in rows
+MAX_ROWS = 5000
+
+BATCH_SIZE = 500
+
+DRIVER_COLUMNS = (
+    "first_name", "middle_name", "last_name", "suffix", "birth_date", "mobile_number", "email",
+    "license_number", "license_expiry", "license_type", "barangay", "city_municipality", "province",
+)
+VEHICLE_COLUMNS = (
+    "vehicle_name", "vehicle_type", "ownership_type", "license_plate", "cr_number", "or_number",
+    "vin_number", "registration_number", "registration_expiry", "year_model", "seat_capacity", "route",
+)
+COLUMNS = DRIVER_COLUMNS + VEHICLE_COLUMNS
+REQUIRED = (
+    "first_name", "last_name", "license_number", "vehicle_type", "license_plate", "cr_number",
+    "or_number", "vin_number", "registration_number", "year_model",
+)
+UNIQUE_VEHICLE_COLUMNS = ("cr_number", "or_number", "vin_number", "registration_number", "license_plate")
+DATE_COLUMNS = ("birth_date", "license_expiry", "registration_expiry")
+
+
+class FleetImportError(Exception):
+    """The file as a whole can't be imported (format, size, missing columns)."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.total_rows = 0
+        self.created_drivers = 0
+        self.reused_drivers = 0
+        self.created_vehicles = 0
+        self.errors = []    # (row number, column or "", message)
+
+    @property
+    def error_rows(self):
+        return len({row for row, _, _ in self.errors})
+
+    def add_error(self, row, column, message):
+        self.errors.append((row, column, message))
+
+
+# -------------------------
+# READING
+# -------------------------
+def _header_key(value):
+    return str(value or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def read_rows(uploaded_file):
+    """[(row number, {column: value}), ...] from a .csv or .xlsx upload (row numbers as in the file)."""
+    name = (getattr(uploaded_file, "name", "") or "").lower()
+    if name.endswith(".xlsx"):
+        rows = _read_xlsx(uploaded_file)
+    elif name.endswith(".csv"):
+        text = io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline="")
+        rows = csv.reader(text)
+    else:
+        raise FleetImportError("Upload a .csv or .xlsx file.")
+
+    rows = iter(rows)
+    header = [_header_key(value) for value in next(rows, [])]
+    missing = [column for column in REQUIRED if column not in header]
+    if missing:
+        raise FleetImportError(f"Missing columns: {', '.join(missing)}.")
+
+    parsed = []
+    for number, values in enumerate(rows, start=2):
+        if not any(str(value or "").strip() for value in values):
+            continue
+        if len(parsed) >= MAX_ROWS:
+            raise FleetImportError(f"The file has more than {MAX_ROWS} rows; split it up.")
+        parsed.append((number, {key: value for key, value in zip(header, values) if key in COLUMNS}))
+    return parsed
+
+
+def _read_xlsx(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise FleetImportError("Reading .xlsx files needs the openpyxl package; upload a CSV instead.")
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    return workbook.active.iter_rows(values_only=True)
+
+
+def template_csv():
+    """Header row (and one example row) of an import file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    writer.writerow([
+        "Juan", "", "Dela Cruz", "", "1985-04-12", "09171234567", "juan@example.com",
+        "N01-23-456789", "2027-04-12", "Professional", "Poblacion", "Tagbilaran City", "Bohol",
+        "Unit 1", "jeepney", "owned", "ABC 1234", "CR-000123", "OR-000123",
+        "1HGBH41JXMN109186", "REG-000123", "2026-12-31", "2019", "22", "",
+    ])
+    return buffer.getvalue()
+
+
+# -------------------------
+# VALIDATION
+# -------------------------
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _date(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValidationError(f"'{text}' is not a date (use YYYY-MM-DD).")
+
+
+def _choice(value, choices, default=None):
+    text = _text(value).lower()
+    if not text:
+        return default
+    for key, label in choices:
+        if text in (key.lower(), label.lower()):
+            return key
+    raise ValidationError(f"'{_text(value)}' is not one of: {', '.join(key for key, _ in choices)}.")
+
+
+def _build(number, row, routes, result):
+    """(Driver, Vehicle) instances for one row, both unsaved; None if the row has errors."""
+    values, errors = {}, []
+    for column in COLUMNS:
+        try:
+            if column in DATE_COLUMNS:
+                values[column] = _date(row.get(column))
+            elif column == "vehicle_type":
+                values[column] = _choice(row.get(column), Vehicle.VEHICLE_TYPES)
+            elif column == "ownership_type":
+                values[column] = _choice(row.get(column), Vehicle.OWNERSHIP_TYPES, default="owned")
+            else:
+                values[column] = _text(row.get(column))
+        except ValidationError as exc:
+            errors.append((column, exc.messages[0]))
+    for column in REQUIRED:
+        if not values.get(column) and not any(c == column for c, _ in errors):
+            errors.append((column, "This field is required."))
+
+    route = None
+    if values.get("route"):
+        route = routes.get(values["route"].lower())
+        if route is None:
+            errors.append(("route", f"Unknown route '{values['route']}'."))
+
+    for column in ("year_model", "seat_capacity"):
+        if values.get(column):
+            try:
+                values[column] = int(values[column])
+            except ValueError:
+                errors.append((column, f"'{values[column]}' is not a whole number."))
+                values[column] = None
+        else:
+            values[column] = None
+
+    if errors:
+        for column, message in errors:
+            result.add_error(number, column, message)
+        return None
+
+    driver = Driver(**{column: values[column] or None for column in DRIVER_COLUMNS})
+    driver.first_name, driver.last_name = values["first_name"], values["last_name"]
+    vehicle = Vehicle(
+        vehicle_name=values["vehicle_name"] or "Unnamed Vehicle",
+        vehicle_type=values["vehicle_type"],
+        ownership_type=values["ownership_type"],
+        license_plate=values["license_plate"].upper(),
+        cr_number=values["cr_number"].upper(),
+        or_number=values["or_number"].upper(),
+        vin_number=values["vin_number"].upper(),
+        registration_number=values["registration_number"].upper(),
+        registration_expiry=values["registration_expiry"],
+        year_model=values["year_model"],
+        seat_capacity=values["seat_capacity"],
+        route=route,
+    )
+
+    # The models' own rules, minus their per-row uniqueness and foreign key queries
+    reported = len(result.errors)
+    for instance, exclude in ((driver, ["driver_id"]), (vehicle, ["assigned_driver", "route", "qr_value"])):
+        try:
+            instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+        except ValidationError as exc:
+            for column, messages in exc.message_dict.items():
+                for message in messages:
+                    result.add_error(number, "" if column == "__all__" else column, message)
+    if len(result.errors) > reported:
+        return None
+    return driver, vehicle
+
+
+def _check_unique(candidates, result):
+    """Drop rows whose unique vehicle columns repeat in the file or already exist (one query per column)."""
+    rejected = set()
+    for column in UNIQUE_VEHICLE_COLUMNS:
+        seen = {}
+        for number, _, vehicle in candidates:
+            value = getattr(vehicle, column)
+            if value in seen:
+                result.add_error(number, column, f"'{value}' is repeated in the file (row {seen[value]}).")
+                rejected.add(number)
+            else:
+                seen[value] = number
+        lookup = {f"{column}__in": list(seen)}
+        for value in Vehicle.objects.filter(**lookup).values_list(column, flat=True):
+            result.add_error(seen[value], column, f"'{value}' is already registered.")
+            rejected.add(seen[value])
+    return [candidate for candidate in candidates if candidate[0] not in rejected]
+
+
+def validate(rows, result):
+    """Valid rows as [(row number, Driver, Vehicle)]; errors go to `result`."""
+    routes = {route.name.lower(): route for route in Route.objects.all()}
+    candidates = []
+    for number, row in rows:
+        built = _build(number, row, routes, result)
+        if built:
+            candidates.append((number, *built))
+    return _check_unique(candidates, result)
+
+
+# -------------------------
+# WRITING
+# -------------------------
+def import_fleet(rows, dry_run=False):
+    """Validate and import parsed rows (see read_rows()). Returns an ImportResult."""
+    result = ImportResult()
+    result.total_rows = len(rows)
+    valid = validate(rows, result)
+    if dry_run or not valid:
+        result.created_vehicles = len(valid) if dry_run else 0
+        return result
+
+    existing = {}
+    for driver in Driver.objects.filter(license_number__in={d.license_number for _, d, _ in valid}):
+        existing.setdefault(driver.license_number, driver)
+
+    try:
+        with transaction.atomic():
+            new_drivers = {}
+            for _, driver, vehicle in valid:
+                key = driver.license_number
+                if key in existing:
+                    vehicle.assigned_driver = existing[key]
+                    continue
+                if key not in new_drivers:
+                    # Driver.save() normally assigns this
+                    driver.driver_id = f"DRV-{uuid.uuid4().hex[:8].upper()}"
+                    new_drivers[key] = driver
+                vehicle.assigned_driver = new_drivers[key]
+            Driver.objects.bulk_create(new_drivers.values(), batch_size=BATCH_SIZE)
+            for _, _, vehicle in valid:
+                vehicle.assigned_driver_id = vehicle.assigned_driver.pk
+
+            vehicles = Vehicle.objects.bulk_create([vehicle for _, _, vehicle in valid], batch_size=BATCH_SIZE)
+            # Vehicle.save() derives the QR value from the id, known only now
+            for vehicle in vehicles:
+                vehicle.qr_value = normalize_qr_value(f"VEH-{vehicle.pk}-{vehicle.license_plate}")
+            Vehicle.objects.bulk_update(vehicles, ["qr_value"], batch_size=BATCH_SIZE)
+            # What the create_wallet_for_vehicle signal does for single saves
+            Wallet.objects.bulk_create([Wallet(vehicle=vehicle) for vehicle in vehicles], batch_size=BATCH_SIZE)
+            qr_images.enqueue_many(vehicles)
+            counters.add(drivers=len(new_drivers), vehicles=len(vehicles))
+
+            driver_ids = [driver.pk for driver in new_drivers.values()]
+            vehicle_ids = [vehicle.pk for vehicle in vehicles]
+            transaction.on_commit(lambda: (search.driver_index.refresh(driver_ids),
+                                           search.vehicle_index.refresh(vehicle_ids)))
+    except IntegrityError:
+        # Another registration took one of the values after validation
+        raise FleetImportError("Some vehicles were registered while the file was being imported; "
+                               "nothing was saved. Please upload the file again.")
+
+    result.created_drivers = len(new_drivers)
+    result.reused_drivers = len({d.license_number for _, d, _ in valid if d.license_number in existing})
+    result.created_vehicles = len(vehicles)
+    return result
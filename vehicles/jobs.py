@@ -0,0 +1,51 @@
+# vehicles/jobs.py
+"""
+Background job state shared by every web worker, stored in JobState rows.
+
+The license OCR pool (vehicles/ocr.py) and the wallet reconciliation job
+(vehicles/reconcile.py) run in one gunicorn worker, while the client's
+polls may reach any other.  Django's default cache is per process, so their
+state lives in the database instead, with a cache-like API: get(), put()
+with a time to live, add() (store only if absent, used as a "running" lock)
+and delete().  Expired rows read as missing and are deleted by queue
+maintenance (purge_expired(), terminal/maintenance.py).
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import JobState
+
+
+def get(key):
+    """The stored state of `key`, or None when it is missing or expired."""
+    return JobState.objects.filter(key=key, expires_at__gt=timezone.now()).values_list("state", flat=True).first()
+
+
+def put(key, state, ttl_seconds):
+    """Store (or replace) the state of `key` for `ttl_seconds`."""
+    expires_at = timezone.now() + timedelta(seconds=ttl_seconds)
+    JobState.objects.update_or_create(key=key, defaults={"state": state, "expires_at": expires_at})
+
+
+def add(key, state, ttl_seconds):
+    """Store the state of `key` only if it is missing or expired. Returns whether it was stored."""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            JobState.objects.filter(key=key, expires_at__lte=now).delete()
+            JobState.objects.create(key=key, state=state, expires_at=now + timedelta(seconds=ttl_seconds))
+    except IntegrityError:
+        return False
+    return True
+
+
+def delete(key):
+    JobState.objects.filter(key=key).delete()
+
+
+def purge_expired(now=None):
+    """Delete expired job states. Returns the number deleted."""
+    deleted, _ = JobState.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,194 @@
+# vehicles/ledger.py
+"""
+Append-only wallet ledger.
+
+Every change of Wallet.balance writes one WalletLedgerEntry in the same
+transaction, while the wallet row is locked by the UPDATE that changed it:
+deposits (Deposit.save), terminal entry fees (terminal/gate.py) and
+adjustments (adjust_to(), used by the Django admin).  An entry keeps the
+direction, source and reference of the change and the balance right after
+it, so:
+
+- balance_at() / balances_at() answer "what was the balance at time T"
+  with one indexed lookup per wallet, however long the history;
+- a WalletCheckpoint pins a wallet's balance at one entry, and
+  verify_wallet() only sums the entries after the latest checkpoint.
+  checkpoint_wallets() runs from queue maintenance (terminal/maintenance.py),
+  in its own transaction, every WALLET_CHECKPOINT_INTERVAL_MINUTES for
+  wallets with at least WALLET_CHECKPOINT_EVERY new entries.
+
+Recording also keeps the dashboards' wallet balance total
+(reports/counters.py).
+
+Balances that existed before the ledger start with an "opening" entry
+(migration 0015).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from reports import counters
+
+from .models import Wallet, WalletCheckpoint, WalletLedgerEntry
+
+# New ledger entries a wallet needs before checkpoint_wallets() checkpoints it again
+CHECKPOINT_EVERY = getattr(settings, "WALLET_CHECKPOINT_EVERY", 100)
+
+ZERO = Decimal("0.00")
+
+
+# -------------------------
+# RECORDING
+# -------------------------
+def record(wallet_id, delta, balance_after, source, reference=""):
+    """
+    Book a balance change of `delta` (signed) that has just been applied;
+    `balance_after` is the balance it left.  Call inside the transaction
+    that changed the balance.  Returns the entry (None for a zero change).
+    """
+    delta = Decimal(delta)
+    if not delta:
+        return None
+    counters.add(wallet_balance_total=delta)
+    return WalletLedgerEntry.objects.create(
+        wallet_id=wallet_id,
+        entry_type=WalletLedgerEntry.TYPE_CREDIT if delta > 0 else WalletLedgerEntry.TYPE_DEBIT,
+        source=source,
+        reference=str(reference)[:100],
+        amount=abs(delta),
+        balance_after=balance_after,
+    )
+
+
+def record_many(changes):
+    """record() for many applied changes at once: [(wallet id, delta, balance after, source, reference)]."""
+    entries = [
+        WalletLedgerEntry(
+            wallet_id=wallet_id,
+            entry_type=WalletLedgerEntry.TYPE_CREDIT if delta > 0 else WalletLedgerEntry.TYPE_DEBIT,
+            source=source,
+            reference=str(reference)[:100],
+            amount=abs(delta),
+            balance_after=balance_after,
+        )
+        for wallet_id, delta, balance_after, source, reference in changes
+        if delta
+    ]
+    counters.add(wallet_balance_total=sum((entry.signed_amount for entry in entries), ZERO))
+    return WalletLedgerEntry.objects.bulk_create(entries)
+
+
+def adjust_to(wallet_id, balance, reference=""):
+    """Set a wallet's balance (a correction), booking the difference as an adjustment. Returns the difference."""
+    balance = Decimal(balance)
+    with transaction.atomic():
+        current = Wallet.objects.select_for_update().values_list("balance", flat=True).get(pk=wallet_id)
+        delta = balance - current
+        if delta:
+            Wallet.objects.filter(pk=wallet_id).update(balance=balance, updated_at=timezone.now())
+            record(wallet_id, delta, balance, WalletLedgerEntry.SOURCE_ADJUSTMENT, reference)
+    return delta
+
+
+# -------------------------
+# HISTORICAL BALANCES
+# -------------------------
+def _balance_after(wallet_id_ref, when):
+    return (
+        WalletLedgerEntry.objects.filter(wallet_id=wallet_id_ref, created_at__lte=when)
+        .order_by("-created_at", "-id")
+        .values("balance_after")[:1]
+    )
+
+
+def balance_at(wallet_id, when):
+    """A wallet's balance at `when` (0 before its first entry)."""
+    balance = _balance_after(wallet_id, when).values_list("balance_after", flat=True).first()
+    return balance if balance is not None else ZERO
+
+
+def balances_at(when, wallet_ids=None):
+    """{wallet id: balance at `when`} for the given wallets (default: all), in one query."""
+    wallets = Wallet.objects.all() if wallet_ids is None else Wallet.objects.filter(pk__in=wallet_ids)
+    past = Subquery(_balance_after(OuterRef("pk"), when), output_field=WalletLedgerEntry._meta.get_field("balance_after"))
+    rows = wallets.annotate(past=past).values_list("pk", "past")
+    return {pk: past if past is not None else ZERO for pk, past in rows}
+
+
+# -------------------------
+# CHECKPOINTS
+# -------------------------
+def _latest_checkpoint(wallet_id):
+    return WalletCheckpoint.objects.filter(wallet_id=wallet_id).order_by("-last_entry_id").first()
+
+
+def entries_since_checkpoint():
+    """Ledger entries after their wallet's latest checkpoint (all of them for wallets without one)."""
+    since = Subquery(
+        WalletCheckpoint.objects.filter(wallet_id=OuterRef("wallet_id"))
+        .order_by("-last_entry_id")
+        .values("last_entry_id")[:1]
+    )
+    return WalletLedgerEntry.objects.alias(since=since).filter(Q(since__isnull=True) | Q(id__gt=F("since")))
+
+
+def latest_checkpoints(wallet_ids):
+    """{wallet id: its latest WalletCheckpoint} for the given wallets, in one query."""
+    latest = (
+        WalletCheckpoint.objects.filter(wallet_id=OuterRef("wallet_id"))
+        .order_by("-last_entry_id")
+        .values("pk")[:1]
+    )
+    return {
+        checkpoint.wallet_id: checkpoint
+        for checkpoint in WalletCheckpoint.objects.filter(wallet_id__in=wallet_ids, pk=Subquery(latest))
+    }
+
+
+def checkpoint_wallets(min_entries=CHECKPOINT_EVERY):
+    """Checkpoint every wallet with at least `min_entries` entries since its last checkpoint. Returns how many."""
+    due = list(
+        entries_since_checkpoint()
+        .values("wallet_id")
+        .annotate(entries=Count("id"), last_id=Max("id"))
+        .filter(entries__gte=max(min_entries, 1))
+    )
+    balances = dict(
+        WalletLedgerEntry.objects.filter(id__in=[row["last_id"] for row in due]).values_list("id", "balance_after")
+    )
+    WalletCheckpoint.objects.bulk_create([
+        WalletCheckpoint(wallet_id=row["wallet_id"], last_entry_id=row["last_id"], balance=balances[row["last_id"]])
+        for row in due
+    ])
+    return len(due)
+
+
+def verify_wallet(wallet_id):
+    """
+    Check a wallet's balance against its ledger: the latest checkpoint plus
+    the entries after it.  Returns a dict with both balances, the number of
+    entries summed and "ok".
+    """
+    checkpoint = _latest_checkpoint(wallet_id)
+    start = checkpoint.balance if checkpoint else ZERO
+    entries = WalletLedgerEntry.objects.filter(wallet_id=wallet_id)
+    if checkpoint:
+        entries = entries.filter(id__gt=checkpoint.last_entry_id)
+    totals = entries.aggregate(
+        credits=Sum("amount", filter=Q(entry_type=WalletLedgerEntry.TYPE_CREDIT)),
+        debits=Sum("amount", filter=Q(entry_type=WalletLedgerEntry.TYPE_DEBIT)),
+        entries=Count("id"),
+    )
+    ledger_balance = start + (totals["credits"] or ZERO) - (totals["debits"] or ZERO)
+    wallet_balance = Wallet.objects.values_list("balance", flat=True).get(pk=wallet_id)
+    return {
+        "wallet_id": wallet_id,
+        "checkpoint_entry_id": checkpoint.last_entry_id if checkpoint else None,
+        "entries_summed": totals["entries"],
+        "ledger_balance": ledger_balance,
+        "wallet_balance": wallet_balance,
+        "ok": ledger_balance == wallet_balance,
+    }
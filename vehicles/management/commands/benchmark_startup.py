@@ -0,0 +1,113 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter per measurement and prints one JSON line
+PROBE = r"""
+import json, os, sys, time
+
+started = time.perf_counter()
+if os.environ.get("RDFS_BENCH_EAGER"):
+    # What importing vehicles.views cost before the OCR stack was loaded lazily
+    import cv2, numpy, pytesseract
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+ready = time.perf_counter()
+
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+status = Client().get(os.environ["RDFS_BENCH_PATH"]).status_code
+first_request = time.perf_counter()
+loaded = [name for name in ("cv2", "numpy", "pytesseract") if name in sys.modules]
+try:
+    import resource
+    # Memory of a worker that has served requests but no scans
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    rss_mb = None
+
+ocr_seconds = ocr_status = None
+if os.environ.get("RDFS_BENCH_OCR"):
+    ocr_started = time.perf_counter()
+    import numpy as np, cv2
+    from vehicles import ocr
+    image = np.random.default_rng().integers(0, 255, (540, 856), dtype=np.uint8)
+    job_id = ocr.submit(cv2.imencode(".png", image)[1].tobytes())
+    state = ocr.job_state(job_id)
+    while state and state["status"] == ocr.STATUS_PENDING:
+        time.sleep(0.01)
+        state = ocr.job_state(job_id)
+    ocr_seconds = time.perf_counter() - ocr_started
+    ocr_status = state["status"] if state else "expired"
+
+print(json.dumps({
+    "startup": ready - started,
+    "first_request": first_request - ready,
+    "status": status,
+    "loaded": loaded,
+    "first_ocr": ocr_seconds,
+    "ocr_status": ocr_status,
+    "rss_mb": rss_mb,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Startup benchmark: time for a fresh process to set up Django and load the URLconf, its "
+        "first request and its first license OCR, with the OCR stack imported eagerly (as "
+        "vehicles/views.py used to) and lazily (as now).  RSS is the memory after the first request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Fresh processes per mode (medians are shown).")
+        parser.add_argument("--path", default="/passenger/", help="URL of the first request.")
+        parser.add_argument("--skip-ocr", action="store_true", help="Don't time a first OCR scan.")
+
+    def handle(self, *args, **options):
+        rows = []
+        for label, eager in (("eager (before)", True), ("lazy (now)", False)):
+            runs = [self._probe(eager, options) for _ in range(max(options["runs"], 1))]
+            rows.append((label, runs))
+
+        self.stdout.write(f"{'':16}{'startup':>10}{'1st request':>13}{'1st OCR':>10}{'RSS':>10}  OCR stack loaded")
+        for label, runs in rows:
+            first_ocr = [run["first_ocr"] for run in runs if run["first_ocr"] is not None]
+            rss = [run["rss_mb"] for run in runs if run["rss_mb"] is not None]
+            self.stdout.write(
+                f"{label:16}"
+                f"{statistics.median(run['startup'] for run in runs):>9.3f}s"
+                f"{statistics.median(run['first_request'] for run in runs):>12.3f}s"
+                + (f"{statistics.median(first_ocr):>9.3f}s" if first_ocr else f"{'-':>10}")
+                + (f"{statistics.median(rss):>8.0f}MB" if rss else f"{'-':>10}")
+                + f"  {', '.join(runs[-1]['loaded']) or 'no'}"
+            )
+        statuses = {run["status"] for _, runs in rows for run in runs}
+        ocr_statuses = {run["ocr_status"] for _, runs in rows for run in runs if run["ocr_status"]}
+        self.stdout.write(f"First request HTTP status: {', '.join(map(str, sorted(statuses)))}")
+        if ocr_statuses:
+            # Without tesseract installed the scan fails fast; the time is then the pool and import cost
+            self.stdout.write(f"First OCR outcome: {', '.join(sorted(ocr_statuses))}")
+
+    def _probe(self, eager, options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE, RDFS_BENCH_PATH=options["path"])
+        env.pop("RDFS_BENCH_EAGER", None)
+        env.pop("RDFS_BENCH_OCR", None)
+        if eager:
+            env["RDFS_BENCH_EAGER"] = "1"
+        if not options["skip_ocr"]:
+            env["RDFS_BENCH_OCR"] = "1"
+        done = subprocess.run(
+            [sys.executable, "-c", PROBE], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True
+        )
+        if done.returncode != 0:
+            raise CommandError(f"Benchmark process failed:\n{done.stderr[-2000:]}")
+        return json.loads(done.stdout.strip().splitlines()[-1])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles.fleet_import import FleetImportError, import_fleet, read_rows
+
+
+class Command(BaseCommand):
+    help = "Register drivers and vehicles in bulk from a CSV or XLSX file (same format as the Fleet Import page)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The .csv or .xlsx file to import.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without saving anything.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], "rb") as upload:
+                result = import_fleet(read_rows(upload), dry_run=options["dry_run"])
+        except OSError as exc:
+            raise CommandError(f"Can't open {options['path']}: {exc}")
+        except FleetImportError as exc:
+            raise CommandError(str(exc))
+
+        for row, column, message in result.errors:
+            self.stderr.write(f"Row {row}{f' [{column}]' if column else ''}: {message}")
+        verb = "Ready to import" if options["dry_run"] else "Imported"
+        self.stdout.write(
+            f"{verb} {result.created_vehicles} of {result.total_rows} rows "
+            f"({result.created_drivers} new drivers, {result.reused_drivers} existing); "
+            f"{result.error_rows} rows skipped."
+        )
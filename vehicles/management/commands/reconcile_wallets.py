@@ -0,0 +1,54 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles.reconcile import CHUNK_SIZE, reconcile, write_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every wallet balance against its ledger (latest checkpoint plus the deposits, entry fees "
+        "and adjustments after it) and write the discrepancies as CSV. Exits with an error if any are found."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", "-o", help="CSV report file (default: standard output).")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                            help="Wallets per chunk (default: WALLET_RECONCILE_CHUNK_SIZE).")
+        parser.add_argument("--no-progress", action="store_true", help="Don't show progress on stderr.")
+
+    def handle(self, *args, **options):
+        # Redrawn in place on a terminal, one line per chunk otherwise
+        interactive = sys.stderr.isatty()
+
+        def progress(checked, total):
+            percent = checked * 100 // total if total else 100
+            line = f"Reconciled {checked}/{total} wallets ({percent}%)"
+            if interactive:
+                self.stderr.write(f"\r{line}", ending="")
+            else:
+                self.stderr.write(line)
+            self.stderr.flush()
+
+        result = reconcile(
+            chunk_size=max(options["chunk_size"], 1),
+            progress=None if options["no_progress"] else progress,
+        )
+        if interactive and not options["no_progress"] and result.checked:
+            self.stderr.write("")
+
+        if options["output"]:
+            try:
+                with open(options["output"], "w", newline="", encoding="utf-8") as report:
+                    write_csv(result.discrepancies, report)
+            except OSError as exc:
+                raise CommandError(f"Can't write {options['output']}: {exc}")
+        elif result.discrepancies:
+            write_csv(result.discrepancies, self.stdout)
+
+        rate = result.checked / result.seconds if result.seconds else 0
+        summary = (f"{result.checked} wallets checked in {result.seconds:.2f}s ({rate:.0f}/s); "
+                   f"{len(result.discrepancies)} discrepancies.")
+        if not result.ok:
+            raise CommandError(summary)
+        self.stderr.write(self.style.SUCCESS(summary))
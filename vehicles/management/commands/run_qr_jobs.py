@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from vehicles.qr_images import POLL_SECONDS, enqueue_missing, process_pending
+
+
+class Command(BaseCommand):
+    help = "Render and upload pending vehicle QR images in a loop, or once with --once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=POLL_SECONDS,
+                            help="Seconds between passes (default: VEHICLE_QR_JOB_POLL_SECONDS).")
+        parser.add_argument("--once", action="store_true", help="Run the due jobs once and exit.")
+        parser.add_argument("--enqueue-missing", action="store_true",
+                            help="First queue a job for every vehicle without a stored QR image.")
+
+    def handle(self, *args, **options):
+        if options["enqueue_missing"]:
+            self.stdout.write(f"Queued {enqueue_missing()} vehicles without a stored QR image.")
+        while True:
+            close_old_connections()
+            counts = process_pending()
+            if any(counts.values()):
+                self.stdout.write(
+                    f"Uploaded {counts['done']}, retrying {counts['retried']}, failed {counts['failed']}."
+                )
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
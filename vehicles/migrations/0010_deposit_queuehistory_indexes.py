@@ -0,0 +1,56 @@
+from django.db import migrations, models
+
+
+# Deposit.wallet__vehicle__license_plate__icontains compiles to
+# UPPER(license_plate::text) LIKE UPPER('%...%') on PostgreSQL, which only a
+# trigram index on the same expression can serve. SQLite has no equivalent;
+# the plate lookup there stays a scan of the (small) vehicle table.
+TRIGRAM_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS vehicle_plate_trgm_idx "
+    "ON vehicles_vehicle USING gin (UPPER(license_plate::text) gin_trgm_ops)",
+]
+TRIGRAM_REVERSE = [
+    "DROP INDEX IF EXISTS vehicle_plate_trgm_idx",
+]
+
+
+def create_plate_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in TRIGRAM_FORWARD:
+        schema_editor.execute(sql)
+
+
+def drop_plate_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in TRIGRAM_REVERSE:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0009_rename_status_temp_vehicle_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['created_at'], name='deposit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['wallet', '-created_at'], name='deposit_wallet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuehistory',
+            index=models.Index(fields=['-timestamp'], name='queuehistory_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queuehistory',
+            index=models.Index(fields=['vehicle', '-timestamp'], name='queuehistory_vehicle_ts_idx'),
+        ),
+        migrations.RunPython(create_plate_trigram_index, drop_plate_trigram_index),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def normalize_qr_values(apps, schema_editor):
+    """Store every qr_value in canonical form (see vehicles.qr_cache.normalize_qr_value)."""
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    taken = set(Vehicle.objects.exclude(qr_value__isnull=True).values_list('qr_value', flat=True))
+    for pk, value in Vehicle.objects.exclude(qr_value__isnull=True).values_list('pk', 'qr_value').iterator():
+        canonical = value.strip().replace(' ', '-').upper() or None
+        if canonical == value:
+            continue
+        if canonical in taken:
+            # Another vehicle already owns the canonical form; leave this one for manual review
+            continue
+        Vehicle.objects.filter(pk=pk).update(qr_value=canonical)
+        taken.discard(value)
+        taken.add(canonical)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0010_deposit_queuehistory_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_qr_values, migrations.RunPython.noop),
+    ]
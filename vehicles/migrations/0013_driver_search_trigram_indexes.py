@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# vehicles.search runs icontains filters over these driver columns; on
+# PostgreSQL they compile to UPPER(col::text) LIKE '%...%', which a trigram
+# GIN index on the same expression serves (the plate has one since 0010).
+# Other databases use the in-memory index in vehicles/search.py instead.
+DRIVER_SEARCH_FIELDS = ['first_name', 'middle_name', 'last_name', 'license_number', 'mobile_number', 'driver_id']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for field in DRIVER_SEARCH_FIELDS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS driver_{field}_trgm_idx "
+            f"ON vehicles_driver USING gin (UPPER({field}::text) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in DRIVER_SEARCH_FIELDS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS driver_{field}_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0012_vehicle_registered_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,32 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0013_driver_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qr_value', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='qr_image_job', to='vehicles.vehicle')),
+            ],
+            options={
+                'verbose_name': 'QR Image Job',
+                'verbose_name_plural': 'QR Image Jobs',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='qrjob_status_run_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    """Start each wallet's ledger with its current balance, checkpointed."""
+    Wallet = apps.get_model('vehicles', 'Wallet')
+    WalletLedgerEntry = apps.get_model('vehicles', 'WalletLedgerEntry')
+    WalletCheckpoint = apps.get_model('vehicles', 'WalletCheckpoint')
+    now = django.utils.timezone.now()
+    wallets = Wallet.objects.exclude(balance=0).values_list('pk', 'balance')
+    entries = WalletLedgerEntry.objects.bulk_create(
+        [
+            WalletLedgerEntry(
+                wallet_id=pk,
+                entry_type='credit' if balance > 0 else 'debit',
+                source='opening',
+                amount=abs(balance),
+                balance_after=balance,
+                created_at=now,
+            )
+            for pk, balance in wallets.iterator()
+        ],
+        batch_size=500,
+    )
+    # Primary keys come back from bulk_create on PostgreSQL and SQLite
+    WalletCheckpoint.objects.bulk_create(
+        [WalletCheckpoint(wallet_id=entry.wallet_id, last_entry_id=entry.pk, balance=entry.balance_after)
+         for entry in entries],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0014_qrimagejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=6)),
+                ('source', models.CharField(choices=[('opening', 'Opening balance'), ('deposit', 'Deposit'), ('entry_fee', 'Terminal entry fee'), ('adjustment', 'Adjustment')], max_length=12)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='vehicles.wallet')),
+            ],
+            options={
+                'verbose_name': 'Wallet Ledger Entry',
+                'verbose_name_plural': 'Wallet Ledger Entries',
+                'indexes': [models.Index(fields=['wallet', 'created_at', 'id'], name='ledger_wallet_created_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('source__in', ['deposit', 'entry_fee'])), fields=('source', 'reference'), name='ledger_unique_source_reference')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WalletCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='vehicles.walletledgerentry')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='vehicles.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', '-last_entry'], name='checkpoint_wallet_entry_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,17 @@
 import re
 import uuid
-import qrcode
-from io import BytesIO
 
-from django.core.files import File
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.db.models import F
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.urls import reverse
 from django.utils import timezone
 
+from . import qr_images, search
+from .qr_cache import normalize_qr_value, qr_cache
+
 
 # ======================================================
 # ROUTE MODEL
@@ -127,6 +128,12 @@ class Vehicle(models.Model):
     date_registered = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # registered vehicles list (keyset pagination order)
+            models.Index(fields=['-date_registered', '-id'], name='vehicle_registered_idx'),
+        ]
+
     # --------------------------------------------------
     # INTERNATIONAL VALIDATION
     # --------------------------------------------------
@@ -177,22 +184,28 @@ class Vehicle(models.Model):
     # --------------------------------------------------
     def save(self, *args, **kwargs):
         creating = self.pk is None
+        # QR values are stored canonical so scans can be matched exactly
+        self.qr_value = normalize_qr_value(self.qr_value) or None
         super().save(*args, **kwargs)
 
-        expected_qr_value = f"VEH-{self.id}-{self.license_plate}".replace(" ", "-").upper()
+        expected_qr_value = normalize_qr_value(f"VEH-{self.id}-{self.license_plate}")
         if creating or self.qr_value != expected_qr_value:
             self.qr_value = expected_qr_value
-            qr_image = qrcode.make(self.qr_value)
-
-            buffer = BytesIO()
-            qr_image.save(buffer, format='PNG')
-
-            self.qr_code.save(
-                f"vehicle_{self.id}_qr.png",
-                File(buffer),
-                save=False
-            )
+            # The stored image encodes the old value.  Rendering and uploading the
+            # new one is a background job (vehicles/qr_images.py); until it is done
+            # the image is served on demand from qr_value (see qr_image_url).
+            self.qr_code = None
             super().save(update_fields=['qr_code', 'qr_value'])
+            qr_images.enqueue(self)
+
+    @property
+    def qr_image_url(self):
+        """Stored QR image if uploaded yet, else the on-demand rendering of qr_value."""
+        if self.qr_code:
+            return self.qr_code.url
+        if self.qr_value:
+            return reverse('vehicles:qr_image', args=[self.qr_value])
+        return None
 
     def __str__(self):
         route_display = str(self.route) if self.route else "No Route"
@@ -231,6 +244,12 @@ class Deposit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='deposit_created_idx'),
+            models.Index(fields=['wallet', '-created_at'], name='deposit_wallet_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         is_new = self.pk is None
 
@@ -245,11 +264,94 @@ class Deposit(models.Model):
                     balance=F('balance') + self.amount
                 )
                 self.wallet.refresh_from_db()
+                # Imported here: vehicles.ledger imports this module
+                from .ledger import record
+                record(self.wallet.pk, self.amount, self.wallet.balance,
+                       WalletLedgerEntry.SOURCE_DEPOSIT, self.reference_number)
 
     def __str__(self):
         return f"Deposit {self.reference_number} – {self.amount}"
 
 
+# ======================================================
+# WALLET LEDGER MODELS
+# ======================================================
+class WalletLedgerEntry(models.Model):
+    """One change of a wallet's balance, written with it (see vehicles/ledger.py). Never updated or deleted."""
+    TYPE_CREDIT = 'credit'
+    TYPE_DEBIT = 'debit'
+    TYPE_CHOICES = [
+        (TYPE_CREDIT, 'Credit'),
+        (TYPE_DEBIT, 'Debit'),
+    ]
+
+    SOURCE_OPENING = 'opening'
+    SOURCE_DEPOSIT = 'deposit'
+    SOURCE_ENTRY_FEE = 'entry_fee'
+    SOURCE_ADJUSTMENT = 'adjustment'
+    SOURCE_CHOICES = [
+        (SOURCE_OPENING, 'Opening balance'),
+        (SOURCE_DEPOSIT, 'Deposit'),
+        (SOURCE_ENTRY_FEE, 'Terminal entry fee'),
+        (SOURCE_ADJUSTMENT, 'Adjustment'),
+    ]
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='ledger_entries')
+    entry_type = models.CharField(max_length=6, choices=TYPE_CHOICES)
+    source = models.CharField(max_length=12, choices=SOURCE_CHOICES)
+    # Deposit reference number, EntryLog id, or who made the adjustment
+    reference = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Wallet Ledger Entry"
+        verbose_name_plural = "Wallet Ledger Entries"
+        indexes = [
+            models.Index(fields=['wallet', 'created_at', 'id'], name='ledger_wallet_created_idx'),
+        ]
+        constraints = [
+            # A deposit or an entry fee is never booked twice
+            models.UniqueConstraint(
+                fields=['source', 'reference'],
+                condition=models.Q(source__in=['deposit', 'entry_fee']),
+                name='ledger_unique_source_reference',
+            ),
+        ]
+
+    @property
+    def signed_amount(self):
+        return self.amount if self.entry_type == self.TYPE_CREDIT else -self.amount
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Wallet ledger entries can't be changed; record an adjustment instead.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Wallet ledger entries can't be deleted; record an adjustment instead.")
+
+    def __str__(self):
+        return f"{self.get_entry_type_display()} {self.amount} ({self.get_source_display()}) – {self.balance_after}"
+
+
+class WalletCheckpoint(models.Model):
+    """A wallet's balance as of one ledger entry, so verification only sums the entries after it."""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='checkpoints')
+    last_entry = models.ForeignKey(WalletLedgerEntry, on_delete=models.CASCADE, related_name='+')
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', '-last_entry'], name='checkpoint_wallet_entry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Checkpoint of wallet {self.wallet_id} at entry {self.last_entry_id} – {self.balance}"
+
+
 # ======================================================
 # QUEUE HISTORY MODEL
 # ======================================================
@@ -269,11 +371,75 @@ class QueueHistory(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['-timestamp'], name='queuehistory_ts_idx'),
+            models.Index(fields=['vehicle', '-timestamp'], name='queuehistory_vehicle_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.vehicle} – {self.get_action_display()} @ {self.timestamp}"
 
 
+# ======================================================
+# QR IMAGE JOB MODEL
+# ======================================================
+class QRImageJob(models.Model):
+    """Pending render + upload of a vehicle's QR image, run by vehicles/qr_images.py."""
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, related_name='qr_image_job')
+    qr_value = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not picked up before this time (retry backoff, or the lease of a running attempt)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "QR Image Job"
+        verbose_name_plural = "QR Image Jobs"
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='qrjob_status_run_idx'),
+        ]
+
+    def __str__(self):
+        return f"QR image for {self.qr_value} ({self.status})"
+
+
+# ======================================================
+# BACKGROUND JOB STATE
+# ======================================================
+class JobState(models.Model):
+    """
+    State of a background job (license OCR scan, wallet reconciliation),
+    kept in the database so every web worker can answer its polls; see
+    vehicles/jobs.py.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    state = models.JSONField(default=dict)
+    expires_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Job State"
+        verbose_name_plural = "Job States"
+        indexes = [
+            models.Index(fields=['expires_at'], name='jobstate_expires_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
 # ======================================================
 # SIGNALS
 # ======================================================
@@ -282,4 +448,21 @@ def create_wallet_for_vehicle(sender, instance, created, **kwargs):
     if created:
         Wallet.objects.create(vehicle=instance)
     else:
-        Wallet.objects.get_or_create(vehicle=instance)
\ No newline at end of file
+        Wallet.objects.get_or_create(vehicle=instance)
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_qr_cache(sender, instance, **kwargs):
+    qr_cache.invalidate(vehicle_id=instance.pk, qr_value=instance.qr_value)
+
+
+@receiver(post_save, sender=Driver)
+@receiver(post_delete, sender=Driver)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def refresh_search_index(sender, instance, **kwargs):
+    # Only matters where vehicles.search keeps its in-memory index (not PostgreSQL)
+    pk = instance.pk
+    changed = search.driver_changed if sender is Driver else search.vehicle_changed
+    transaction.on_commit(lambda: changed(pk))
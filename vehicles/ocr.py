@@ -0,0 +1,496 @@
+# vehicles/ocr.py
+"""
+Driver's license OCR, kept off the request threads.  This module pulls in
+OpenCV, NumPy and pytesseract, so the views import it on first use only:
+web workers and manage.py commands that never scan don't load the OCR stack.
+
+ocr_process only decodes the upload and submit()s it; the OpenCV
+preprocessing and tesseract run in a pool of OCR_WORKERS processes, and the
+client polls vehicles:ocr_result with the returned job id.  The backlog is
+bounded: with OCR_MAX_PENDING jobs queued or running in this process,
+submit() raises OCRBusy instead of queueing more, so a burst of scans can't
+pile up behind tesseract and hold gunicorn threads the gate endpoints need.
+
+Every job has a deadline OCR_TIMEOUT_SECONDS after submission: a job still
+queued at its deadline is dropped unprocessed, tesseract gets only the time
+left (pytesseract kills it when it runs over), and a job whose result hasn't
+arrived by then is reported as timed out.  Job states are stored in the
+database (vehicles/jobs.py) for OCR_RESULT_TTL_SECONDS, so a poll can reach
+any web worker, not only the one running the scan.
+
+A scan is scaled to a fixed width, deskewed and cropped to the card; the
+text blocks inside each field's region of the LTO license layout are then
+read separately (dates and the license number with a character whitelist),
+so each field comes from its own spot on the card with its own confidence.
+Cards that don't match the layout fall back to reading the whole card.
+
+Results are cached by a perceptual hash of the frame (vehicles/ocr_cache.py),
+so resubmitting the same frame while adjusting the card costs no OCR.
+"""
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+import pytesseract
+from django.conf import settings
+from django.db import connection
+
+from .ocr_cache import image_hash, ocr_cache
+
+logger = logging.getLogger(__name__)
+
+# Where the Windows installer puts tesseract (used when it isn't on PATH)
+WINDOWS_TESSERACT = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+# OCR processes per web process
+WORKERS = getattr(settings, "OCR_WORKERS", 2)
+
+# Jobs queued or running per web process before new scans are refused
+MAX_PENDING = getattr(settings, "OCR_MAX_PENDING", 8)
+
+# Seconds from submission until a job is given up on
+TIMEOUT_SECONDS = getattr(settings, "OCR_TIMEOUT_SECONDS", 20)
+
+# Seconds a finished job's result can still be fetched
+RESULT_TTL_SECONDS = getattr(settings, "OCR_RESULT_TTL_SECONDS", 300)
+
+STATUS_PENDING = "pending"
+STATUS_SUCCESS = "success"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+
+
+class OCRBusy(Exception):
+    """The OCR backlog is full; the client should retry shortly."""
+
+
+def tesseract_cmd():
+    """The tesseract binary: settings.TESSERACT_CMD, else `tesseract` on PATH, else the Windows default."""
+    configured = getattr(settings, "TESSERACT_CMD", "")
+    if configured:
+        return configured
+    found = shutil.which("tesseract")
+    if found:
+        return found
+    if os.path.exists(WINDOWS_TESSERACT):
+        return WINDOWS_TESSERACT
+    return "tesseract"
+
+
+pytesseract.pytesseract.tesseract_cmd = tesseract_cmd()
+
+
+# -------------------------
+# PREPROCESSING (runs in the pool processes)
+# -------------------------
+# Width cards are scaled to before detection and OCR: license text then
+# stands ~20-30 px tall, which tesseract reads well, whatever the camera
+TARGET_WIDTH = 1000
+
+# Where each field sits on a Philippine (LTO) driver's license, as fractions
+# of the card: (left, top, right, bottom).  Text blocks belong to the field
+# whose region holds their centre.
+FIELD_REGIONS = {
+    "name": (0.26, 0.24, 1.00, 0.40),
+    "birth_date": (0.48, 0.40, 0.78, 0.54),
+    "license_number": (0.26, 0.62, 0.52, 0.78),
+    "license_expiry": (0.52, 0.62, 0.80, 0.78),
+}
+
+# Pixels kept around a field's text blocks
+FIELD_PADDING = 6
+
+LICENSE_FIELDS = ("license_number", "last_name", "first_name", "middle_name", "birth_date", "license_expiry")
+
+LICENSE_NUMBER_RE = re.compile(r"[A-Z]{1,2}\d{2,3}-\d{2}-\d{6,7}|[A-Z]{3}-?\d{6,7}")
+DATE_RE = re.compile(r"(\d{4})[/-](\d{2})[/-](\d{2})")
+NAME_RE = re.compile(r"([A-ZÑ][A-ZÑ .'-]*?)\s*,\s*([A-ZÑ][A-ZÑ .'-]*)")
+
+
+def to_gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def normalize_size(gray, width=TARGET_WIDTH):
+    """Scale to `width` pixels wide (area averaging when shrinking, cubic when enlarging)."""
+    scale = width / gray.shape[1]
+    if abs(scale - 1) < 0.01:
+        return gray
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
+
+
+def text_mask(gray):
+    """Dark strokes on the lighter card: black-hat then Otsu, so uneven lighting doesn't matter."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+    blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel)
+    _, mask = cv2.threshold(blackhat, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return mask
+
+
+def skew_angle(mask, max_angle=10.0, step=0.5, sample=20000):
+    """
+    Degrees to rotate the image by so its text lines are level: the angle
+    whose row projection of the text pixels is sharpest, every candidate
+    angle scored at once on a sample of the pixels.
+    """
+    ys, xs = np.nonzero(mask)
+    if xs.size < 200:
+        return 0.0
+    if xs.size > sample:
+        pick = np.random.default_rng(0).choice(xs.size, sample, replace=False)
+        xs, ys = xs[pick], ys[pick]
+    angles = np.deg2rad(np.arange(-max_angle, max_angle + step / 2, step))
+    rows = np.rint(ys * np.cos(angles)[:, None] + xs * np.sin(angles)[:, None]).astype(np.int64)
+    rows -= rows.min(axis=1, keepdims=True)
+    bins = int(rows.max()) + 1
+    offsets = np.arange(len(angles))[:, None] * bins
+    hist = np.bincount((rows + offsets).ravel(), minlength=bins * len(angles)).reshape(len(angles), bins)
+    return float(np.rad2deg(angles[np.argmax((hist.astype(np.float64) ** 2).sum(axis=1))]))
+
+
+def rotate(gray, angle):
+    if abs(angle) < 0.25:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def crop_card(gray):
+    """The card when it stands out from the background, else the whole image."""
+    edges = cv2.dilate(cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150), np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return gray
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    # A license is 85.6 x 54 mm (1.59:1)
+    if w * h < 0.3 * gray.size or not 1.3 <= w / h <= 1.9:
+        return gray
+    return gray[y:y + h, x:x + w]
+
+
+def preprocess(img):
+    """Grayscale card, deskewed, cropped to the card and scaled to TARGET_WIDTH."""
+    gray = normalize_size(to_gray(img))
+    gray = rotate(gray, skew_angle(text_mask(gray)))
+    return normalize_size(crop_card(gray))
+
+
+def binarize(gray):
+    """Black text on white for tesseract (Otsu per region, after light denoising)."""
+    _, thresh = cv2.threshold(cv2.GaussianBlur(gray, (3, 3), 0), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return thresh
+
+
+def text_blocks(gray):
+    """(x, y, w, h) rows of the card's words / text runs: strokes merged horizontally."""
+    joined = cv2.morphologyEx(text_mask(gray), cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (17, 3)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(joined)
+    boxes = stats[1:, :4]
+    keep = (boxes[:, 3] >= 8) & (boxes[:, 3] <= 0.12 * gray.shape[0]) & (boxes[:, 2] >= 10)
+    return boxes[keep]
+
+
+def field_crops(gray, blocks):
+    """{field: binarized crop} around the text blocks in each field's region (the whole region if none)."""
+    height, width = gray.shape
+    centre_x = (blocks[:, 0] + blocks[:, 2] / 2) / width
+    centre_y = (blocks[:, 1] + blocks[:, 3] / 2) / height
+    crops = {}
+    for field, (left, top, right, bottom) in FIELD_REGIONS.items():
+        inside = blocks[(centre_x >= left) & (centre_x < right) & (centre_y >= top) & (centre_y < bottom)]
+        if len(inside):
+            x0, y0 = inside[:, :2].min(axis=0) - FIELD_PADDING
+            x1, y1 = (inside[:, :2] + inside[:, 2:]).max(axis=0) + FIELD_PADDING
+        else:
+            x0, y0, x1, y1 = int(left * width), int(top * height), int(right * width), int(bottom * height)
+        crops[field] = binarize(gray[max(y0, 0):y1, max(x0, 0):x1])
+    return crops
+
+
+# -------------------------
+# TEXT RECOGNITION (runs in the pool processes)
+# -------------------------
+def _ocr_lines(image, config, deadline):
+    """[(text, confidence 0-100)] for each line tesseract reads in `image`."""
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise TimeoutError("The scan ran out of time during text recognition.")
+    try:
+        data = pytesseract.image_to_data(image, config=config, timeout=remaining,
+                                         output_type=pytesseract.Output.DICT)
+    except RuntimeError as exc:
+        # pytesseract signals its own timeout as RuntimeError
+        if "timeout" in str(exc).lower():
+            raise TimeoutError("Text recognition took too long.")
+        raise
+    lines = {}
+    for text, conf, block, par, line in zip(
+        data["text"], data["conf"], data["block_num"], data["par_num"], data["line_num"]
+    ):
+        if text.strip() and float(conf) >= 0:
+            lines.setdefault((block, par, line), []).append((text.strip(), float(conf)))
+    return [(" ".join(w for w, _ in words), sum(c for _, c in words) / len(words)) for words in lines.values()]
+
+
+def _clean(text):
+    return re.sub(r"[^\w\s,:/.'-]|_", " ", text).upper()
+
+
+def parse_license_number(text):
+    match = LICENSE_NUMBER_RE.search(_clean(text))
+    return {"license_number": match.group(0)} if match else None
+
+
+def parse_date(text):
+    match = DATE_RE.search(_clean(text))
+    return "/".join(match.groups()) if match else None
+
+
+def parse_name(text):
+    """{last_name, first_name, middle_name} from "DELA CRUZ, JUAN SANTOS" (last word after the comma is the middle name)."""
+    text = _clean(text)
+    match = NAME_RE.search(text)
+    if not match or "NAME" in text:     # the printed "Last Name, First Name, Middle Name" label
+        return None
+    given = match.group(2).split()
+    if not given:
+        return None
+    first, middle = (given[:-1], given[-1]) if len(given) > 1 else (given, "")
+    return {
+        "last_name": " ".join(match.group(1).split()).title(),
+        "first_name": " ".join(first).title(),
+        "middle_name": middle.title(),
+    }
+
+
+def parse_birth_date(text):
+    date = parse_date(text)
+    return {"birth_date": date} if date else None
+
+
+def parse_expiry(text):
+    date = parse_date(text)
+    return {"license_expiry": date} if date else None
+
+
+_DATE_CHARS = "--psm 6 -c tessedit_char_whitelist=0123456789/-"
+
+# field: (tesseract options, parser of one line -> {output field: value} or None)
+FIELD_READERS = {
+    "name": ("--psm 6", parse_name),
+    "birth_date": (_DATE_CHARS, parse_birth_date),
+    "license_number": ("--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-",
+                       parse_license_number),
+    "license_expiry": (_DATE_CHARS, parse_expiry),
+}
+
+
+def _empty_result():
+    return {**dict.fromkeys(LICENSE_FIELDS, ""), "confidence": dict.fromkeys(LICENSE_FIELDS, 0)}
+
+
+def read_fields(card, deadline):
+    """License fields read region by region from a preprocess()ed card, with per-field confidences."""
+    result = _empty_result()
+    for field, crop in field_crops(card, text_blocks(card)).items():
+        config, parse = FIELD_READERS[field]
+        best = None
+        for text, conf in _ocr_lines(crop, config, deadline):
+            values = parse(text)
+            if values and (best is None or conf > best[1]):
+                best = (values, conf)
+        if best:
+            values, conf = best
+            result.update(values)
+            result["confidence"].update(dict.fromkeys(values, round(conf)))
+    return result
+
+
+def parse_license_text(lines):
+    """
+    License fields found anywhere in a whole card's [(text, confidence)] lines,
+    for cards whose layout read_fields() doesn't recognise.  The earliest date
+    is taken as the birth date and the latest as the expiry.
+    """
+    result = _empty_result()
+    dates = []
+    for text, conf in lines:
+        for parse in (parse_license_number, parse_name):
+            values = parse(text)
+            if values and not result[next(iter(values))]:
+                result.update(values)
+                result["confidence"].update(dict.fromkeys(values, round(conf)))
+        dates += [("/".join(match.groups()), conf) for match in DATE_RE.finditer(_clean(text))]
+    if dates:
+        dates.sort()
+        result["birth_date"], result["confidence"]["birth_date"] = dates[0][0], round(dates[0][1])
+        if len(dates) > 1 and dates[-1][0] != dates[0][0]:
+            result["license_expiry"], result["confidence"]["license_expiry"] = dates[-1][0], round(dates[-1][1])
+    return result
+
+
+def scan_license(image_bytes, deadline):
+    """Decode, preprocess and OCR one license image; raises TimeoutError past `deadline` (epoch seconds)."""
+    if time.time() >= deadline:
+        raise TimeoutError("The scan waited too long in the OCR queue.")
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("The image could not be decoded.")
+
+    card = preprocess(img)
+    result = read_fields(card, deadline)
+    if not any(result[field] for field in LICENSE_FIELDS):
+        # Not the expected layout (e.g. an older card design): read the whole card
+        result = parse_license_text(_ocr_lines(binarize(card), "--psm 6", deadline))
+    return result
+
+
+def _scan_in_worker(image_bytes, deadline):
+    # Library exceptions (e.g. pytesseract's) don't always survive pickling back
+    # to the web process, and one that doesn't breaks the whole pool
+    started = time.monotonic()
+    try:
+        return scan_license(image_bytes, deadline), time.monotonic() - started
+    except (TimeoutError, ValueError):
+        raise
+    except Exception as exc:
+        raise RuntimeError(str(exc) or type(exc).__name__) from None
+
+
+# -------------------------
+# WEB SIDE
+# -------------------------
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs request and worker threads isn't safe
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _key(job_id):
+    return f"ocr:job:{job_id}"
+
+
+def _store(job_id, state):
+    # Imported here: the OCR processes load this module without the app registry
+    from . import jobs
+    jobs.put(_key(job_id), state, RESULT_TTL_SECONDS)
+
+
+def submit(image_bytes, owner_id=None):
+    """
+    Queue a license image for OCR and return its job id; raises OCRBusy when
+    the backlog is full.  A frame seen before (vehicles/ocr_cache.py) gets a
+    job that has already succeeded.
+    """
+    job_id = uuid.uuid4().hex
+    deadline = time.time() + TIMEOUT_SECONDS
+    state = {"status": STATUS_PENDING, "owner": owner_id, "deadline": deadline}
+
+    image_key = image_hash(image_bytes)
+    cached = ocr_cache.get(image_key)
+    if cached is not None:
+        _store(job_id, {**state, "status": STATUS_SUCCESS, "result": cached, "cached": True})
+        return job_id
+
+    if not _slots.acquire(blocking=False):
+        raise OCRBusy("License scanning is busy; please try again in a few seconds.")
+    try:
+        _store(job_id, state)
+    except Exception:
+        _slots.release()
+        raise
+
+    pool = _get_pool()
+    try:
+        future = pool.submit(_scan_in_worker, image_bytes, deadline)
+    except BrokenProcessPool:
+        # A worker process died (e.g. killed for memory): start a fresh pool
+        _discard_pool(pool)
+        pool = _get_pool()
+        try:
+            future = pool.submit(_scan_in_worker, image_bytes, deadline)
+        except Exception:
+            _slots.release()
+            raise
+    except Exception:
+        _slots.release()
+        raise
+
+    def done(fut):
+        _slots.release()
+        try:
+            _finish(fut)
+        except Exception:
+            logger.exception("Could not store the result of OCR job %s", job_id)
+        finally:
+            # Usually runs on the pool's result thread, whose connection would
+            # otherwise stay open; outside a transaction, closing is always safe
+            if not connection.in_atomic_block:
+                connection.close()
+
+    def _finish(fut):
+        if fut.cancelled():
+            _store(job_id, {**state, "status": STATUS_ERROR, "message": "The scan was cancelled; please scan again."})
+            return
+        try:
+            result, seconds = fut.result()
+        except TimeoutError as exc:
+            finished = {"status": STATUS_TIMEOUT, "message": str(exc)}
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            finished = {"status": STATUS_ERROR, "message": "The OCR worker stopped; please scan again."}
+        except Exception as exc:
+            logger.warning("OCR job %s failed: %r", job_id, exc)
+            finished = {"status": STATUS_ERROR, "message": str(exc)}
+        else:
+            finished = {"status": STATUS_SUCCESS, "result": result}
+            ocr_cache.put(image_key, result, seconds)
+        _store(job_id, {**state, **finished})
+
+    future.add_done_callback(done)
+    return job_id
+
+
+def job_state(job_id, owner_id=None):
+    """
+    {"status": pending|success|error|timeout, ...} for a job, or None when it
+    is unknown, expired or belongs to another user.
+    """
+    from . import jobs
+    state = jobs.get(_key(job_id))
+    if state is None or state.get("owner") != owner_id:
+        return None
+    state = dict(state)
+    if state["status"] == STATUS_PENDING and time.time() > state["deadline"] + 1:
+        state.update(status=STATUS_TIMEOUT, message="License scanning took too long; please scan again.")
+    state.pop("owner", None)
+    state.pop("deadline", None)
+    return state
+
@@ -0,0 +1,188 @@
+# vehicles/ocr_cache.py
+"""
+Per-process LRU cache of license OCR results, keyed by a perceptual hash of
+the scanned image, so resubmitting the same (or a nearly identical) camera
+frame returns the earlier result without running tesseract again.
+
+The hash is a difference hash with a noise margin: the frame is decoded at
+reduced size in grayscale, shrunk to a 33x20 grid and contrast-normalized,
+and each pair of neighbouring cells in a row gives one bit (which is
+brighter) plus whether the difference is large enough to trust.  Two frames
+are the same when no more than OCR_CACHE_TOLERANCE_PERCENT of the bits both
+trust differ: camera noise and a little hand movement stay well under that,
+while another card (another photo, another name) differs far more.  With
+OCR_CACHE_PATH set, entries are also written to that JSON file and loaded
+from it on first use, so they survive restarts.
+
+hits / misses and the OCR time spent on misses show what the cache
+saves (stats(), shown by vehicles:ocr_stats).
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of results kept (least recently used are evicted first)
+MAX_SIZE = getattr(settings, "OCR_CACHE_SIZE", 256)
+
+# Share of the compared hash bits (percent) that may differ between two frames of the same card
+TOLERANCE_PERCENT = getattr(settings, "OCR_CACHE_TOLERANCE_PERCENT", 5)
+
+# JSON file the cache is persisted to ("" keeps it in memory only)
+PATH = getattr(settings, "OCR_CACHE_PATH", "")
+
+HASH_WIDTH, HASH_HEIGHT = 32, 20
+
+# Cell difference (in units of the frame's standard deviation) a bit needs to be trusted
+HASH_MARGIN = 0.25
+
+# Fewer trusted bits in common than this and two frames are never "the same" (e.g. blank frames)
+MIN_COMPARED_BITS = 32
+
+
+def _to_int(flags):
+    return int.from_bytes(np.packbits(flags.ravel()).tobytes(), "big")
+
+
+def image_hash(image_bytes):
+    """(bits, trusted bits) of an encoded image as two ints, or None if it can't be decoded."""
+    gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None or gray.size == 0:
+        return None
+    small = cv2.resize(gray, (HASH_WIDTH + 1, HASH_HEIGHT), interpolation=cv2.INTER_AREA).astype(np.float32)
+    small = (small - small.mean()) / (small.std() + 1e-6)
+    diff = small[:, 1:] - small[:, :-1]
+    return _to_int(diff > 0), _to_int(np.abs(diff) > HASH_MARGIN)
+
+
+def same_frame(a, b, tolerance_percent=TOLERANCE_PERCENT):
+    """True when two image_hash()es are within tolerance of each other on the bits both trust."""
+    trusted = a[1] & b[1]
+    compared = trusted.bit_count()
+    if compared < MIN_COMPARED_BITS:
+        return False
+    return ((a[0] ^ b[0]) & trusted).bit_count() * 100 <= tolerance_percent * compared
+
+
+class OCRResultCache:
+    def __init__(self, max_size=MAX_SIZE, tolerance_percent=TOLERANCE_PERCENT, path=PATH):
+        self.max_size = max_size
+        self.tolerance_percent = tolerance_percent
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (bits, trusted bits) -> result dict
+        self._loaded = not path
+        self.hits = 0
+        self.misses = 0
+        self.ocr_runs = 0
+        self.ocr_seconds = 0.0
+
+    def _find(self, key):
+        if key in self._entries:
+            return key
+        if self.tolerance_percent:
+            # Most recently used first: the frame being adjusted is usually the last one
+            for other in reversed(self._entries):
+                if same_frame(key, other, self.tolerance_percent):
+                    return other
+        return None
+
+    def get(self, key):
+        """The cached result for an image hash (or one of the same frame), else None."""
+        if key is None:
+            return None
+        with self._lock:
+            self._load()
+            found = self._find(key)
+            if found is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(found)
+            self.hits += 1
+            return self._entries[found]
+
+    def put(self, key, result, seconds=0.0):
+        """Remember a fresh OCR result; `seconds` is the OCR time it took."""
+        if key is None:
+            return
+        with self._lock:
+            self._load()
+            self.ocr_runs += 1
+            self.ocr_seconds += seconds
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            entries = list(self._entries.items())
+        self._save(entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            average = self.ocr_seconds / self.ocr_runs if self.ocr_runs else 0.0
+            return {
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "ocr_runs": self.ocr_runs,
+                "average_ocr_seconds": round(average, 3),
+                "estimated_seconds_saved": round(self.hits * average, 1),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.ocr_runs = 0
+            self.ocr_seconds = 0.0
+            self._loaded = not self.path
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _load(self):
+        # Called with the lock held
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)["entries"]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.warning("Ignoring unreadable OCR cache file %s", self.path)
+            return
+        for (bits, trusted), result in entries[-self.max_size:]:
+            self._entries[int(bits, 16), int(trusted, 16)] = result
+
+    def _save(self, entries):
+        if not self.path:
+            return
+        data = {"entries": [[[format(part, "x") for part in key], result] for key, result in entries]}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            # Written aside then renamed, so a reader never sees half a file
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=".ocr-cache-")
+        except OSError:
+            logger.exception("Could not write the OCR cache file %s", self.path)
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            logger.exception("Could not write the OCR cache file %s", self.path)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+ocr_cache = OCRResultCache()
@@ -0,0 +1,92 @@
+# vehicles/qr_cache.py
+"""
+Per-process LRU cache from a canonical QR value to the few vehicle fields a
+gate scan needs: (vehicle id, license plate, route id).
+
+Entries are dropped when the vehicle is saved or deleted in this process
+(signals in vehicles/models.py).  Saves made by other workers are not seen,
+so every entry also expires after VEHICLE_QR_CACHE_TTL_SECONDS.  Unknown
+QR values are never cached.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+# Maximum number of QR values kept (least recently used are evicted first)
+MAX_SIZE = getattr(settings, "VEHICLE_QR_CACHE_SIZE", 5000)
+
+# Seconds before an entry is re-read from the database
+TTL_SECONDS = getattr(settings, "VEHICLE_QR_CACHE_TTL_SECONDS", 300)
+
+CachedVehicle = namedtuple("CachedVehicle", ["id", "plate", "route_id"])
+
+
+def normalize_qr_value(value):
+    """Canonical form QR values are stored and looked up in: trimmed, upper case, spaces as hyphens."""
+    if value is None:
+        return None
+    return str(value).strip().replace(" ", "-").upper()
+
+
+class QRCache:
+    def __init__(self, max_size=MAX_SIZE, ttl=TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # qr value -> (CachedVehicle, expires_at)
+        self._qr_of = {}                # vehicle id -> qr value
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, qr_value):
+        """Resolve a scanned QR value to a CachedVehicle, or None if no vehicle has it."""
+        qr_value = normalize_qr_value(qr_value)
+        if not qr_value:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(qr_value)
+            if item and item[1] > now:
+                self._entries.move_to_end(qr_value)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+
+        from .models import Vehicle
+
+        row = Vehicle.objects.filter(qr_value=qr_value).values_list("id", "license_plate", "route_id").first()
+        if row is None:
+            self.invalidate(qr_value=qr_value)
+            return None
+        vehicle = CachedVehicle(*row)
+        with self._lock:
+            self._drop(vehicle_id=vehicle.id)
+            self._entries[qr_value] = (vehicle, now + self.ttl)
+            self._qr_of[vehicle.id] = qr_value
+            while len(self._entries) > self.max_size:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._qr_of.pop(evicted.id, None)
+        return vehicle
+
+    def _drop(self, vehicle_id=None, qr_value=None):
+        if vehicle_id is not None:
+            qr_value = self._qr_of.pop(vehicle_id, None) or qr_value
+        if qr_value is not None:
+            item = self._entries.pop(qr_value, None)
+            if item:
+                self._qr_of.pop(item[0].id, None)
+
+    def invalidate(self, vehicle_id=None, qr_value=None):
+        """Forget a vehicle (by id) and/or a QR value."""
+        with self._lock:
+            self._drop(vehicle_id=vehicle_id, qr_value=normalize_qr_value(qr_value))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._qr_of.clear()
+
+
+qr_cache = QRCache()
@@ -0,0 +1,245 @@
+# vehicles/qr_images.py
+"""
+Vehicle QR images, kept off the registration request path.
+
+Vehicle.save() only sets qr_value and enqueues a QRImageJob (bulk imports
+enqueue theirs with enqueue_many()).  A worker renders the PNGs and uploads
+them to media storage (Cloudinary in production) on
+VEHICLE_QR_JOB_CONCURRENCY threads, retrying failed uploads with
+exponential backoff up to VEHICLE_QR_JOB_MAX_ATTEMPTS times.  Until a vehicle's image is stored,
+Vehicle.qr_image_url points at the vehicles:qr_image view, which renders the
+value on demand (render() keeps recent renderings in memory and the response
+is cacheable for a year: the image of a QR value never changes).
+
+The worker runs either in-process (start_worker(), called from rdfs/wsgi.py)
+or as a dedicated loop (`python manage.py run_qr_jobs`).  Jobs are claimed
+with a conditional UPDATE that pushes run_after forward by a lease, so
+several workers never upload the same job at once and a crashed attempt is
+retried once its lease expires.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Attempts before a job is marked failed
+MAX_ATTEMPTS = getattr(settings, "VEHICLE_QR_JOB_MAX_ATTEMPTS", 5)
+
+# Seconds between two polls of the job table when nothing woke the worker
+POLL_SECONDS = getattr(settings, "VEHICLE_QR_JOB_POLL_SECONDS", 30)
+
+# QR renderings kept in memory per process, per format
+RENDER_CACHE_SIZE = getattr(settings, "VEHICLE_QR_IMAGE_CACHE_SIZE", 512)
+
+# Images uploaded at the same time by one worker pass
+CONCURRENCY = getattr(settings, "VEHICLE_QR_JOB_CONCURRENCY", 4)
+
+# Seconds a claimed job is reserved for the worker running it
+LEASE_SECONDS = 300
+
+# Jobs claimed per pass
+BATCH_SIZE = 20
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render(qr_value, fmt="png"):
+    """QR code image of `qr_value` as PNG or SVG bytes."""
+    if fmt == "svg":
+        return qrcode.make(qr_value, image_factory=qrcode.image.svg.SvgPathImage).to_string()
+    buffer = BytesIO()
+    qrcode.make(qr_value).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def enqueue(vehicle):
+    """(Re)schedule the stored image of `vehicle` for its current qr_value."""
+    from .models import QRImageJob
+
+    QRImageJob.objects.update_or_create(
+        vehicle=vehicle,
+        defaults={
+            "qr_value": vehicle.qr_value,
+            "status": QRImageJob.STATUS_PENDING,
+            "attempts": 0,
+            "run_after": timezone.now(),
+            "last_error": "",
+        },
+    )
+    transaction.on_commit(wake_worker)
+
+
+def enqueue_many(vehicles):
+    """Queue the images of newly created vehicles (which have no job yet) in one INSERT."""
+    from .models import QRImageJob
+
+    now = timezone.now()
+    QRImageJob.objects.bulk_create(
+        [QRImageJob(vehicle_id=vehicle.pk, qr_value=vehicle.qr_value, run_after=now) for vehicle in vehicles],
+        batch_size=500,
+    )
+    transaction.on_commit(wake_worker)
+
+
+def enqueue_missing():
+    """Enqueue every vehicle that has a qr_value but no stored image or job. Returns the count."""
+    from .models import Vehicle
+
+    vehicles = Vehicle.objects.filter(qr_value__isnull=False, qr_image_job__isnull=True).filter(
+        Q(qr_code__isnull=True) | Q(qr_code="")
+    )
+    count = 0
+    for vehicle in vehicles.only("pk", "qr_value").iterator(chunk_size=500):
+        enqueue(vehicle)
+        count += 1
+    return count
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(30 * 2 ** (attempts - 1), 3600))
+
+
+def _claim(job, now):
+    """Take the job's lease; False if another worker (or a re-enqueue) got there first."""
+    from .models import QRImageJob
+
+    return QRImageJob.objects.filter(
+        pk=job.pk, status=QRImageJob.STATUS_PENDING, run_after=job.run_after, qr_value=job.qr_value
+    ).update(run_after=now + timedelta(seconds=LEASE_SECONDS), attempts=F("attempts") + 1) == 1
+
+
+def upload(job):
+    """Render a claimed job's image and store it; returns the storage name.  No database access."""
+    from .models import Vehicle
+
+    field = Vehicle._meta.get_field("qr_code")
+    return field.storage.save(
+        field.generate_filename(Vehicle(pk=job.vehicle_id), f"vehicle_{job.vehicle_id}_qr.png"),
+        ContentFile(render(job.qr_value)),
+    )
+
+
+def attach(job, name):
+    """Point the vehicle at its uploaded image, unless its qr_value changed meanwhile."""
+    from .models import Vehicle
+
+    if not Vehicle.objects.filter(pk=job.vehicle_id, qr_value=job.qr_value).update(qr_code=name):
+        # A newer job owns the vehicle's image now
+        Vehicle._meta.get_field("qr_code").storage.delete(name)
+
+
+def _upload_or_error(job):
+    try:
+        return upload(job), None
+    except Exception as exc:
+        return None, exc
+
+
+def process_pending(now=None, limit=BATCH_SIZE, concurrency=CONCURRENCY):
+    """
+    Run the jobs that are due: claim them, upload their images on
+    `concurrency` threads, then record the outcomes.
+    Returns {"done": n, "retried": n, "failed": n}.
+    """
+    from .models import QRImageJob
+
+    now = now or timezone.now()
+    counts = {"done": 0, "retried": 0, "failed": 0}
+    due = QRImageJob.objects.filter(status=QRImageJob.STATUS_PENDING, run_after__lte=now).order_by("run_after")
+    claimed = [job for job in due[:limit] if _claim(job, now)]
+    if not claimed:
+        return counts
+
+    # Uploads are network-bound: run them side by side, keep the database work here
+    if concurrency > 1 and len(claimed) > 1:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(claimed))) as pool:
+            outcomes = list(pool.map(_upload_or_error, claimed))
+    else:
+        outcomes = [_upload_or_error(job) for job in claimed]
+
+    for job, (name, error) in zip(claimed, outcomes):
+        attempts = job.attempts + 1
+        current = QRImageJob.objects.filter(pk=job.pk, qr_value=job.qr_value, attempts=attempts)
+        if error is None:
+            try:
+                attach(job, name)
+            except Exception as exc:
+                error = exc
+        if error is None:
+            current.update(status=QRImageJob.STATUS_DONE, last_error="", updated_at=timezone.now())
+            counts["done"] += 1
+            continue
+        logger.warning("QR image job for vehicle %s failed (attempt %s): %s", job.vehicle_id, attempts, error)
+        if attempts >= MAX_ATTEMPTS:
+            current.update(status=QRImageJob.STATUS_FAILED, last_error=repr(error), updated_at=timezone.now())
+            counts["failed"] += 1
+        else:
+            current.update(run_after=timezone.now() + _backoff(attempts), last_error=repr(error),
+                           updated_at=timezone.now())
+            counts["retried"] += 1
+    return counts
+
+
+class QRJobWorker(threading.Thread):
+    """Daemon thread running due QR image jobs; wake() makes it look right away."""
+
+    def __init__(self, interval=POLL_SECONDS):
+        super().__init__(name="rdfs-qr-images", daemon=True)
+        self.interval = interval
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            close_old_connections()
+            try:
+                while sum(process_pending().values()) >= BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("QR image job pass failed")
+            finally:
+                close_old_connections()
+            self._wake_event.wait(self.interval)
+        connection.close()
+
+    def wake(self):
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker():
+    """Start the in-process worker once per process (if enabled in settings)."""
+    global _worker
+    if not getattr(settings, "VEHICLE_QR_JOB_WORKER", True):
+        return None
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = QRJobWorker()
+            _worker.start()
+    return _worker
+
+
+def wake_worker():
+    if _worker is not None:
+        _worker.wake()
@@ -0,0 +1,243 @@
+# vehicles/reconcile.py
+"""
+Wallet reconciliation: every Wallet.balance checked against what its ledger
+(vehicles/ledger.py) says it should be, i.e. the latest checkpoint plus the
+deposits, entry fees and adjustments booked after it.  The ledger is used
+rather than Deposit and EntryLog because entry logs are archived and the
+ledger keeps every change, including admin corrections.
+
+Wallets are streamed in id order in chunks of WALLET_RECONCILE_CHUNK_SIZE
+(a server-side cursor on PostgreSQL), and each chunk costs three grouped
+queries whatever its size: the latest checkpoints, and the entries after
+them summed per wallet and source.  Those queries don't see the balances
+at the same instant as the wallet query, so a wallet that looks off is
+checked again with its row locked (writers hold that lock until the
+balance and its ledger entry are committed together); only wallets still
+off are reported as discrepancies (write_csv()).
+
+It runs from `python manage.py reconcile_wallets`, or as a background job
+started by an admin (start_job(), vehicles:wallet_reconciliation) whose
+progress and report are kept in the database (vehicles/jobs.py), so any
+web worker can answer for it.
+"""
+import csv
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import jobs, ledger
+from .models import Wallet, WalletLedgerEntry
+
+logger = logging.getLogger(__name__)
+
+# Wallets per chunk (one round of grouped queries)
+CHUNK_SIZE = getattr(settings, "WALLET_RECONCILE_CHUNK_SIZE", 2000)
+
+# Discrepancies kept in a background job's report
+JOB_MAX_ROWS = 1000
+
+# How long a finished job's report stays readable
+JOB_TTL_SECONDS = 24 * 3600
+
+# The running job renews its lock after every chunk; a lock left by a
+# worker that died expires after this, and the job then reads as failed
+JOB_LOCK_SECONDS = 600
+
+JOB_KEY = "wallet-reconcile:job"
+JOB_LOCK_KEY = "wallet-reconcile:running"
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+REPORT_COLUMNS = (
+    "wallet_id", "license_plate", "wallet_balance", "expected_balance", "difference",
+    "checkpoint_entry_id", "entries_summed", "deposits", "entry_fees", "adjustments",
+)
+
+
+class ReconcileResult:
+    def __init__(self, total):
+        self.total = total
+        self.checked = 0
+        self.discrepancies = []     # dicts with REPORT_COLUMNS keys
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not self.discrepancies
+
+
+# -------------------------
+# RECONCILIATION
+# -------------------------
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _check_chunk(wallets):
+    """Discrepancy rows for one chunk of (id, balance, plate) wallets."""
+    ids = [pk for pk, _, _ in wallets]
+    checkpoints = ledger.latest_checkpoints(ids)
+    credit = Q(entry_type=WalletLedgerEntry.TYPE_CREDIT)
+    debit = Q(entry_type=WalletLedgerEntry.TYPE_DEBIT)
+    totals = {
+        row["wallet_id"]: row
+        for row in ledger.entries_since_checkpoint().filter(wallet_id__in=ids)
+        .values("wallet_id")
+        .annotate(
+            credits=Sum("amount", filter=credit),
+            debits=Sum("amount", filter=debit),
+            deposits=Sum("amount", filter=credit & Q(source=WalletLedgerEntry.SOURCE_DEPOSIT)),
+            entry_fees=Sum("amount", filter=debit & Q(source=WalletLedgerEntry.SOURCE_ENTRY_FEE)),
+            entries=Count("id"),
+        )
+    }
+
+    rows = []
+    for pk, balance, plate in wallets:
+        checkpoint = checkpoints.get(pk)
+        sums = totals.get(pk, {})
+        credits, debits = sums.get("credits") or ledger.ZERO, sums.get("debits") or ledger.ZERO
+        deposits, fees = sums.get("deposits") or ledger.ZERO, sums.get("entry_fees") or ledger.ZERO
+        expected = (checkpoint.balance if checkpoint else ledger.ZERO) + credits - debits
+        if expected == balance:
+            continue
+        rows.append({
+            "wallet_id": pk,
+            "license_plate": plate or "",
+            "wallet_balance": balance,
+            "expected_balance": expected,
+            "difference": balance - expected,
+            "checkpoint_entry_id": checkpoint.last_entry_id if checkpoint else None,
+            "entries_summed": sums.get("entries", 0),
+            "deposits": deposits,
+            "entry_fees": fees,
+            "adjustments": credits - debits - deposits + fees,
+        })
+    return rows
+
+
+def _recheck(rows):
+    """The rows whose wallets are still off when checked again with the wallet rows locked."""
+    with transaction.atomic():
+        wallets = list(
+            Wallet.objects.select_for_update(of=("self",))
+            .filter(pk__in=[row["wallet_id"] for row in rows])
+            .order_by("pk")
+            .values_list("pk", "balance", "vehicle__license_plate")
+        )
+        return _check_chunk(wallets)
+
+
+def reconcile(chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Check every wallet. `progress(checked, total)` is called after each
+    chunk. Returns a ReconcileResult.
+    """
+    started = time.monotonic()
+    wallets = Wallet.objects.order_by("pk")
+    result = ReconcileResult(wallets.count())
+    rows = wallets.values_list("pk", "balance", "vehicle__license_plate").iterator(chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        suspects = _check_chunk(chunk)
+        if suspects:
+            result.discrepancies.extend(_recheck(suspects))
+        result.checked += len(chunk)
+        if progress:
+            progress(result.checked, result.total)
+    result.seconds = time.monotonic() - started
+    return result
+
+
+def write_csv(rows, file):
+    """Write discrepancy rows as CSV (with a header) to a text file object."""
+    writer = csv.DictWriter(file, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+# -------------------------
+# BACKGROUND JOB
+# -------------------------
+def job_state():
+    """State of the latest background job (None if there is none), see start_job()."""
+    state = jobs.get(JOB_KEY)
+    if state and state["status"] == STATUS_RUNNING and jobs.get(JOB_LOCK_KEY) is None:
+        # Its worker stopped without finishing
+        state.update(status=STATUS_FAILED, error="The worker running it stopped.")
+    return state
+
+
+def start_job(started_by=""):
+    """
+    Start a reconciliation in a background thread. Returns the job id, or
+    None if one is already running.
+    """
+    job_id = uuid.uuid4().hex
+    if not jobs.add(JOB_LOCK_KEY, {"job_id": job_id}, JOB_LOCK_SECONDS):
+        return None
+    state = {
+        "job_id": job_id,
+        "status": STATUS_RUNNING,
+        "started_by": started_by,
+        "started_at": timezone.now().isoformat(),
+        "finished_at": None,
+        "checked": 0,
+        "total": None,
+        "discrepancy_count": 0,
+        "discrepancies": [],
+        "truncated": False,
+        "seconds": None,
+        "error": "",
+    }
+    jobs.put(JOB_KEY, state, JOB_TTL_SECONDS)
+    threading.Thread(target=_run_job, args=(state,), name="rdfs-wallet-reconcile", daemon=True).start()
+    return job_id
+
+
+def _run_job(state):
+    def progress(checked, total):
+        state.update(checked=checked, total=total)
+        jobs.put(JOB_KEY, state, JOB_TTL_SECONDS)
+        jobs.put(JOB_LOCK_KEY, {"job_id": state["job_id"]}, JOB_LOCK_SECONDS)
+
+    try:
+        result = reconcile(progress=progress)
+        rows = [{key: str(value) if value is not None else "" for key, value in row.items()}
+                for row in result.discrepancies]
+        state.update(
+            status=STATUS_DONE,
+            checked=result.checked,
+            total=result.total,
+            discrepancy_count=len(rows),
+            discrepancies=rows[:JOB_MAX_ROWS],
+            truncated=len(rows) > JOB_MAX_ROWS,
+            seconds=round(result.seconds, 2),
+        )
+        logger.info("Wallet reconciliation: %s wallets, %s discrepancies in %.2fs",
+                    result.checked, len(rows), result.seconds)
+    except Exception as exc:
+        logger.exception("Wallet reconciliation failed")
+        state.update(status=STATUS_FAILED, error=str(exc))
+    finally:
+        state["finished_at"] = timezone.now().isoformat()
+        try:
+            jobs.put(JOB_KEY, state, JOB_TTL_SECONDS)
+            jobs.delete(JOB_LOCK_KEY)
+        finally:
+            # This thread's own connection; it would stay open otherwise
+            connection.close()
@@ -0,0 +1,254 @@
+# vehicles/search.py
+"""
+Substring search over drivers and vehicles: names, license number, mobile
+number, driver_id and plate.
+
+On PostgreSQL the searches are plain icontains filters, which compile to
+UPPER(col::text) LIKE '%...%' and are served by the pg_trgm GIN indexes on
+those expressions (migrations 0010 and 0013).  Other databases have no such
+index, so each process keeps an in-memory trigram + prefix index instead,
+built on first use, patched row by row when drivers or vehicles are saved
+in this process (signals in vehicles/models.py) and rebuilt after
+SEARCH_INDEX_TTL_SECONDS to pick up other workers' writes.
+
+Either way callers get a queryset back:
+
+    search_drivers("dela cruz")      -> Driver queryset
+    search_vehicles("ABC 12")        -> Vehicle queryset
+    autocomplete("vehicles", "abc")  -> [{"id", "text", ...}, ...]
+"""
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+# Seconds before the in-memory index is rebuilt from the database
+INDEX_TTL_SECONDS = getattr(settings, "SEARCH_INDEX_TTL_SECONDS", 300)
+
+# Most results returned by autocomplete()
+AUTOCOMPLETE_LIMIT = 10
+
+DRIVER_FIELDS = ("first_name", "middle_name", "last_name", "license_number", "mobile_number", "driver_id")
+VEHICLE_FIELDS = ("license_plate",)
+
+
+def normalize(text):
+    """Upper case with runs of whitespace collapsed, as the index stores text."""
+    return " ".join(str(text or "").upper().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NgramIndex:
+    """
+    Per-process search index of one model: id -> searchable text, a trigram
+    posting list for queries of 3+ characters and a sorted word list for
+    shorter (prefix) queries.  `load(ids)` yields (id, [texts]) for the
+    given ids, or for every row when ids is None.
+    """
+
+    def __init__(self, load, ttl=INDEX_TTL_SECONDS):
+        self.load = load
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._docs = None               # id -> normalized text ("\n" between fields)
+        self._grams = defaultdict(set)  # trigram -> ids
+        self._words = []                # sorted (word, id)
+        self._expires_at = 0
+
+    def _add(self, pk, texts):
+        doc = "\n".join(normalize(text) for text in texts if text)
+        self._docs[pk] = doc
+        for gram in _trigrams(doc):
+            self._grams[gram].add(pk)
+        for word in set(doc.split()):
+            bisect.insort(self._words, (word, pk))
+
+    def _remove(self, pk):
+        doc = self._docs.pop(pk, None)
+        if doc is None:
+            return
+        for gram in _trigrams(doc):
+            postings = self._grams.get(gram)
+            if postings:
+                postings.discard(pk)
+                if not postings:
+                    del self._grams[gram]
+        for word in set(doc.split()):
+            i = bisect.bisect_left(self._words, (word, pk))
+            if i < len(self._words) and self._words[i] == (word, pk):
+                del self._words[i]
+
+    def _ensure_built(self):
+        if self._docs is not None and time.monotonic() < self._expires_at:
+            return
+        self._docs, self._grams, self._words = {}, defaultdict(set), []
+        for pk, texts in self.load(None):
+            doc = "\n".join(normalize(text) for text in texts if text)
+            self._docs[pk] = doc
+            for gram in _trigrams(doc):
+                self._grams[gram].add(pk)
+        self._words = sorted({(word, pk) for pk, doc in self._docs.items() for word in doc.split()})
+        self._expires_at = time.monotonic() + self.ttl
+
+    def search(self, query):
+        """Ids whose text contains `query` (any field), prefix matches on a word first."""
+        query = normalize(query)
+        if not query:
+            return []
+        with self._lock:
+            self._ensure_built()
+            i = bisect.bisect_left(self._words, (query,))
+            prefix = []
+            while i < len(self._words) and self._words[i][0].startswith(query):
+                prefix.append(self._words[i][1])
+                i += 1
+            if len(query) < 3:
+                return list(dict.fromkeys(prefix))
+            candidates = None
+            for gram in _trigrams(query):
+                postings = self._grams.get(gram, set())
+                candidates = postings if candidates is None else candidates & postings
+                if not candidates:
+                    return list(dict.fromkeys(prefix))
+            contains = sorted((pk for pk in candidates if query in self._docs[pk]), reverse=True)
+        return list(dict.fromkeys(prefix + contains))
+
+    def refresh(self, ids):
+        """Re-read the given rows (e.g. after a save or delete); no-op until the index is built."""
+        ids = set(ids)
+        if not ids:
+            return
+        with self._lock:
+            if self._docs is None:
+                return
+            for pk in ids:
+                self._remove(pk)
+            for pk, texts in self.load(ids):
+                self._add(pk, texts)
+
+    def is_built(self):
+        return self._docs is not None
+
+    def clear(self):
+        with self._lock:
+            self._docs = None
+
+
+def _load_drivers(ids):
+    from .models import Driver
+
+    drivers = Driver.objects.all() if ids is None else Driver.objects.filter(pk__in=ids)
+    for row in drivers.values_list("pk", *DRIVER_FIELDS).iterator(chunk_size=2000):
+        yield row[0], row[1:]
+
+
+def _load_vehicles(ids):
+    from .models import Vehicle
+
+    vehicles = Vehicle.objects.all() if ids is None else Vehicle.objects.filter(pk__in=ids)
+    fields = VEHICLE_FIELDS + tuple(f"assigned_driver__{field}" for field in DRIVER_FIELDS)
+    for row in vehicles.values_list("pk", *fields).iterator(chunk_size=2000):
+        yield row[0], row[1:]
+
+
+driver_index = NgramIndex(_load_drivers)
+vehicle_index = NgramIndex(_load_vehicles)
+
+
+def driver_changed(driver_id):
+    """Patch the in-memory indexes after a driver was saved or deleted (its vehicles show its name)."""
+    from .models import Vehicle
+
+    driver_index.refresh([driver_id])
+    if vehicle_index.is_built():
+        vehicle_index.refresh(Vehicle.objects.filter(assigned_driver_id=driver_id).values_list("pk", flat=True))
+
+
+def vehicle_changed(vehicle_id):
+    """Patch the in-memory vehicle index after a vehicle was saved or deleted."""
+    vehicle_index.refresh([vehicle_id])
+
+
+def use_trigram_indexes():
+    """True when the database serves icontains from trigram indexes (PostgreSQL)."""
+    return connection.vendor == "postgresql"
+
+
+def _contains_any(fields, query):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{field}__icontains": query})
+    return condition
+
+
+def search_drivers(query, queryset=None):
+    """Drivers whose name, license number, mobile number or driver_id contains `query`."""
+    from .models import Driver
+
+    queryset = Driver.objects.all() if queryset is None else queryset
+    query = normalize(query)
+    if not query:
+        return queryset
+    if use_trigram_indexes():
+        return queryset.filter(_contains_any(DRIVER_FIELDS, query))
+    return queryset.filter(pk__in=driver_index.search(query))
+
+
+def search_vehicles(query, queryset=None):
+    """Vehicles whose plate, or whose driver's name / license / mobile / driver_id, contains `query`."""
+    from .models import Driver, Vehicle
+
+    queryset = Vehicle.objects.all() if queryset is None else queryset
+    query = normalize(query)
+    if not query:
+        return queryset
+    if use_trigram_indexes():
+        # Driver matches as a subquery so each table's trigram indexes are used
+        drivers = Driver.objects.filter(_contains_any(DRIVER_FIELDS, query)).values("pk")
+        return queryset.filter(_contains_any(VEHICLE_FIELDS, query) | Q(assigned_driver__in=drivers))
+    return queryset.filter(pk__in=vehicle_index.search(query))
+
+
+def autocomplete(kind, query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Suggestions for `kind` ("drivers" or "vehicles") in select2's format:
+    [{"id", "text", ...}], plates / names starting with the query first.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+    if kind == "drivers":
+        drivers = search_drivers(query).order_by("last_name", "first_name", "pk")
+        matches = list(drivers.values("pk", "driver_id", "first_name", "last_name", "license_number")[:limit * 5])
+        matches.sort(key=lambda d: not (normalize(d["last_name"]).startswith(query)
+                                        or normalize(d["first_name"]).startswith(query)))
+        return [
+            {
+                "id": d["pk"],
+                "text": f"{d['last_name']}, {d['first_name']} ({d['driver_id']})",
+                "driver_id": d["driver_id"],
+                "license_number": d["license_number"],
+            }
+            for d in matches[:limit]
+        ]
+    vehicles = search_vehicles(query).order_by("license_plate", "pk")
+    matches = list(vehicles.values(
+        "pk", "license_plate", "assigned_driver__first_name", "assigned_driver__last_name"
+    )[:limit * 5])
+    matches.sort(key=lambda v: not normalize(v["license_plate"]).startswith(query))
+    return [
+        {
+            "id": v["pk"],
+            "text": f"{v['license_plate']} — {v['assigned_driver__last_name']}, {v['assigned_driver__first_name']}"
+            if v["assigned_driver__last_name"] else v["license_plate"],
+            "plate": v["license_plate"],
+        }
+        for v in matches[:limit]
+    ]
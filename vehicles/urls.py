@@ -8,6 +8,7 @@ urlpatterns = [
     # ✅ Dedicated registration pages
     path('register-driver/', views.register_driver, name='register_driver'),
     path('register-vehicle/', views.register_vehicle, name='register_vehicle'),
+    path('import/', views.import_fleet, name='import_fleet'),
 
     # ✅ Registered records
     path('registered/', views.registered_vehicles, name='registered_vehicles'),
@@ -15,14 +16,19 @@ urlpatterns = [
 
     # ✅ QR / printable page (staff-only)
     path('vehicle/<int:vehicle_id>/qr/', views.vehicle_qr_view, name='vehicle_qr'),
+    path('qr-image/<str:qr_value>/', views.qr_image, name='qr_image'),
 
     # ✅ AJAX / backend helpers
     path('ocr-process/', views.ocr_process, name='ocr_process'),
+    path('ocr-result/<str:job_id>/', views.ocr_result, name='ocr_result'),
+    path('ocr-stats/', views.ocr_stats, name='ocr_stats'),
     path('ajax-register-driver/', views.ajax_register_driver, name='ajax_register_driver'),
     path('ajax-register-vehicle/', views.ajax_register_vehicle, name='ajax_register_vehicle'),
     path('get-wallet-balance/<int:driver_id>/', views.get_wallet_balance, name='get_wallet_balance'),
     path('ajax-deposit/', views.ajax_deposit, name='ajax_deposit'),
+    path('wallet-reconciliation/', views.wallet_reconciliation, name='wallet_reconciliation'),
     path('get-by-driver/<int:driver_id>/', views.get_vehicles_by_driver, name='get_vehicles_by_driver'),
+    path('search/', views.search_autocomplete, name='search_autocomplete'),
 
     path('drivers/delete/<int:driver_id>/', views.delete_driver, name='delete_driver'),
     path('vehicles/delete/<int:vehicle_id>/', views.delete_vehicle, name='delete_vehicle'),
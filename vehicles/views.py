@@ -1,30 +1,27 @@
 # vehicles/views.py
 import base64
-import cv2
-import numpy as np
-import pytesseract
 import re
 import json
 from decimal import Decimal
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.decorators.cache import never_cache
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum
 from django.utils import timezone
+from rdfs.pagination import paginate
+from reports import counters, snapshots
+from . import fleet_import, qr_images, reconcile, search
 
 from accounts.utils import is_staff_admin_or_admin, is_admin
 from .models import Driver, Vehicle, Wallet, Deposit, QueueHistory
+from .qr_cache import normalize_qr_value
 from .forms import DriverRegistrationForm, VehicleRegistrationForm
 
-# ✅ Path for your installed Tesseract OCR (adjust if needed)
-pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
-
 
 # -------------------------
 # OCR ENDPOINT
@@ -33,47 +30,61 @@ pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tess
 @csrf_exempt
 @require_POST
 def ocr_process(request):
-    """OCR endpoint for license scanning."""
+    """Queue a license image for OCR (see vehicles/ocr.py); poll the returned result_url for the fields."""
+    # The OCR stack (OpenCV, NumPy, pytesseract) is only loaded once scanning is used
+    from . import ocr
+
     try:
         data = json.loads(request.body)
         image_data = data.get('image_data', '')
-
         if not image_data:
-            return JsonResponse({'error': 'No image data provided.'})
+            return JsonResponse({'status': 'error', 'message': 'No image data provided.'}, status=400)
+        image_bytes = base64.b64decode(image_data.split(';base64,')[-1], validate=True)
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid image data.'}, status=400)
 
-        format, imgstr = image_data.split(';base64,')
-        nparr = np.frombuffer(base64.b64decode(imgstr), np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.bilateralFilter(gray, 11, 17, 17)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+    try:
+        job_id = ocr.submit(image_bytes, owner_id=request.user.pk)
+    except ocr.OCRBusy as e:
+        response = JsonResponse({'status': 'error', 'message': str(e)}, status=503)
+        response['Retry-After'] = '3'
+        return response
+
+    result_url = reverse('vehicles:ocr_result', args=[job_id])
+    state = ocr.job_state(job_id, owner_id=request.user.pk)
+    if state and state['status'] != ocr.STATUS_PENDING:
+        # Answered from the OCR cache
+        result = state.pop('result', None) or {}
+        return JsonResponse({**state, **result, 'job_id': job_id, 'result_url': result_url})
+    return JsonResponse({
+        'status': ocr.STATUS_PENDING,
+        'job_id': job_id,
+        'result_url': result_url,
+    }, status=202)
 
-        raw_text = pytesseract.image_to_string(thresh)
-        print("🧾 OCR RAW TEXT:", raw_text)
-        text = re.sub(r'[^A-Za-z0-9\s:/-]', ' ', raw_text).upper()
 
-        license_number = re.search(r'([A-Z]{1,2}\d{2,3}-\d{2}-\d{6,7})', text)
-        if not license_number:
-            license_number = re.search(r'(?:[A-Z]{3}-?\d{6,7})', text)
+@login_required
+@require_GET
+@never_cache
+def ocr_result(request, job_id):
+    """State of an OCR job: pending, then success (with the license fields), error or timeout."""
+    from . import ocr
 
-        name_match = re.search(r'([A-Z]+),\s*([A-Z]+)\s*([A-Z]*)', text)
-        birthdate = re.search(r'(\d{4}/\d{2}/\d{2})', text)
-        expiry = re.search(r'(\d{4}/\d{2}/\d{2})', text)
+    state = ocr.job_state(job_id, owner_id=request.user.pk)
+    if state is None:
+        return JsonResponse({'status': 'error', 'message': 'Unknown or expired scan.'}, status=404)
+    result = state.pop('result', None) or {}
+    return JsonResponse({**state, **result})
 
-        result = {
-            'license_number': license_number.group(0) if license_number else '',
-            'last_name': name_match.group(1).title() if name_match else '',
-            'first_name': name_match.group(2).title() if name_match else '',
-            'middle_name': name_match.group(3).title() if name_match and name_match.group(3) else '',
-            'birth_date': birthdate.group(0) if birthdate else '',
-            'license_expiry': expiry.group(0) if expiry else '',
-        }
 
-        return JsonResponse(result)
+@login_required
+@user_passes_test(is_admin)
+@never_cache
+def ocr_stats(request):
+    """This worker's OCR result cache counters (hits, misses, OCR time saved)."""
+    from .ocr_cache import ocr_cache
 
-    except Exception as e:
-        return JsonResponse({'error': str(e)})
+    return JsonResponse({'status': 'success', 'cache': ocr_cache.stats()})
 
 
 # -------------------------
@@ -122,11 +133,12 @@ def staff_dashboard(request):
             else:
                 messages.error(request, "❌ Vehicle form contains errors.")
 
+    counts = counters.values()
     context = {
         'driver_form': driver_form,
         'vehicle_form': vehicle_form,
-        'total_drivers': Driver.objects.count(),
-        'total_vehicles': Vehicle.objects.count(),
+        'total_drivers': counts[counters.DRIVERS],
+        'total_vehicles': counts[counters.VEHICLES],
     }
     return render(request, 'accounts/staff_dashboard.html', context)
 
@@ -267,6 +279,46 @@ def register_vehicle(request):
     return render(request, 'vehicles/register_vehicle.html', {'form': form, 'vehicles': vehicles, 'total_vehicles': total_vehicles})
 
 
+@login_required
+@user_passes_test(is_staff_admin_or_admin)
+def import_fleet(request):
+    """Bulk driver / vehicle registration from a CSV or XLSX file (?template=csv for a blank file)."""
+    if request.GET.get('template') == 'csv':
+        response = HttpResponse(fleet_import.template_csv(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="fleet_import_template.csv"'
+        return response
+
+    result = None
+    dry_run = False
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        dry_run = bool(request.POST.get('dry_run'))
+        if not upload:
+            messages.error(request, "❌ Choose a CSV or XLSX file to import.")
+        else:
+            try:
+                result = fleet_import.import_fleet(fleet_import.read_rows(upload), dry_run=dry_run)
+            except fleet_import.FleetImportError as e:
+                messages.error(request, f"❌ {e}")
+            except (UnicodeDecodeError, ValueError) as e:
+                messages.error(request, f"❌ The file could not be read: {e}")
+            else:
+                if dry_run:
+                    messages.info(request, f"Checked {result.total_rows} rows: {result.created_vehicles} ready to import.")
+                elif result.created_vehicles:
+                    messages.success(request, f"✅ Imported {result.created_vehicles} vehicles "
+                                              f"({result.created_drivers} new drivers).")
+                if result.errors:
+                    messages.warning(request, f"⚠️ {result.error_rows} rows have errors and were skipped.")
+    return render(request, 'vehicles/import_fleet.html', {
+        'result': result,
+        'dry_run': dry_run,
+        'columns': fleet_import.COLUMNS,
+        'required': fleet_import.REQUIRED,
+        'max_rows': fleet_import.MAX_ROWS,
+    })
+
+
 # -------------------------
 # WALLET & DEPOSITS
 # -------------------------
@@ -283,6 +335,35 @@ def get_wallet_balance(request, driver_id):
         return JsonResponse({'success': False, 'message': str(e)})
 
 
+@login_required
+@user_passes_test(is_admin)
+@never_cache
+def wallet_reconciliation(request):
+    """
+    Wallet balances checked against the ledger in a background job: POST
+    starts one; ?format=json is its progress, ?format=csv its report.
+    """
+    if request.method == 'POST':
+        if reconcile.start_job(started_by=request.user.username):
+            messages.success(request, "✅ Wallet reconciliation started.")
+        else:
+            messages.warning(request, "⚠️ A wallet reconciliation is already running.")
+        return redirect('vehicles:wallet_reconciliation')
+
+    job = reconcile.job_state()
+    output = request.GET.get('format')
+    if output == 'json':
+        return JsonResponse({'status': 'success', 'job': job})
+    if output == 'csv':
+        if not job or job['status'] != reconcile.STATUS_DONE:
+            raise Http404("No finished reconciliation.")
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="wallet_reconciliation_{job["job_id"][:8]}.csv"'
+        reconcile.write_csv(job['discrepancies'], response)
+        return response
+    return render(request, 'vehicles/wallet_reconciliation.html', {'job': job, 'max_rows': reconcile.JOB_MAX_ROWS})
+
+
 @login_required
 @user_passes_test(is_staff_admin_or_admin)
 def vehicle_qr_view(request, vehicle_id):
@@ -294,6 +375,26 @@ def vehicle_qr_view(request, vehicle_id):
     return render(request, 'vehicles/qr_detail.html', {'vehicle': vehicle})
 
 
+def _qr_image_etag(request, qr_value):
+    fmt = 'svg' if request.GET.get('format') == 'svg' else 'png'
+    return f"{fmt}-{normalize_qr_value(qr_value)}"
+
+
+@login_required
+@require_GET
+@condition(etag_func=_qr_image_etag)
+def qr_image(request, qr_value):
+    """QR code image of a QR value, rendered on demand (PNG, or SVG with ?format=svg)."""
+    qr_value = normalize_qr_value(qr_value)
+    if not re.fullmatch(r'[A-Z0-9-]{1,255}', qr_value or ''):
+        raise Http404("Invalid QR value.")
+    fmt = 'svg' if request.GET.get('format') == 'svg' else 'png'
+    response = HttpResponse(qr_images.render(qr_value, fmt), content_type=qr_images.CONTENT_TYPES[fmt])
+    # The image of a QR value never changes
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
 @login_required
 @csrf_exempt
 def ajax_deposit(request):
@@ -325,9 +426,8 @@ def ajax_deposit(request):
 @login_required
 @user_passes_test(is_staff_admin_or_admin)
 def registered_vehicles(request):
-    vehicle_list = Vehicle.objects.select_related('assigned_driver').order_by('-date_registered')
-    paginator = Paginator(vehicle_list, 10)
-    vehicles = paginator.get_page(request.GET.get('page'))
+    vehicle_list = Vehicle.objects.select_related('assigned_driver')
+    vehicles = paginate(request, vehicle_list, ('-date_registered', '-id'), per_page=10)
     return render(request, 'vehicles/registered_vehicles.html', {'vehicles': vehicles})
 
 
@@ -335,20 +435,25 @@ def registered_vehicles(request):
 @user_passes_test(is_staff_admin_or_admin)
 def registered_drivers(request):
     query = request.GET.get('q', '').strip()
-    driver_list = Driver.objects.all().order_by('-id')
-    if query:
-        driver_list = driver_list.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(middle_name__icontains=query) |
-            Q(license_number__icontains=query) |
-            Q(mobile_number__icontains=query)
-        )
-    paginator = Paginator(driver_list, 10)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    driver_list = search.search_drivers(query)
+    page_obj = paginate(request, driver_list, ('-id',), per_page=10)
     return render(request, 'vehicles/registered_drivers.html', {'page_obj': page_obj})
 
 
+@login_required
+@user_passes_test(is_staff_admin_or_admin)
+def search_autocomplete(request):
+    """JSON suggestions for driver / vehicle pickers: ?kind=drivers|vehicles&q=..."""
+    kind = request.GET.get('kind', 'vehicles')
+    if kind not in ('drivers', 'vehicles'):
+        return JsonResponse({'status': 'error', 'message': 'Unknown search kind.'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', search.AUTOCOMPLETE_LIMIT)), 1), 50)
+    except ValueError:
+        limit = search.AUTOCOMPLETE_LIMIT
+    return JsonResponse({'results': search.autocomplete(kind, request.GET.get('q', ''), limit)})
+
+
 @login_required
 def get_vehicles_by_driver(request, driver_id):
     vehicles = Vehicle.objects.filter(assigned_driver_id=driver_id)
@@ -401,7 +506,7 @@ def qr_entry(request):
         return JsonResponse({'success': False, 'message': 'Missing QR value.'})
 
     try:
-        vehicle = get_object_or_404(Vehicle, qr_value=qr_value)
+        vehicle = get_object_or_404(Vehicle, qr_value=normalize_qr_value(qr_value))
         now = timezone.now()
         vehicle.status = 'boarding'
         vehicle.last_enter_time = now
@@ -432,7 +537,7 @@ def qr_exit(request):
         return JsonResponse({'success': False, 'message': 'Missing QR value.'})
 
     try:
-        vehicle = get_object_or_404(Vehicle, qr_value=qr_value)
+        vehicle = get_object_or_404(Vehicle, qr_value=normalize_qr_value(qr_value))
         now = timezone.now()
         vehicle.status = 'departed'
         vehicle.last_exit_time = now
@@ -458,58 +563,8 @@ def qr_exit(request):
 @user_passes_test(is_admin)
 def admin_dashboard_data(request):
     """Return JSON with 7-day profit trend and live stats."""
-    from django.db.models.functions import TruncDate
-    from datetime import timedelta
-
-    now = timezone.now()
-    seven_days_ago = now - timedelta(days=6)
-
-    # Group deposits by date
-    daily_profits = (
-        Deposit.objects.filter(created_at__date__gte=seven_days_ago.date())
-        .annotate(day=TruncDate('created_at'))
-        .values('day')
-        .annotate(total=Sum('amount'))
-        .order_by('day')
-    )
-
-    # Ensure we produce labels for each of the last 7 days (even if 0)
-    labels = []
-    data_points = []
-    for i in range(6, -1, -1):  # 6 -> 0 (six days ago .. today)
-        d = (now - timedelta(days=i)).date()
-        labels.append(d.strftime('%b %d'))
-        matching = next((item for item in daily_profits if item['day'].date() == d), None)
-        data_points.append(float(matching['total']) if matching else 0.0)
-
-    total_drivers = Driver.objects.count()
-    total_vehicles = Vehicle.objects.count()
-    total_deposits = Deposit.objects.aggregate(total=Sum('amount'))['total'] or 0
-    total_wallets = Wallet.objects.aggregate(total=Sum('balance'))['total'] or 0
-
-    recent_deposits = list(
-        Deposit.objects.select_related('wallet__vehicle')
-        .order_by('-created_at')[:5]
-        .values('reference_number', 'amount', 'created_at', 'wallet__vehicle__license_plate')
-    )
-
-    recent_queues = list(
-        QueueHistory.objects.select_related('vehicle')
-        .order_by('-timestamp')[:5]
-        .values('vehicle__license_plate', 'action', 'timestamp')
-    )
-
-    data = {
-        'total_drivers': total_drivers,
-        'total_vehicles': total_vehicles,
-        'total_profit': float(total_deposits),
-        'wallet_total': float(total_wallets),
-        'recent_deposits': recent_deposits,
-        'recent_queues': recent_queues,
-        'chart_labels': labels,
-        'chart_data': data_points,
-    }
-    return JsonResponse(data)
+    # Shared snapshot, recomputed every DASHBOARD_SNAPSHOT_SECONDS
+    return JsonResponse(snapshots.fleet_dashboard())
 
 
 # -------------------------
@@ -518,8 +573,7 @@ def admin_dashboard_data(request):
 @login_required
 @user_passes_test(is_admin)
 def queue_history(request):
-    history = QueueHistory.objects.select_related('vehicle', 'driver').order_by('-timestamp')
-    paginator = Paginator(history, 20)
-    page = paginator.get_page(request.GET.get('page'))
-    return render(request, 'terminal/queue_history.html', {'page_obj': page})
+    history = QueueHistory.objects.select_related('vehicle', 'driver')
+    page = paginate(request, history, ('-timestamp', '-id'), per_page=20)
+    return render(request, 'vehicles/queue_history.html', {'page_obj': page})
 